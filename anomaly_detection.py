@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from feature_matrix import FeatureMatrix
+
+# Metrics screened for clinician alerts (FeatureMatrix column names)
+ANOMALY_METRICS = [
+    "apple_watch.sleep_duration_hours",
+    "apple_watch.steps",
+    "apple_watch.stress_score",
+]
+
+
+def rolling_zscores(values: np.ndarray, window: int = 14, min_periods: int = 7) -> np.ndarray:
+    """z-score of each day against the patient's own trailing window (excluding that day).
+
+    values is (patients, days) with NaN for missing days. Rolling sums of x, x^2
+    and the observation count come from one cumulative sum per row, so the cost
+    is O(patients * days) regardless of the window. Each row is centered on its
+    own mean first to keep the sum of squares numerically stable.
+    """
+    observed = ~np.isnan(values)
+    x = np.where(observed, values, 0.0)
+    x -= (x.sum(axis=1) / np.maximum(observed.sum(axis=1), 1))[:, None]
+    x[~observed] = 0.0
+
+    def trailing(a: np.ndarray) -> np.ndarray:
+        # Sum over days [d - window, d) = cumsum[d - 1] - cumsum[d - window - 1]
+        cumulative = np.cumsum(a, axis=1)
+        result = np.zeros_like(cumulative)
+        result[:, 1:] = cumulative[:, :-1]
+        result[:, window + 1:] -= cumulative[:, :-window - 1]
+        return result
+
+    count = trailing(observed.astype(np.float64))
+    total = trailing(x)
+    squares = trailing(x * x)
+    mean = total / np.maximum(count, 1)
+    variance = (squares - count * mean ** 2) / np.maximum(count - 1, 1)
+    std = np.sqrt(np.maximum(variance, 0))
+
+    z = np.full(values.shape, np.nan)
+    valid = observed & (count >= min_periods) & (std > 1e-9)
+    z[valid] = (x[valid] - mean[valid]) / std[valid]
+    return z
+
+
+class AnomalyFlags:
+    """Flagged (patient, day, metric, z) rows, stored column-wise"""
+
+    def __init__(self, features: FeatureMatrix, metrics: List[str], patient: np.ndarray, day: np.ndarray,
+                 metric: np.ndarray, z: np.ndarray):
+        self.features = features
+        self.metrics = metrics
+        self.patient = patient
+        self.day = day
+        self.metric = metric
+        self.z = z
+
+    def __len__(self) -> int:
+        return len(self.z)
+
+    def tuples(self) -> List[Tuple[str, int, str, float]]:
+        ids = self.features.patient_ids
+        return [(ids[p], int(d), self.metrics[m], float(z)) for p, d, m, z in zip(self.patient, self.day, self.metric, self.z)]
+
+    def counts(self) -> Dict[str, int]:
+        return {name: int((self.metric == i).sum()) for i, name in enumerate(self.metrics)}
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame({
+            "patient_id": np.asarray(self.features.patient_ids, dtype=object)[self.patient],
+            "date": np.datetime64(self.features.start_date, "D") + self.day.astype(np.int64),
+            "metric": np.asarray(self.metrics, dtype=object)[self.metric],
+            "z": self.z,
+        })
+
+
+def detect_anomalies(features: FeatureMatrix, metrics: Optional[List[str]] = None, window: int = 14,
+                     threshold: float = 3.0, min_periods: int = 7) -> AnomalyFlags:
+    """Flag patient-days whose |z| against the trailing window exceeds the threshold, for every metric"""
+    metrics = list(metrics or ANOMALY_METRICS)
+    n_patients, n_days = len(features.patient_ids), features.n_days
+    patient, day, metric, scores = [], [], [], []
+    for i, name in enumerate(metrics):
+        z = rolling_zscores(features.columns[name].reshape(n_patients, n_days).astype(np.float64), window, min_periods)
+        rows, days = np.nonzero(np.abs(np.nan_to_num(z)) > threshold)
+        patient.append(rows.astype(np.int32))
+        day.append(days.astype(np.int16))
+        metric.append(np.full(len(rows), i, dtype=np.int8))
+        scores.append(z[rows, days].astype(np.float32))
+    # Patient-major, chronological order across metrics
+    patient, day, metric, scores = (np.concatenate(a) for a in (patient, day, metric, scores))
+    order = np.lexsort((metric, day, patient))
+    return AnomalyFlags(features, metrics, patient[order], day[order], metric[order], scores[order])
+
+
+if __name__ == "__main__":
+    import time
+    from compact_dataset import CompactCohort
+    from feature_matrix import FeatureJoiner
+
+    features = FeatureJoiner().build(CompactCohort.load_json('data/realistic_patient_data.json'))
+    flags = detect_anomalies(features)
+    print(f"Flagged {len(flags)} patient-days (|z| > 3 vs trailing 14 days): {flags.counts()}")
+    for patient_id, day, metric, z in flags.tuples()[:10]:
+        print(f"  {patient_id:<20} day {day:>3}  {metric:<35} z={z:+.2f}")
+
+    # Scale: the same grid tiled to 5 million patient-days
+    repeats = 5_000_000 // features.n_rows + 1
+    big = FeatureMatrix(features.start_date, [f"p{i}" for i in range(len(features.patient_ids) * repeats)],
+                        features.n_days, {name: np.tile(features.columns[name], repeats) for name in ANOMALY_METRICS})
+    start = time.perf_counter()
+    flags = detect_anomalies(big)
+    print(f"\n{big.n_rows:,} patient-days x {len(ANOMALY_METRICS)} metrics in {time.perf_counter() - start:.2f} s "
+          f"({len(flags):,} flags)")
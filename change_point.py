@@ -0,0 +1,233 @@
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+# Deterioration direction per biomarker: stress regimes lower HRV and raise resting HR
+BIOMARKER_DIRECTIONS = {
+    "heart_rate_variability": -1.0,
+    "heart_rate_resting": 1.0,
+}
+ENTRY, EXIT = "entry", "exit"
+
+
+class CusumMonitor:
+    """Online two-sided CUSUM over per-patient biomarker streams with O(1) state per patient and metric.
+
+    Each patient/metric learns its own baseline mean and std over the first
+    `warmup` samples, then accumulates standardized deviations in the
+    deterioration direction. When the entry sum crosses `threshold`, a regime
+    entry is flagged. While in the regime, a mirrored sum watches for the
+    return to baseline and flags the exit. The baseline mean keeps tracking
+    with an EWMA on every monitored day, flagged or not. A baseline frozen
+    while flagged could never clear a flag raised by a level the warm-up
+    misjudged (21 autocorrelated days can be off by more than a std). The
+    variance only adapts on calm days. All state lives in flat arrays, so
+    one update() call advances any number of patients at once.
+    """
+
+    def __init__(self, n_patients: int, metrics: Optional[List[str]] = None, shift: float = 1.5,
+                 threshold: float = 2.0, exit_threshold: Optional[float] = None, warmup: int = 21,
+                 adapt: float = 0.03):
+        self.metrics = list(metrics or BIOMARKER_DIRECTIONS)
+        self.direction = np.array([BIOMARKER_DIRECTIONS.get(m, 1.0) for m in self.metrics])
+        self.shift = shift
+        self.slack = shift / 2  # Reference value k for detecting a mean shift of `shift` standard deviations
+        self.threshold = threshold
+        # Exit sum grows by about `shift` per day back at baseline, so by default one such day ends a regime
+        self.exit_threshold = shift / 3 if exit_threshold is None else exit_threshold
+        self.warmup = warmup
+        self.adapt = adapt
+        self.n_patients = 0
+        self.grow(n_patients)
+
+    def grow(self, n_patients: int):
+        """Make room for newly enrolled patients (state for existing patients is kept)"""
+        extra = n_patients - self.n_patients
+        if extra <= 0:
+            return
+        shape = (extra, len(self.metrics))
+        fresh = {
+            "count": np.zeros(shape, dtype=np.int32),
+            "mean": np.zeros(shape),
+            "m2": np.zeros(shape),
+            "entry_sum": np.zeros(shape, dtype=np.float32),
+            "exit_sum": np.zeros(shape, dtype=np.float32),
+            "in_regime": np.zeros(shape, dtype=bool),
+            "regime_start": np.full(shape, -1, dtype=np.int32),
+        }
+        for name, values in fresh.items():
+            setattr(self, name, values if self.n_patients == 0 else np.concatenate([getattr(self, name), values]))
+        self.n_patients = n_patients
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in
+                   ("count", "mean", "m2", "entry_sum", "exit_sum", "in_regime", "regime_start"))
+
+    def update(self, patients: np.ndarray, values: np.ndarray, day) -> List[Tuple[int, int, str, str]]:
+        """Advance the given patients by one sample each; values has one column per metric (NaN = missing).
+
+        A patient may appear at most once per call; intraday samples are fed as
+        successive calls. Returns (patient, day, metric, 'entry'|'exit') events.
+        """
+        patients = np.asarray(patients, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(patients), len(self.metrics))
+        days = np.broadcast_to(np.asarray(day, dtype=np.int32), (len(patients),))
+        if len(patients) and patients.max() >= self.n_patients:
+            self.grow(int(patients.max()) + 1)
+
+        count, mean, m2 = self.count[patients], self.mean[patients], self.m2[patients]
+        entry_sum, exit_sum = self.entry_sum[patients], self.exit_sum[patients]
+        in_regime = self.in_regime[patients]
+        observed = ~np.isnan(values)
+        x = np.where(observed, values, mean)
+
+        # Warm-up: Welford running mean/variance
+        learning = observed & (count < self.warmup)
+        new_count = count + learning
+        delta = np.where(learning, x - mean, 0.0)
+        mean = mean + delta / np.maximum(new_count, 1)
+        m2 = m2 + delta * (x - mean)
+        count = new_count
+
+        # Monitoring: standardized deviation in the deterioration direction
+        monitoring = observed & ~learning & (count >= self.warmup)
+        std = np.sqrt(m2 / np.maximum(count - 1, 1))
+        z = np.where(monitoring, self.direction * (x - mean) / np.where(std > 0, std, 1.0), 0.0)
+
+        entry_sum = np.where(monitoring & ~in_regime, np.maximum(0, entry_sum + z - self.slack), entry_sum)
+        exit_sum = np.where(monitoring & in_regime, np.maximum(0, exit_sum + self.shift - z), exit_sum)
+        entered = monitoring & ~in_regime & (entry_sum > self.threshold)
+        exited = monitoring & in_regime & (exit_sum > self.exit_threshold)
+
+        # The variance only follows days clearly in the normal regime; the mean follows every monitored
+        # day, which also washes out regime days that fell inside the warm-up
+        drifting = monitoring & ~in_regime & (entry_sum == 0)
+        variance = m2 / np.maximum(count - 1, 1)
+        variance = np.where(drifting, (1 - self.adapt) * variance + self.adapt * (x - mean) ** 2, variance)
+        m2 = variance * np.maximum(count - 1, 1)
+        mean = np.where(monitoring, mean + self.adapt * (x - mean), mean)
+
+        in_regime = (in_regime | entered) & ~exited
+        entry_sum = np.where(entered | exited, 0, entry_sum)
+        exit_sum = np.where(entered | exited, 0, exit_sum)
+
+        self.count[patients], self.mean[patients], self.m2[patients] = count, mean, m2
+        self.entry_sum[patients], self.exit_sum[patients] = entry_sum, exit_sum
+        self.in_regime[patients] = in_regime
+        regime_start = self.regime_start[patients]
+        self.regime_start[patients] = np.where(entered, days[:, None], np.where(exited, -1, regime_start))
+
+        events = []
+        for kind, mask in ((ENTRY, entered), (EXIT, exited)):
+            rows, cols = np.nonzero(mask)
+            events.extend((int(patients[r]), int(days[r]), self.metrics[c], kind) for r, c in zip(rows, cols))
+        return events
+
+    def active_regimes(self) -> Dict[str, np.ndarray]:
+        """Patients currently flagged as in a deterioration regime, per metric"""
+        return {metric: np.flatnonzero(self.in_regime[:, i]) for i, metric in enumerate(self.metrics)}
+
+
+def replay_cohort(monitor: CusumMonitor, columns: Dict[str, np.ndarray]) -> List[Tuple[int, int, str, str]]:
+    """Feed an apple_watch stream (CompactCohort columns) to a monitor day by day, as if it arrived live"""
+    order = np.lexsort((columns["patient"], columns["day"]))
+    day, patient = columns["day"][order], columns["patient"][order]
+    bounds = np.flatnonzero(np.r_[True, day[1:] != day[:-1], True])
+    values = np.column_stack([columns[m][order] for m in monitor.metrics])
+    events = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        events.extend(monitor.update(patient[start:stop], values[start:stop], int(day[start])))
+    return events
+
+
+def detection_latency(events: List[Tuple[int, int, str, str]], truth: np.ndarray, metric: str,
+                      min_length: int = 3, warmup: int = 0) -> Dict[str, Any]:
+    """Compare entry and exit events with ground-truth regime flags (patients x days).
+
+    Entry latency counts from an episode's first day to its first entry
+    alarm. Episodes of at least min_length days without one are missed, and
+    those that began before `warmup` are also counted in "missed_in_warmup".
+    Exit latency counts from an episode's first day back at baseline to the
+    first exit after its entry alarm, and is negative when the flag cleared
+    early. A detected episode whose flag was still up when the next episode
+    began counts as "exits_missed".
+    """
+    entries: Dict[int, List[int]] = {}
+    exits: Dict[int, List[int]] = {}
+    for patient, day, event_metric, kind in events:
+        if event_metric == metric:
+            (entries if kind == ENTRY else exits).setdefault(patient, []).append(day)
+    latencies, exit_latencies, missed, false_alarms = [], [], 0, 0
+    in_warmup = exits_missed = 0
+    for patient, flags in enumerate(truth):
+        days = np.array(sorted(entries.get(patient, [])), dtype=np.int64)
+        exit_days = np.array(sorted(exits.get(patient, [])), dtype=np.int64)
+        starts = np.flatnonzero(np.diff(np.r_[0, flags.astype(np.int8)]) == 1)
+        stops = np.flatnonzero(np.diff(np.r_[flags.astype(np.int8), 0]) == -1)
+        matched = np.zeros(len(days), dtype=bool)
+        next_starts = np.r_[starts[1:], len(flags)]
+        for start, stop, next_start in zip(starts, stops, next_starts):
+            if stop - start + 1 < min_length:
+                continue
+            hits = (days >= start) & (days <= stop)
+            matched |= hits
+            if not hits.any():
+                missed += 1
+                in_warmup += int(start < warmup)
+                continue
+            entry = days[hits][0]
+            latencies.append(int(entry - start))
+            cleared = exit_days[exit_days > entry]
+            if len(cleared) and cleared[0] <= next_start:
+                exit_latencies.append(int(cleared[0] - (stop + 1)))
+            else:
+                exits_missed += 1
+        # Alarms outside any regime (including short ones) count as false
+        inside = flags[np.minimum(days, len(flags) - 1)] if len(days) else np.array([], bool)
+        false_alarms += int((~matched & ~inside).sum())
+    return {
+        "episodes": len(latencies) + missed,
+        "detected": len(latencies),
+        "missed_in_warmup": in_warmup,
+        "median_latency_days": float(np.median(latencies)) if latencies else None,
+        "median_exit_latency_days": float(np.median(exit_latencies)) if exit_latencies else None,
+        "exits_missed": exits_missed,
+        "false_alarms": false_alarms,
+    }
+
+
+if __name__ == "__main__":
+    import time
+    from compact_dataset import CompactCohort
+    from cohort_generator import CohortGenerator
+
+    # Accuracy against the generator's ground-truth stress regimes
+    generator = CohortGenerator(start_date="2024-01-01", n_days=180)
+    patient_ids = generator.patient_ids(150)
+    cohort = CompactCohort.from_dataset(generator.generate_cohort(patient_ids=patient_ids), consume=True)
+    truth = np.array([generator._state(generator.patient_profile(p), p, 180)["is_high"] for p in patient_ids])
+
+    monitor = CusumMonitor(cohort.n_patients)
+    events = replay_cohort(monitor, cohort.streams["apple_watch"])
+    print("\n" + "="*60)
+    print("CUSUM REGIME DETECTION - 150 PATIENTS x 180 DAYS")
+    print("="*60)
+    for metric in monitor.metrics:
+        result = detection_latency(events, truth, metric, warmup=monitor.warmup)
+        print(f"{metric:<25} entry: detected {result['detected']}/{result['episodes']} episodes (>=3 days, "
+              f"{result['detected'] / result['episodes']:.0%}; {result['missed_in_warmup']} missed began in the "
+              f"{monitor.warmup}-day warm-up), median latency {result['median_latency_days']} days, "
+              f"{result['false_alarms']} false alarms")
+        print(f"{'':<25} exit:  median latency {result['median_exit_latency_days']} days, "
+              f"{result['exits_missed']} detected episodes still flagged when the next one began")
+
+    # Throughput: 200,000 concurrently monitored patients, one sample each per day
+    n_patients = 200_000
+    monitor = CusumMonitor(n_patients)
+    rng = np.random.default_rng(0)
+    patients = np.arange(n_patients)
+    start = time.perf_counter()
+    for day in range(60):
+        monitor.update(patients, rng.normal([30, 70], [3, 4], (n_patients, 2)), day)
+    elapsed = time.perf_counter() - start
+    print(f"\n{n_patients:,} patients x 60 days: {n_patients * 60 / elapsed:,.0f} samples/s, "
+          f"state {monitor.nbytes() / n_patients:.0f} bytes per patient")
@@ -0,0 +1,227 @@
+"""Single entry point for the patient data tools: generate, analyze, plot, export, replay, serve and bench.
+
+Only argparse and the standard library are imported at startup; numpy, pandas,
+matplotlib and seaborn are imported inside the subcommands that need them, so
+`python cli.py --help` and generation-only runs do not pay for the plotting stack.
+"""
+import argparse
+import runpy
+import subprocess
+import sys
+import time
+
+REALISTIC_DATA = "data/realistic_patient_data.json"
+
+# analyze/plot targets: (module, whether it exposes main(data_file))
+ANALYSES = {
+    "relapse": ("analyze_relapse", True),
+    "monte-carlo": ("monte_carlo_simulation", False),
+    "sweep": ("parameter_sweep", False),
+    "rollups": ("rollups", False),
+    "compact": ("compact_dataset", False),
+    "validate": ("data_validation", False),
+    "train": ("relapse_training", False),
+    "anomalies": ("anomaly_detection", False),
+    "engagement": ("engagement", False),
+    "late-data": ("late_data", False),
+    "top-risk": ("risk_topk", False),
+    "column-store": ("column_store", False),
+}
+PLOTS = {
+    "risk-profiles": ("risk_profiles_visualization", True),
+    "detailed": ("detailed_risk_analysis", True),
+    "demo": ("demo_realistic_patterns", True),
+    "synthetic": ("visualize_synthetic_data", False),
+}
+BENCH_MODULES = [
+    "generate_realistic_data", "generate_synthetic_data", "cohort_generator",
+    "compact_dataset", "rollups", "monte_carlo_simulation", "parameter_sweep",
+    "risk_profiles_visualization", "visualize_synthetic_data",
+]
+
+
+def _data_targets(targets) -> str:
+    return ", ".join(name for name, (_, has_main) in sorted(targets.items()) if has_main)
+
+
+def _run_target(module: str, has_main: bool, data_file: str):
+    """Run a script's main(data_file), or its __main__ block when it takes no arguments"""
+    if has_main:
+        __import__(module).main(data_file or REALISTIC_DATA)
+    else:
+        runpy.run_module(module, run_name="__main__")
+
+
+def cmd_generate(args):
+    from generation_profiler import StageProfiler
+
+    profiler = StageProfiler(trace_memory=not args.profile_time_only) if args.profile else None
+    if args.kind == "realistic":
+        import generate_realistic_data
+
+        generate_realistic_data.main(args.output or REALISTIC_DATA,
+                                     None if args.no_rollups else "data/realistic_patient_rollups.npz", profiler)
+    elif args.kind == "synthetic":
+        import generate_synthetic_data
+
+        generate_synthetic_data.main(args.output or "data/synthetic_patient_data.json",
+                                     None if args.no_rollups else "data/synthetic_patient_rollups.npz", profiler)
+    else:
+        from cohort_generator import CohortGenerator
+
+        generator = CohortGenerator(start_date=args.start_date, n_days=args.days, random_seed=args.seed)
+        cohort = generator.generate_cohort(n_patients=args.patients)
+        generator.save_data(cohort, args.output or "data/cohort_patient_data.json")
+
+
+def cmd_analyze(args):
+    module, has_main = ANALYSES[args.target]
+    _run_target(module, has_main, args.data)
+
+
+def cmd_plot(args):
+    if args.no_show:
+        import matplotlib
+
+        matplotlib.use("Agg")
+    module, has_main = PLOTS[args.target]
+    _run_target(module, has_main, args.data)
+
+
+def cmd_export(args):
+    from compact_dataset import CompactCohort
+
+    cohort = CompactCohort.load_json(args.input)
+    if args.format == "compact":
+        cohort.save(args.output or "data/compact_cohort.npz")
+    elif args.format == "sharded":
+        from sharded_dataset import write_sharded
+
+        manifest = write_sharded(cohort, args.output or "data/sharded", n_buckets=args.buckets)
+        print(f"Wrote {len(manifest['shards'])} shards")
+    elif args.format == "features":
+        from feature_matrix import FeatureJoiner
+
+        FeatureJoiner(cache_dir=None).join(cohort).save(args.output or "data/patient_features.npz")
+    else:
+        from rollups import RollupStore
+
+        RollupStore.build(cohort).save(args.output or "data/patient_rollups.npz")
+    print(f"Exported {args.input} as {args.format}")
+
+
+def cmd_replay(args):
+    import load_replay
+
+    load_replay.main(args.data, args.url, args.rate, args.compression, args.concurrency, args.limit, args.stub)
+
+
+def cmd_serve(args):
+    import ingestion_server
+
+    ingestion_server.main(args.store, args.host, args.port)
+
+
+def _wall_time(command, repeat: int) -> float:
+    """Best-of-N wall time of a fresh interpreter running a command"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def cmd_bench(args):
+    print(f"{'Startup':<40} {'Best of ' + str(args.repeat):>12}")
+    print("-" * 53)
+    baseline = _wall_time([sys.executable, "-c", "pass"], args.repeat)
+    print(f"{'python (empty interpreter)':<40} {baseline * 1000:>10.0f} ms")
+    print(f"{'cli.py --help':<40} {_wall_time([sys.executable, 'cli.py', '--help'], args.repeat) * 1000:>10.0f} ms")
+    for module in BENCH_MODULES:
+        try:
+            elapsed = _wall_time([sys.executable, "-c", f"import {module}"], args.repeat)
+            print(f"{'import ' + module:<40} {elapsed * 1000:>10.0f} ms")
+        except subprocess.CalledProcessError:
+            print(f"{'import ' + module:<40} {'failed':>13}")
+
+    if args.generate:
+        import generate_realistic_data
+        from generation_profiler import StageProfiler
+
+        profiler = StageProfiler(trace_memory=False)
+        generator = generate_realistic_data.PersonaDataGenerator(profiler=profiler)
+        generator.generate_all_personas()
+        profiler.print_report()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="JuliaHealth synthetic patient data tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Generate patient data")
+    generate.add_argument("kind", choices=["realistic", "synthetic", "cohort"], nargs="?", default="realistic")
+    generate.add_argument("--output", help="Output JSON file")
+    generate.add_argument("--no-rollups", action="store_true", help="Skip materializing rollups")
+    generate.add_argument("--profile", action="store_true", help="Report per-stage timings (realistic and synthetic)")
+    generate.add_argument("--profile-time-only", action="store_true", help="Profile without tracemalloc")
+    generate.add_argument("--patients", type=int, default=200, help="Cohort size (cohort only)")
+    generate.add_argument("--days", type=int, default=180, help="Study length (cohort only)")
+    generate.add_argument("--start-date", default="2024-01-01", help="Study start date (cohort only)")
+    generate.add_argument("--seed", type=int, default=42, help="Random seed (cohort only)")
+    generate.set_defaults(func=cmd_generate)
+
+    analyze = subparsers.add_parser("analyze", help="Run an analysis")
+    analyze.add_argument("target", choices=sorted(ANALYSES))
+    analyze.add_argument("--data", help=f"Input JSON file (default {REALISTIC_DATA}); only for {_data_targets(ANALYSES)}")
+    analyze.set_defaults(func=cmd_analyze)
+
+    plot = subparsers.add_parser("plot", help="Render a figure")
+    plot.add_argument("target", choices=sorted(PLOTS))
+    plot.add_argument("--data", help=f"Input JSON file (default {REALISTIC_DATA}); only for {_data_targets(PLOTS)}")
+    plot.add_argument("--no-show", action="store_true", help="Save figures without opening a window")
+    plot.set_defaults(func=cmd_plot)
+
+    export = subparsers.add_parser("export", help="Convert a JSON dataset to a columnar format")
+    export.add_argument("format", choices=["compact", "sharded", "rollups", "features"])
+    export.add_argument("--input", default=REALISTIC_DATA, help="Input JSON file")
+    export.add_argument("--output", help="Output file or directory")
+    export.add_argument("--buckets", type=int, default=16, help="Patient hash buckets (sharded only)")
+    export.set_defaults(func=cmd_export)
+
+    replay = subparsers.add_parser("replay", help="Replay a dataset against an ingestion endpoint")
+    replay.add_argument("--data", default=REALISTIC_DATA, help="Input JSON file")
+    replay.add_argument("--url", default="http://127.0.0.1:8765/ingest", help="Endpoint receiving POSTed events")
+    replay.add_argument("--rate", type=float, help="Target events per second")
+    replay.add_argument("--compression", type=float, help="Time compression (86400 = one study day per second)")
+    replay.add_argument("--concurrency", type=int, default=16, help="Connections and in-flight requests")
+    replay.add_argument("--limit", type=int, help="Stop after this many events")
+    replay.add_argument("--stub", action="store_true", help="Start the bundled stub server at --url")
+    replay.set_defaults(func=cmd_replay)
+
+    serve = subparsers.add_parser("serve", help="Run the local ingestion server")
+    serve.add_argument("--store", default="data/ingest", help="Log store directory")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.set_defaults(func=cmd_serve)
+
+    bench = subparsers.add_parser("bench", help="Measure startup and import times")
+    bench.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    bench.add_argument("--generate", action="store_true", help="Also profile realistic data generation")
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    targets = {"analyze": ANALYSES, "plot": PLOTS}.get(args.command)
+    if targets and args.data is not None and not targets[args.target][1]:
+        # These run their module's __main__ demo on its own inputs; don't silently ignore the flag
+        parser.error(f"{args.command} {args.target} does not take --data "
+                     f"(supported by: {_data_targets(targets)})")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
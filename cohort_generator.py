@@ -0,0 +1,361 @@
+import json
+import zlib
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from generate_realistic_data import (
+    AppleWatchData, PHQ5Response, MoodDiaryEntry, ChatInteraction, SobrietyData
+)
+from monte_carlo_simulation import build_risk_model, base_relapse_risk
+
+DAY_BLOCK = 7  # Random streams are keyed per (patient, stream, week of study)
+
+RECORD_STREAMS = ["apple_watch", "phq5", "mood_diary", "chat", "sobriety"]
+STREAM_KEYS = {"profile": 0, "state": 1, "apple_watch": 2, "phq5": 3, "mood_diary": 4, "chat": 5, "sobriety": 6}
+
+# Biomarker and engagement templates, taken from the per-persona methods in generate_realistic_data.py.
+# Series are (mean, std, phi, stress_effect, clip_low, clip_high).
+PERSONA_TEMPLATES = {
+    "sarah_chen": {
+        "persona": "Sarah Chen", "persona_type": "tech_savvy_professional",
+        "resting_hr": (80, 3, 0.8, 8, 40, 130), "hrv": (25, 2, 0.8, -6, 10, 45),
+        "sleep": (7.5, 0.5, 0.6, -0.8, 5, 10), "sleep_eff": (85, 5, 0.7, -12, 60, 95),
+        "steps": (8000, 1500, 0.5, 0, 3000, 15000), "steps_weekend": 0.15,
+        "avg_hr_offset": (15, 25), "deep_ratio": 0.18, "rem_ratio": 0.25, "calories_per_step": 0.04,
+        "exercise": (0.6, 25, 15), "stand_hours": ((8, 12), (4, 9)), "stress_score": (60, 30, 5),
+        "diary_prob": (0.95, 0.85), "word_count": (80, 200), "pain": (0, 0),
+        "mood": (7.5, 4), "craving_scale": 8,
+        "triggers": ["work deadline", "presentation", "long hours", "conflict"],
+        "coping": (["meditation", "deep breathing", "call therapist", "exercise"], ["journaling", "gratitude", "exercise", "routine"]),
+        "chat_prob": 1.0, "chats_per_day": ((2, 5), (4, 7)), "chat_hours": (8, 22), "message_count": (2, 15),
+        "response_hours": (0.1, 3.0), "sentiment": (0.3, 0.8, -0.8, 0.8), "engagement": (8, 3), "crisis_risk": 0.5,
+        "topics": (["work stress", "coping strategies", "sleep"], ["progress", "goals", "routine"]),
+    },
+    "marcus_rodriguez": {
+        "persona": "Marcus Rodriguez", "persona_type": "veteran_in_recovery",
+        "resting_hr": (72, 4, 0.8, 15, 40, 130), "hrv": (28, 3, 0.8, -10, 12, 45),
+        "sleep": (6.5, 0.6, 0.7, -1.2, 4, 9), "sleep_eff": (75, 6, 0.7, -15, 50, 90),
+        "steps": (12000, 2000, 0.6, 0, 5000, 18000), "steps_weekend": 0.2,
+        "avg_hr_offset": (12, 20), "deep_ratio": 0.15, "rem_ratio": 0.20, "calories_per_step": 0.05,
+        "exercise": (0.3, 15, 10), "stand_hours": ((10, 14), (4, 8)), "stress_score": (70, 25, 8),
+        "diary_prob": (0.6, 0.4), "word_count": (15, 50), "pain": (3, 7),
+        "mood": (6.5, 3), "craving_scale": 6,
+        "triggers": ["nightmare", "flashback", "loud noise", "crowd"],
+        "coping": (["breathing exercises", "walk"], ["work", "routine"]),
+        "chat_prob": 0.35, "chats_per_day": ((1, 1), (1, 1)), "chat_hours": (18, 21), "message_count": (2, 8),
+        "response_hours": (3, 12), "sentiment": (0.1, 0.6, -0.6, 0.4), "engagement": (6, 2), "crisis_risk": 0.5,
+        "topics": (["PTSD", "pain", "family"], ["work", "routine", "meetings"]),
+    },
+    "jessica_thompson": {
+        "persona": "Jessica Thompson", "persona_type": "young_adult_student",
+        "resting_hr": (82, 5, 0.7, 12, 40, 130), "hrv": (32, 4, 0.6, -8, 15, 50),
+        "sleep": (6.8, 1.2, 0.5, 0, 4, 11), "sleep_eff": (78, 8, 0.6, -10, 60, 92),
+        "steps": (9000, 2500, 0.4, 0, 3000, 16000), "steps_weekend": 0.0,
+        "avg_hr_offset": (18, 28), "deep_ratio": 0.20, "rem_ratio": 0.28, "calories_per_step": 0.045,
+        "exercise": (0.7, 35, 20), "stand_hours": ((6, 11), (6, 11)), "stress_score": (65, 25, 10),
+        "diary_prob": (0.92, 0.92), "word_count": (150, 350), "pain": (0, 0),
+        "mood": (7.2, 3.5), "craving_scale": 7,
+        "triggers": ["party invite", "peer pressure", "exam stress", "social anxiety"],
+        "coping": (["text friend", "music", "exercise"], ["study", "gratitude"]),
+        "chat_prob": 1.0, "chats_per_day": ((4, 9), (4, 9)), "chat_hours": (7, 23), "message_count": (6, 25),
+        "response_hours": (0.05, 2.0), "sentiment": (0.4, 0.7, -0.7, 0.8), "engagement": (8.5, 2), "crisis_risk": 0.6,
+        "topics": (["college stress", "social pressure", "future goals"], ["progress", "career", "recovery"]),
+    },
+    "robert_williams": {
+        "persona": "Robert Williams", "persona_type": "empty_nester",
+        "resting_hr": (68, 3, 0.85, 8, 40, 130), "hrv": (22, 2, 0.8, -5, 12, 35),
+        "sleep": (8.5, 0.8, 0.8, 1.2, 6, 12), "sleep_eff": (68, 6, 0.8, -10, 45, 80),
+        "steps": (3500, 800, 0.7, -800, 1200, 6000), "steps_weekend": 0.0,
+        "avg_hr_offset": (8, 15), "deep_ratio": 0.12, "rem_ratio": 0.16, "calories_per_step": 0.03,
+        "exercise": (0.2, 10, 8), "stand_hours": ((4, 8), (4, 8)), "stress_score": (55, 35, 8),
+        "diary_prob": (0.45, 0.25), "word_count": (8, 30), "pain": (4, 8),
+        "mood": (5.2, 2.5), "craving_scale": 5.5,
+        "triggers": ["loneliness", "missing family", "boredom"],
+        "coping": (["TV", "nap"], ["routine", "walk"]),
+        "chat_prob": 0.25, "chats_per_day": ((1, 1), (1, 1)), "chat_hours": (14, 19), "message_count": (1, 5),
+        "response_hours": (6, 24), "sentiment": (-0.2, 0.5, -0.8, 0.2), "engagement": (4.5, 2), "crisis_risk": 0.4,
+        "topics": (["loneliness", "health", "family"], ["routine", "court", "medication"]),
+    },
+}
+
+BIOMARKERS = ["resting_hr", "hrv", "sleep", "sleep_eff", "steps"]
+
+
+def stream_rng(seed: int, patient_id: str, stream: str, block: int) -> np.random.Generator:
+    """Counter-based generator for one (patient, stream, day block), independent of everything else"""
+    key = np.random.SeedSequence([seed, zlib.crc32(patient_id.encode()), STREAM_KEYS[stream], block])
+    return np.random.Generator(np.random.Philox(key=key.generate_state(2, dtype=np.uint64)))
+
+
+def asdict(record) -> Dict[str, Any]:
+    """Shallow dataclass-to-dict; list fields are built fresh per record so no deep copy is needed"""
+    return dict(vars(record))
+
+
+def persona_for(patient_id: str) -> str:
+    """Stable persona template assignment for a patient id"""
+    if patient_id in PERSONA_TEMPLATES:
+        return patient_id
+    return sorted(PERSONA_TEMPLATES)[zlib.crc32(patient_id.encode()) % len(PERSONA_TEMPLATES)]
+
+
+class CohortGenerator:
+    """Generate any number of patients from the persona templates with random access by patient and day.
+
+    Every random draw comes from a Philox stream keyed by (seed, patient, stream,
+    day block) and each block is always generated whole, so a single patient or
+    any day range can be produced directly and matches that slice of a full run.
+    Day-to-day state (regimes, AR(1) biomarkers, sobriety) is replayed from day 0
+    for the requested patient only; that replay draws just the cheap "state"
+    blocks and builds no records.
+    """
+
+    def __init__(self, start_date: str = "2024-01-01", n_days: int = 180, random_seed: int = 42):
+        self.start_date = datetime.strptime(start_date, "%Y-%m-%d")
+        self.start = np.datetime64(start_date, "D")
+        self.n_days = n_days
+        self.random_seed = random_seed
+
+    def _rng(self, patient_id: str, stream: str, block: int) -> np.random.Generator:
+        return stream_rng(self.random_seed, patient_id, stream, block)
+
+    def patient_profile(self, patient_id: str) -> Dict[str, Any]:
+        """Per-patient variation around the persona template (initial sobriety, baselines)"""
+        persona_id = persona_for(patient_id)
+        template = PERSONA_TEMPLATES[persona_id]
+        model = build_risk_model(persona_id)
+        if patient_id == persona_id:
+            return {"persona_id": persona_id, "template": template, "model": model, "baseline_shift": np.zeros(len(BIOMARKERS))}
+        rng = self._rng(patient_id, "profile", 0)
+        model["initial_sobriety"] = int(rng.integers(max(1, model["initial_sobriety"] // 2), model["initial_sobriety"] * 2 + 1))
+        shift = rng.normal(0, 0.05, len(BIOMARKERS))  # +/- 5% baseline differences between patients
+        return {"persona_id": persona_id, "template": template, "model": model, "baseline_shift": shift}
+
+    def _state(self, profile: Dict[str, Any], patient_id: str, n_days: int) -> Dict[str, np.ndarray]:
+        """Replay regime, biomarker and sobriety state from day 0 through day n_days - 1"""
+        template, model = profile["template"], profile["model"]
+        n_blocks = -(-n_days // DAY_BLOCK)
+        draws, normals, resets = [], [], []
+        for block in range(n_blocks):
+            # Fixed-shape draws per block: uniforms (regime, relapse), normals (regime, biomarkers), reset days
+            rng = self._rng(patient_id, "state", block)
+            draws.append(rng.random((DAY_BLOCK, 2)))
+            normals.append(rng.standard_normal((DAY_BLOCK, 1 + len(BIOMARKERS))))
+            resets.append(rng.integers(1, 8, DAY_BLOCK))
+        u = np.concatenate(draws)[:n_days]
+        z = np.concatenate(normals)[:n_days]
+        reset_to = np.concatenate(resets)[:n_days]
+
+        # Regime switching, as in generate_regime_switching_series
+        stress = np.zeros(n_days)
+        is_high = np.zeros(n_days, dtype=bool)
+        high = False
+        for t in range(n_days):
+            high = u[t, 0] >= model["prob_exit_high"] if high else u[t, 0] < model["prob_enter_high"]
+            is_high[t] = high
+            if not high:
+                stress[t] = model["base_std"] * z[t, 0] if t == 0 else 0.8 * stress[t - 1] + model["base_std"] * 0.5 * z[t, 0]
+            elif t == 0 or not is_high[t - 1]:
+                stress[t] = model["high_mean"] + model["high_std"] * z[t, 0]
+            else:
+                stress[t] = 0.9 * stress[t - 1] + 0.1 * model["high_mean"] + model["high_std"] * 0.3 * z[t, 0]
+
+        # AR(1) biomarkers with stress effects and weekly seasonality around the template mean
+        state = {"stress": stress, "is_high": is_high}
+        weekday = ((self.start + np.arange(n_days)).astype("datetime64[D]").view("int64") - 4) % 7  # Monday == 0
+        for i, name in enumerate(BIOMARKERS):
+            mean, std, phi, effect, low, high_clip = template[name]
+            mean *= 1 + profile["baseline_shift"][i]
+            series = np.empty(n_days)
+            series[0] = mean + std * z[0, 1 + i]
+            innovation = std * np.sqrt(1 - phi**2)
+            for t in range(1, n_days):
+                series[t] = phi * series[t - 1] + (1 - phi) * mean + innovation * z[t, 1 + i]
+            series += is_high * effect
+            if name == "steps" and template["steps_weekend"]:
+                series += np.where(weekday >= 5, -template["steps_weekend"], template["steps_weekend"] * 0.3) * mean
+            state[name] = np.clip(series, low, high_clip)
+
+        # Sobriety and relapse risk, as in monte_carlo_simulation.simulate_replicates
+        risk = np.empty(n_days)
+        sobriety = np.empty(n_days, dtype=np.int64)
+        relapsed = np.zeros(n_days, dtype=bool)
+        # Baseline risk for every sobriety count the replay can reach
+        max_sober = model["initial_sobriety"] + n_days + 1
+        baseline = base_relapse_risk(np.arange(max_sober + 1), model)
+        current = model["initial_sobriety"]
+        for t in range(n_days):
+            current += 1
+            current_risk = min(max(baseline[current] + stress[t], 0.05), model["max_risk"])
+            if u[t, 1] < current_risk * model["relapse_multiplier"]:
+                relapsed[t] = True
+                if current > model["min_sobriety_for_reset"]:
+                    current = int(reset_to[t])
+                    current_risk = min(max(baseline[current] + stress[t], 0.05), model["max_risk"])
+            risk[t] = float(current_risk)
+            sobriety[t] = current
+        state.update({"risk": risk, "sobriety": sobriety, "relapsed": relapsed})
+        return state
+
+    def _day_records(self, template: Dict[str, Any], state: Dict[str, np.ndarray], day: int,
+                     rngs: Dict[str, np.random.Generator]) -> Dict[str, List[Dict[str, Any]]]:
+        """Build one day's records; each stream draws only from its own block generator"""
+        date = self.start + day
+        date_str = str(date)
+        weekday = (date.astype("int64") - 4) % 7
+        risk, high, sober = float(state["risk"][day]), bool(state["is_high"][day]), int(state["sobriety"][day])
+        relapsed = bool(state["relapsed"][day])
+        sleep = float(state["sleep"][day])
+        out = {stream: [] for stream in RECORD_STREAMS}
+
+        rng = rngs["apple_watch"]
+        steps = float(state["steps"][day])
+        exercise_prob, exercise_mean, exercise_std = template["exercise"]
+        stand = template["stand_hours"][0 if weekday < 5 else 1]
+        stress_scale, stress_offset, stress_noise = template["stress_score"]
+        out["apple_watch"].append(asdict(AppleWatchData(
+            date=date_str,
+            heart_rate_avg=float(state["resting_hr"][day] + rng.integers(template["avg_hr_offset"][0], template["avg_hr_offset"][1] + 1)),
+            heart_rate_resting=float(state["resting_hr"][day]),
+            heart_rate_variability=float(state["hrv"][day]),
+            sleep_duration_hours=sleep,
+            sleep_efficiency=float(state["sleep_eff"][day]),
+            deep_sleep_hours=sleep * (template["deep_ratio"] + rng.normal(0, 0.02)),
+            rem_sleep_hours=sleep * (template["rem_ratio"] + rng.normal(0, 0.03)),
+            steps=int(steps),
+            active_calories=int(steps * template["calories_per_step"] + rng.normal(0, 20)),
+            exercise_minutes=max(0, int(rng.normal(exercise_mean, exercise_std))) if rng.random() < exercise_prob else 0,
+            stand_hours=int(rng.integers(stand[0], stand[1] + 1)),
+            stress_score=risk * stress_scale + stress_offset + rng.normal(0, stress_noise),
+        )))
+
+        # PHQ-5 responses (weekly)
+        if day % 7 == 0:
+            rng = rngs["phq5"]
+            base_depression = max(0, 3 - sober // 60)
+            items = [min(3, max(0, int(base + high + rng.normal(0, 0.5))))
+                     for base in (base_depression, base_depression, 1, base_depression)]
+            items.append(min(3, max(0, int(base_depression + rng.normal(0, 0.5)))))
+            out["phq5"].append(asdict(PHQ5Response(date_str, *items, total_score=sum(items))))
+
+        rng = rngs["mood_diary"]
+        triggers = []
+        if rng.random() < template["diary_prob"][1 if high else 0]:
+            if high:
+                k = int(rng.integers(1, min(3, len(template["triggers"])) + 1))
+                triggers = list(rng.choice(template["triggers"], size=k, replace=False))
+            if relapsed:
+                triggers += ["guilt", "shame", "restart anxiety"]
+            coping_pool = template["coping"][0 if triggers else 1]
+            coping = list(rng.choice(coping_pool, size=int(rng.integers(1, len(coping_pool) + 1)), replace=False))
+            mood_base, mood_scale = template["mood"]
+            pain = template["pain"]
+            out["mood_diary"].append(asdict(MoodDiaryEntry(
+                date=date_str,
+                mood_rating=max(1, min(10, mood_base - risk * mood_scale + rng.normal(0, 0.8))),
+                anxiety_level=max(1, min(10, 4 + len(triggers) + risk * 3)),
+                craving_intensity=min(10, max(0, risk * template["craving_scale"] + rng.normal(0, 1))),
+                energy_level=max(1, min(10, 8 - len(triggers) - risk * 2)),
+                sleep_quality=float(state["sleep_eff"][day]) / 10,
+                pain_level=int(rng.integers(pain[0], pain[1] + 1)) if pain[1] else 0,
+                triggers=[str(t) for t in triggers],
+                coping_strategies=[str(c) for c in coping],
+                notes=f"Day {sober} sober. {'Just relapsed - need to reset and focus' if relapsed else 'Challenging period' if high else 'Staying focused on recovery'}.",
+                word_count=int(rng.integers(template["word_count"][0], template["word_count"][1] + 1)),
+            )))
+
+        rng = rngs["chat"]
+        if rng.random() < template["chat_prob"]:
+            low, high_count = template["chats_per_day"][1 if high else 0]
+            base, scale, floor, ceiling = template["sentiment"]
+            eng_base, eng_scale = template["engagement"]
+            topics = ["relapse", "guilt", "restart", "support"] if relapsed else template["topics"][0 if high else 1]
+            for _ in range(int(rng.integers(low, high_count + 1))):
+                out["chat"].append(asdict(ChatInteraction(
+                    date=date_str,
+                    time=f"{int(rng.integers(template['chat_hours'][0], template['chat_hours'][1] + 1)):02d}:{int(rng.integers(0, 60)):02d}",
+                    message_count=int(rng.integers(template["message_count"][0], template["message_count"][1] + 1)),
+                    avg_response_time_hours=float(rng.uniform(*template["response_hours"])),
+                    sentiment_score=max(floor, min(ceiling, base - risk * scale - (0.4 if relapsed else 0) + rng.normal(0, 0.2))),
+                    topics=list(topics),
+                    crisis_indicators=high and risk > template["crisis_risk"],
+                    engagement_level=max(1, min(10, eng_base - risk * eng_scale)),
+                )))
+
+        rng = rngs["sobriety"]
+        out["sobriety"].append(asdict(SobrietyData(
+            date=date_str,
+            days_sober=sober,
+            relapse_risk_score=risk,
+            in_treatment=True,
+            medication_adherence=max(0.7, min(1.0, 0.92 + rng.normal(0, 0.05))),
+            meeting_attendance=int(rng.integers(2, 4)),
+            relapse_occurred=relapsed,
+        )))
+        return out
+
+    def generate_patient(self, patient_id: str, first_day: int = 0, last_day: Optional[int] = None) -> Dict[str, Any]:
+        """Generate one patient's records for study days first_day..last_day (inclusive)"""
+        last_day = self.n_days - 1 if last_day is None else min(last_day, self.n_days - 1)
+        profile = self.patient_profile(patient_id)
+        template = profile["template"]
+        state = self._state(profile, patient_id, last_day + 1)
+
+        data = {
+            "persona": template["persona"],
+            "persona_type": template["persona_type"],
+            **{stream: [] for stream in RECORD_STREAMS}
+        }
+        for block in range(first_day // DAY_BLOCK, last_day // DAY_BLOCK + 1):
+            rngs = {stream: self._rng(patient_id, stream, block) for stream in RECORD_STREAMS}
+            # Always walk the whole block so each day's draws do not depend on the requested range
+            for day in range(block * DAY_BLOCK, min((block + 1) * DAY_BLOCK, last_day + 1)):
+                records = self._day_records(template, state, day, rngs)
+                if day >= first_day:
+                    for stream, rows in records.items():
+                        data[stream].extend(rows)
+        return data
+
+    def patient_ids(self, n_patients: int) -> List[str]:
+        return [f"patient_{i:07d}" for i in range(n_patients)]
+
+    def generate_cohort(self, n_patients: Optional[int] = None, patient_ids: Optional[List[str]] = None,
+                        first_day: int = 0, last_day: Optional[int] = None) -> Dict[str, Any]:
+        """Generate many patients in the same layout as PersonaDataGenerator.generate_all_personas"""
+        patient_ids = patient_ids or self.patient_ids(n_patients)
+        return {
+            "generation_info": {
+                "start_date": self.start_date.strftime("%Y-%m-%d"),
+                "days_generated": self.n_days,
+                "generation_method": "counter_based_cohort",
+                "random_seed": self.random_seed,
+                "day_block": DAY_BLOCK,
+                "generation_timestamp": datetime.now().isoformat()
+            },
+            "personas": {pid: self.generate_patient(pid, first_day, last_day) for pid in patient_ids}
+        }
+
+    def save_data(self, data: Dict[str, Any], filename: str = "data/cohort_patient_data.json"):
+        """Save generated data to JSON file"""
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
+        print(f"Cohort data saved to {filename}")
+
+
+if __name__ == "__main__":
+    generator = CohortGenerator(start_date="2024-01-01", n_days=180)
+    cohort = generator.generate_cohort(n_patients=200)
+    generator.save_data(cohort)
+
+    # Random access: one week of one patient, without generating anyone else
+    patient_id = "patient_0000123"
+    week = generator.generate_patient(patient_id, first_day=70, last_day=76)
+    full = cohort["personas"][patient_id]
+    matches = all(
+        week[stream] == [r for r in full[stream] if "2024-03-11" <= r["date"] <= "2024-03-17"]
+        for stream in RECORD_STREAMS
+    )
+    print(f"\n{patient_id} ({full['persona']}) days 70-76: {len(week['chat'])} chats, "
+          f"risk {[round(s['relapse_risk_score'], 3) for s in week['sobriety']]}")
+    print(f"Identical to the same slice of the full run: {matches}")
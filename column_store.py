@@ -0,0 +1,219 @@
+import json
+import os
+import numpy as np
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+
+from anomaly_detection import ANOMALY_METRICS, AnomalyFlags, detect_anomalies
+from feature_matrix import FeatureJoiner, FeatureMatrix
+from relapse_training import FEATURES, MISSING_INDICATORS, design_matrix
+from sharded_dataset import ShardedDataset
+
+FORMAT_VERSION = 1
+META_FILE = "store.json"
+CHUNK_BYTES = 256 * 1024 * 1024  # Budget for the columns one chunk touches
+
+
+class ColumnStore:
+    """Patient x day feature columns on disk, one .npy file each, opened with np.memmap.
+
+    Rows follow FeatureMatrix's patient-major layout (row = patient * n_days
+    + day), so any run of whole patients is one contiguous slice of every
+    file. Opening a store only reads the small JSON header and the .npy
+    headers. Column data is paged in by the OS as slices are touched, and
+    `chunks()` hands analyses FeatureMatrix views of a few thousand patients
+    at a time. Cohorts and horizons larger than RAM are processed in
+    memory bounded by the chunk size.
+    """
+
+    def __init__(self, root: str, mode: str = "r"):
+        self.root = root
+        with open(os.path.join(root, META_FILE), 'r') as f:
+            self.meta = json.load(f)
+        self.start_date = self.meta["start_date"]
+        self.patient_ids = self.meta["patient_ids"]
+        self.n_days = self.meta["n_days"]
+        self.mode = mode
+        self.columns = {name: np.load(self._path(name), mmap_mode=mode) for name in self.meta["columns"]}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.npy")
+
+    @classmethod
+    def create(cls, root: str, start_date: str, patient_ids: List[str], n_days: int,
+               dtypes: Dict[str, Any]) -> "ColumnStore":
+        """Allocate an empty store (files are sparse until written) and open it for writing"""
+        os.makedirs(root, exist_ok=True)
+        n_rows = len(patient_ids) * n_days
+        for name, dtype in dtypes.items():
+            np.lib.format.open_memmap(os.path.join(root, f"{name}.npy"), mode="w+", dtype=dtype, shape=(n_rows,))
+        meta = {"format_version": FORMAT_VERSION, "start_date": start_date, "patient_ids": list(patient_ids),
+                "n_days": n_days, "columns": {name: np.dtype(dtype).str for name, dtype in dtypes.items()}}
+        with open(os.path.join(root, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        return cls(root, mode="r+")
+
+    @property
+    def n_patients(self) -> int:
+        return len(self.patient_ids)
+
+    @property
+    def n_rows(self) -> int:
+        return self.n_patients * self.n_days
+
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+    def add_column(self, name: str, dtype: Any, fill: Any = 0) -> np.memmap:
+        """New writable column (e.g. a derived score), registered in the header"""
+        values = np.lib.format.open_memmap(self._path(name), mode="w+", dtype=dtype, shape=(self.n_rows,))
+        values[:] = fill
+        self.columns[name] = values
+        self.meta["columns"][name] = np.dtype(dtype).str
+        with open(os.path.join(self.root, META_FILE), 'w') as f:
+            json.dump(self.meta, f)
+        return values
+
+    def write(self, first_patient: int, features: FeatureMatrix):
+        """Copy a FeatureMatrix of consecutive patients into their rows"""
+        rows = slice(first_patient * self.n_days, first_patient * self.n_days + features.n_rows)
+        for name, values in self.columns.items():
+            if name in features.columns:
+                values[rows] = features.columns[name]
+
+    def flush(self):
+        for values in self.columns.values():
+            if isinstance(values, np.memmap):
+                values.flush()
+
+    def features(self) -> FeatureMatrix:
+        """The whole store as a FeatureMatrix over memmapped columns (nothing is read yet)"""
+        return FeatureMatrix(self.start_date, self.patient_ids, self.n_days, self.columns)
+
+    def patients_per_chunk(self, columns: Optional[List[str]] = None, chunk_bytes: int = CHUNK_BYTES) -> int:
+        names = columns or list(self.columns)
+        row_bytes = sum(self.columns[name].dtype.itemsize for name in names)
+        return max(1, chunk_bytes // max(row_bytes * self.n_days, 1))
+
+    def chunks(self, columns: Optional[List[str]] = None,
+               chunk_bytes: int = CHUNK_BYTES) -> Iterator[Tuple[int, FeatureMatrix]]:
+        """(first patient, FeatureMatrix of memmap slices) for runs of whole patients.
+
+        Chunks never split a patient, so per-patient windows and forward
+        fills give the same result as on the full grid.
+        """
+        names = columns or list(self.columns)
+        step = self.patients_per_chunk(names, chunk_bytes)
+        for first in range(0, self.n_patients, step):
+            last = min(first + step, self.n_patients)
+            rows = slice(first * self.n_days, last * self.n_days)
+            yield first, FeatureMatrix(self.start_date, self.patient_ids[first:last], self.n_days,
+                                       {name: self.columns[name][rows] for name in names})
+
+    def map_chunks(self, fn: Callable[[FeatureMatrix], Any], columns: Optional[List[str]] = None,
+                   chunk_bytes: int = CHUNK_BYTES) -> List[Tuple[int, Any]]:
+        return [(first, fn(chunk)) for first, chunk in self.chunks(columns, chunk_bytes)]
+
+
+def build_column_store(dataset: ShardedDataset, root: str, n_days: Optional[int] = None) -> ColumnStore:
+    """Join a sharded cohort bucket by bucket straight into a column store.
+
+    Only one bucket's records and feature grid are in memory at a time.
+    Patients are stored bucket by bucket, so the store's patient order
+    differs from the manifest's.
+    """
+    if n_days is None:
+        n_days = 1 + max(entry["day_max"] for shard in dataset.shards for entry in shard["streams"].values())
+    buckets = dataset.buckets()
+    codes = {bucket: sorted(set().union(*(s["patients"] for s in dataset.shards if s["bucket"] == bucket)))
+             for bucket in buckets}
+    patient_ids = [dataset.patient_ids[code] for bucket in buckets for code in codes[bucket]]
+
+    store, first = None, 0
+    for bucket in buckets:
+        features = FeatureJoiner.join(dataset.bucket_cohort(bucket), n_days)
+        if store is None:
+            store = ColumnStore.create(root, dataset.start_date, patient_ids, n_days,
+                                       {name: values.dtype for name, values in features.columns.items()})
+        store.write(first, features)
+        first += len(features.patient_ids)
+    store.flush()
+    return ColumnStore(root)
+
+
+def chunked_anomalies(store: ColumnStore, metrics: Optional[List[str]] = None, window: int = 14,
+                      threshold: float = 3.0, min_periods: int = 7, chunk_bytes: int = CHUNK_BYTES) -> AnomalyFlags:
+    """detect_anomalies over the whole store, one chunk of patients at a time"""
+    metrics = list(metrics or ANOMALY_METRICS)
+    parts = store.map_chunks(lambda chunk: detect_anomalies(chunk, metrics, window, threshold, min_periods),
+                             metrics, chunk_bytes)
+    return AnomalyFlags(store.features(), metrics,
+                        np.concatenate([flags.patient + np.int32(first) for first, flags in parts]),
+                        *(np.concatenate([getattr(flags, name) for _, flags in parts]) for name in ("day", "metric", "z")))
+
+
+def chunked_relapse_scores(store: ColumnStore, model, scaler, name: str = "relapse_probability",
+                           chunk_bytes: int = CHUNK_BYTES) -> np.memmap:
+    """Score every patient-day with a trained relapse model into a new memmapped column"""
+    scores = store.add_column(name, np.float32, np.nan)
+    for first, chunk in store.chunks(FEATURES + MISSING_INDICATORS, chunk_bytes):
+        rows = slice(first * store.n_days, first * store.n_days + chunk.n_rows)
+        scores[rows] = model.predict_proba(scaler.transform(design_matrix(chunk)))
+    scores.flush()
+    return scores
+
+
+def chunked_risk_summary(store: ColumnStore, threshold: float = 0.6, chunk_bytes: int = CHUNK_BYTES) -> Dict[str, np.ndarray]:
+    """Per-patient mean relapse risk, high-risk days and longest high-risk run, chunk by chunk"""
+    column = "sobriety.relapse_risk_score"
+    mean, high_days, longest = [], [], []
+    for _, chunk in store.chunks([column], chunk_bytes):
+        risk = np.asarray(chunk.columns[column], dtype=np.float64).reshape(-1, store.n_days)
+        high = risk >= threshold
+        # Longest run per row: days since the last non-high day, maxed over the row
+        days = np.arange(store.n_days)
+        last_low = np.maximum.accumulate(np.where(high, -1, days), axis=1)
+        mean.append(np.nanmean(risk, axis=1))
+        high_days.append(high.sum(axis=1))
+        longest.append((days - last_low).max(axis=1))
+    return {"mean_risk": np.concatenate(mean), "high_risk_days": np.concatenate(high_days),
+            "longest_high_risk_run": np.concatenate(longest)}
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from relapse_training import build_cohort_shards, RelapseTrainer
+
+    root = 'data/cohort_sharded'
+    if not os.path.exists(os.path.join(root, "manifest.json")):
+        print("Generating a 1,000 patient cohort...")
+        build_cohort_shards(root, n_patients=1000)
+    dataset = ShardedDataset(root)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        store = build_column_store(dataset, tmp)
+        print(f"Column store: {store.n_patients:,} patients x {store.n_days} days x {len(store.columns)} columns, "
+              f"{store.nbytes() / 1e6:.0f} MB on disk, built in {time.perf_counter() - start:.2f} s")
+
+        # A small chunk budget stands in for a cohort much larger than RAM
+        budget = 4 * 1024 * 1024
+        print(f"Chunks of {store.patients_per_chunk(chunk_bytes=budget)} patients (all columns) "
+              f"under a {budget // 2**20} MB budget")
+        start = time.perf_counter()
+        flags = chunked_anomalies(store, chunk_bytes=budget)
+        print(f"Anomalies: {len(flags):,} flags in {time.perf_counter() - start:.2f} s {flags.counts()}")
+        in_memory = detect_anomalies(FeatureMatrix(store.start_date, store.patient_ids, store.n_days,
+                                                   {name: np.array(values) for name, values in store.columns.items()}))
+        assert np.array_equal(flags.patient, in_memory.patient) and np.allclose(flags.z, in_memory.z)
+
+        summary = chunked_risk_summary(store, chunk_bytes=budget)
+        print(f"Risk: mean {np.nanmean(summary['mean_risk']):.3f}, median {np.median(summary['high_risk_days']):.0f} "
+              f"high-risk days, longest run {summary['longest_high_risk_run'].max()} days")
+
+        trainer = RelapseTrainer(root, n_workers=1)
+        trainer.fit(epochs=1)
+        start = time.perf_counter()
+        scores = chunked_relapse_scores(store, trainer.model, trainer.scaler, chunk_bytes=budget)
+        print(f"Relapse model scored {len(scores):,} patient-days into a memmapped column in "
+              f"{time.perf_counter() - start:.2f} s (mean probability {np.nanmean(scores):.3f})")
@@ -0,0 +1,328 @@
+import json
+import sys
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+STREAMS = ["apple_watch", "phq5", "mood_diary", "chat", "sobriety"]
+
+# Numeric columns per stream and their compact dtypes ("date" and list fields are encoded separately)
+STREAM_COLUMNS = {
+    "apple_watch": {
+        "heart_rate_avg": np.float32,
+        "heart_rate_resting": np.float32,
+        "heart_rate_variability": np.float32,
+        "sleep_duration_hours": np.float32,
+        "sleep_efficiency": np.float32,
+        "deep_sleep_hours": np.float32,
+        "rem_sleep_hours": np.float32,
+        "steps": np.int32,  # Can exceed int16 range on very active days
+        "active_calories": np.int16,
+        "exercise_minutes": np.int16,
+        "stand_hours": np.int16,
+        "stress_score": np.float32,
+    },
+    "phq5": {
+        "little_interest": np.int16,
+        "feeling_down": np.int16,
+        "sleep_trouble": np.int16,
+        "tired_energy": np.int16,
+        "appetite": np.int16,
+        "total_score": np.int16,
+    },
+    "mood_diary": {
+        "mood_rating": np.float32,
+        "anxiety_level": np.float32,
+        "craving_intensity": np.float32,
+        "energy_level": np.float32,
+        "sleep_quality": np.float32,
+        "pain_level": np.float32,
+        "word_count": np.int16,
+    },
+    "chat": {
+        "message_count": np.int16,
+        "avg_response_time_hours": np.float32,
+        "sentiment_score": np.float32,
+        "crisis_indicators": np.bool_,
+        "engagement_level": np.float32,
+    },
+    "sobriety": {
+        "days_sober": np.int32,
+        "relapse_risk_score": np.float32,
+        "in_treatment": np.bool_,
+        "medication_adherence": np.float32,
+        "meeting_attendance": np.int16,
+        "relapse_occurred": np.bool_,
+    },
+}
+
+# Fixed vocabularies for list-of-string fields, stored as uint64 bitmasks (max 64 terms each).
+# Covers every term emitted by generate_realistic_data.py and generate_synthetic_data.py.
+TRIGGER_VOCAB = [
+    "work deadline", "presentation", "long hours", "conflict", "social pressure", "guilt", "shame",
+    "restart anxiety", "early recovery", "vulnerability", "nightmare", "flashback", "loud noise", "crowd",
+    "party invite", "peer pressure", "exam stress", "social anxiety", "loneliness", "missing family",
+    "boredom", "presentation anxiety", "back pain", "family stress", "academic pressure", "perfectionism",
+    "party invitation", "FOMO", "public speaking anxiety", "isolation", "court stress",
+]
+COPING_VOCAB = [
+    "meditation", "deep breathing", "call therapist", "exercise", "journaling", "gratitude", "routine",
+    "breathing exercises", "walk", "work", "text friend", "music", "study", "TV", "nap", "meditation app",
+    "call sponsor", "gratitude practice", "self-care", "call kids", "medication", "journal",
+    "listen to music", "study group",
+]
+TOPIC_VOCAB = [
+    "work stress", "coping strategies", "sleep", "progress", "goals", "routine", "relapse", "guilt",
+    "restart", "support", "early recovery", "cravings", "PTSD", "pain", "family", "work", "meetings",
+    "college stress", "social pressure", "future goals", "career", "recovery", "loneliness", "health",
+    "court", "medication", "sleep issues", "gratitude", "pain management", "school stress",
+    "social anxiety", "career plans", "court requirements",
+]
+
+CATEGORICAL_COLUMNS = {
+    "mood_diary": {"triggers": TRIGGER_VOCAB, "coping_strategies": COPING_VOCAB},
+    "chat": {"topics": TOPIC_VOCAB},
+}
+
+INVALID_MINUTE = -1  # minute_of_day sentinel for chat times that are not a valid HH:MM
+
+assert all(len(v) <= 64 for v in (TRIGGER_VOCAB, COPING_VOCAB, TOPIC_VOCAB))
+
+
+def encode_terms(terms_per_row: List[List[str]], vocab: List[str]) -> Tuple[np.ndarray, Dict[int, List[str]]]:
+    """Encode term lists as uint64 bitmasks; terms outside the vocabulary go to an overflow map"""
+    index = {term: i for i, term in enumerate(vocab)}
+    masks = np.zeros(len(terms_per_row), dtype=np.uint64)
+    overflow = {}
+    for row, terms in enumerate(terms_per_row):
+        mask = 0
+        for term in terms:
+            bit = index.get(term)
+            if bit is None:
+                overflow.setdefault(row, []).append(term)
+            else:
+                mask |= 1 << bit
+        masks[row] = mask
+    return masks, overflow
+
+
+def decode_mask(mask: int, vocab: List[str]) -> List[str]:
+    """Expand a bitmask back into its vocabulary terms"""
+    mask = int(mask)
+    return [term for i, term in enumerate(vocab) if mask >> i & 1]
+
+
+def mask_for(terms: List[str], vocab: List[str]) -> np.uint64:
+    """Bitmask matching any of the given terms, for vectorized filtering"""
+    return np.uint64(sum(1 << vocab.index(term) for term in terms))
+
+
+def _minute_of_day(time: str) -> int:
+    hours, minutes = time[:2], time[3:]
+    if len(time) != 5 or time[2] != ":" or not (hours.isdigit() and minutes.isdigit()):
+        return INVALID_MINUTE
+    if int(hours) > 23 or int(minutes) > 59:
+        return INVALID_MINUTE
+    return int(hours) * 60 + int(minutes)
+
+
+def encode_times(times: List[str]) -> np.ndarray:
+    """Encode HH:MM strings as minutes since midnight; malformed times become INVALID_MINUTE"""
+    return np.fromiter((_minute_of_day(t) for t in times), dtype=np.int16, count=len(times))
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """Approximate resident size of a nested dict/list structure of Python objects"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class CompactCohort:
+    """Columnar, dtype-compact in-memory representation of a generated dataset"""
+
+    def __init__(self, start_date: str, patient_ids: List[str], persona_names: List[str],
+                 persona_types: List[str], streams: Dict[str, Dict[str, np.ndarray]],
+                 overflow: Optional[Dict[str, Dict[int, List[str]]]] = None,
+                 notes: Optional[List[str]] = None, generation_info: Optional[Dict[str, Any]] = None):
+        self.start_date = start_date
+        self.patient_ids = [sys.intern(p) for p in patient_ids]
+        self.persona_names = persona_names
+        self.persona_types = [sys.intern(t) for t in persona_types]
+        self.streams = streams
+        self.overflow = overflow or {}
+        self.notes = notes
+        self.generation_info = generation_info or {}
+        self.patient_index = {p: i for i, p in enumerate(self.patient_ids)}
+
+    @classmethod
+    def from_dataset(cls, data: Dict[str, Any], include_notes: bool = False,
+                     consume: bool = False) -> "CompactCohort":
+        """Encode a loaded dataset; with consume=True each persona is released as soon as it is encoded"""
+        start_date = data["generation_info"]["start_date"]
+        start = np.datetime64(start_date, "D")
+        personas = data["personas"]
+        patient_ids, persona_names, persona_types = [], [], []
+        parts = {stream: {} for stream in STREAMS}
+        overflow_parts = {}
+        notes = [] if include_notes else None
+
+        for code, persona_id in enumerate(list(personas)):
+            persona = personas.pop(persona_id) if consume else personas[persona_id]
+            patient_ids.append(persona_id)
+            persona_names.append(persona["persona"])
+            persona_types.append(persona["persona_type"])
+
+            for stream in STREAMS:
+                records = persona[stream]
+                n = len(records)
+                columns = parts[stream]
+                columns.setdefault("patient", []).append(np.full(n, code, dtype=np.int32))
+                columns.setdefault("day", []).append(
+                    (np.array([r["date"] for r in records], dtype="datetime64[D]") - start).astype(np.int16))
+                for name, dtype in STREAM_COLUMNS[stream].items():
+                    columns.setdefault(name, []).append(
+                        np.rint(np.fromiter((r[name] for r in records), dtype=np.float64, count=n)).astype(dtype)
+                        if np.dtype(dtype).kind == "i" else
+                        np.fromiter((r[name] for r in records), dtype=dtype, count=n))
+                if stream == "chat":
+                    columns.setdefault("minute_of_day", []).append(encode_times([r["time"] for r in records]))
+                for name, vocab in CATEGORICAL_COLUMNS.get(stream, {}).items():
+                    masks, overflow = encode_terms([r[name] for r in records], vocab)
+                    columns.setdefault(name, []).append(masks)
+                    if overflow:
+                        offset = sum(len(p) for p in columns["patient"][:-1])
+                        overflow_parts.setdefault(f"{stream}.{name}", {}).update(
+                            {offset + row: terms for row, terms in overflow.items()})
+                if stream == "mood_diary" and include_notes:
+                    notes.extend(r["notes"] for r in records)
+            if consume:
+                del persona
+
+        streams = {stream: {name: np.concatenate(chunks) for name, chunks in columns.items()}
+                   for stream, columns in parts.items()}
+        return cls(start_date, patient_ids, persona_names, persona_types, streams,
+                   overflow_parts, notes, data.get("generation_info"))
+
+    @classmethod
+    def concat(cls, cohorts: List["CompactCohort"]) -> "CompactCohort":
+        """Stack cohorts of disjoint patients (e.g. generated in batches) into one"""
+        streams, overflow = {}, {}
+        for stream in STREAMS:
+            patient_offset, row_offset, parts = 0, 0, []
+            for cohort in cohorts:
+                columns = cohort.streams.get(stream) or {}
+                if len(columns.get("patient", [])):
+                    parts.append({**columns, "patient": columns["patient"] + np.int32(patient_offset)})
+                    for key, terms in cohort.overflow.items():
+                        if key.startswith(f"{stream}."):
+                            overflow.setdefault(key, {}).update({row_offset + row: t for row, t in terms.items()})
+                    row_offset += len(columns["patient"])
+                patient_offset += cohort.n_patients
+            streams[stream] = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]} if parts else {}
+        return cls(cohorts[0].start_date, [p for c in cohorts for p in c.patient_ids],
+                   [n for c in cohorts for n in c.persona_names], [t for c in cohorts for t in c.persona_types],
+                   streams, overflow, generation_info=cohorts[0].generation_info)
+
+    @classmethod
+    def load_json(cls, filename: str = "data/realistic_patient_data.json",
+                  include_notes: bool = False) -> "CompactCohort":
+        """Load a generator JSON file straight into the compact representation"""
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        return cls.from_dataset(data, include_notes=include_notes, consume=True)
+
+    def save(self, filename: str):
+        """Save the columnar arrays and lookup tables to a single .npz file"""
+        arrays = {f"{stream}/{name}": values
+                  for stream, columns in self.streams.items() for name, values in columns.items()}
+        meta = {
+            "start_date": self.start_date,
+            "patient_ids": self.patient_ids,
+            "persona_names": self.persona_names,
+            "persona_types": self.persona_types,
+            "overflow": {k: {str(r): t for r, t in v.items()} for k, v in self.overflow.items()},
+            "notes": self.notes,
+            "generation_info": self.generation_info,
+        }
+        np.savez(filename, __meta__=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+
+    @classmethod
+    def load(cls, filename: str) -> "CompactCohort":
+        """Load a cohort written by save()"""
+        with np.load(filename) as archive:
+            meta = json.loads(archive["__meta__"].tobytes().decode())
+            streams = {stream: {} for stream in STREAMS}
+            for key in archive.files:
+                if key != "__meta__":
+                    stream, name = key.split("/", 1)
+                    streams[stream][name] = archive[key]
+        overflow = {k: {int(r): t for r, t in v.items()} for k, v in meta["overflow"].items()}
+        return cls(meta["start_date"], meta["patient_ids"], meta["persona_names"], meta["persona_types"],
+                   streams, overflow, meta["notes"], meta["generation_info"])
+
+    @property
+    def n_patients(self) -> int:
+        return len(self.patient_ids)
+
+    def nbytes(self) -> int:
+        """Memory held by the column arrays"""
+        return sum(values.nbytes for columns in self.streams.values() for values in columns.values())
+
+    def patient_rows(self, stream: str, patient_id: str) -> np.ndarray:
+        """Row indices of one patient within a stream"""
+        return np.flatnonzero(self.streams[stream]["patient"] == self.patient_index[patient_id])
+
+    def date_strings(self, days: np.ndarray) -> List[str]:
+        """Convert day offsets back to YYYY-MM-DD strings"""
+        dates = np.datetime64(self.start_date, "D") + days.astype(np.int64)
+        return [str(d) for d in dates]
+
+    def to_records(self, stream: str, patient_id: str) -> List[Dict[str, Any]]:
+        """Decode one patient's stream back into the generator's record dicts"""
+        rows = self.patient_rows(stream, patient_id)
+        columns = self.streams[stream]
+        dates = self.date_strings(columns["day"][rows])
+        records = []
+        for date, row in zip(dates, rows):
+            record = {"date": date}
+            if stream == "chat":
+                minutes = int(columns["minute_of_day"][row])
+                record["time"] = f"{minutes // 60:02d}:{minutes % 60:02d}" if minutes != INVALID_MINUTE else None
+            for name in STREAM_COLUMNS[stream]:
+                record[name] = columns[name][row].item()
+            for name, vocab in CATEGORICAL_COLUMNS.get(stream, {}).items():
+                record[name] = (decode_mask(columns[name][row], vocab)
+                                + self.overflow.get(f"{stream}.{name}", {}).get(int(row), []))
+            if stream == "mood_diary" and self.notes is not None:
+                record["notes"] = self.notes[row]
+            records.append(record)
+        return records
+
+
+if __name__ == "__main__":
+    with open('data/realistic_patient_data.json', 'r') as f:
+        data = json.load(f)
+    python_bytes = deep_sizeof(data)
+
+    cohort = CompactCohort.from_dataset(data)
+    compact_bytes = cohort.nbytes()
+
+    print("\n" + "="*60)
+    print("COMPACT COHORT MEMORY FOOTPRINT")
+    print("="*60)
+    print(f"Python dict/list records: {python_bytes / 1e6:8.2f} MB")
+    print(f"Compact column arrays:    {compact_bytes / 1e6:8.2f} MB")
+    print(f"Reduction:                {python_bytes / compact_bytes:8.1f}x")
+    for stream, columns in cohort.streams.items():
+        rows = len(columns["patient"])
+        print(f"  {stream:<12} {rows:>6} rows, {sum(v.nbytes for v in columns.values()) / 1e3:8.1f} KB")
+
+    sample = cohort.to_records("mood_diary", "sarah_chen")[0]
+    print(f"\nDecoded Sarah Chen diary entry: {sample}")
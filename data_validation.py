@@ -0,0 +1,263 @@
+import time
+import numpy as np
+from typing import Dict, List, Any, Optional, Callable
+
+from compact_dataset import CompactCohort, INVALID_MINUTE
+from cohort_generator import PERSONA_TEMPLATES
+
+PHQ5_ITEMS = ["little_interest", "feeling_down", "sleep_trouble", "tired_energy", "appetite"]
+DAILY_STREAMS = ["apple_watch", "phq5", "mood_diary", "sobriety"]  # At most one record per patient and day
+
+# Cohort-wide plausibility bounds (None = unbounded on that side). The realistic and cohort generators
+# clamp to them; generate_synthetic_data does not clip, so its data can genuinely fall outside them
+
+VALUE_RANGES = {
+    "apple_watch": {
+        "heart_rate_variability": (10, 50),
+        "sleep_duration_hours": (4, 12),
+        "sleep_efficiency": (45, 95),
+        "steps": (1200, 18000),
+        "exercise_minutes": (0, None),
+        "stand_hours": (0, 24),
+    },
+    "phq5": {**{item: (0, 3) for item in PHQ5_ITEMS}, "total_score": (0, 15)},
+    "mood_diary": {
+        "mood_rating": (1, 10),
+        "anxiety_level": (1, 10),
+        "craving_intensity": (0, 10),
+        "energy_level": (1, 10),
+        "pain_level": (0, 10),
+        "word_count": (0, None),
+    },
+    "chat": {
+        "message_count": (1, None),
+        "avg_response_time_hours": (0, 24),
+        "sentiment_score": (-0.8, 0.8),
+        "engagement_level": (1, 10),
+    },
+    "sobriety": {
+        "days_sober": (1, None),
+        "relapse_risk_score": (0.05, 0.9),
+        "medication_adherence": (0, 1),
+        "meeting_attendance": (0, None),
+    },
+}
+
+# Per-persona clip ranges of the biomarker series, keyed by persona type (from the generator templates)
+BIOMARKER_COLUMNS = {
+    "resting_hr": "heart_rate_resting",
+    "hrv": "heart_rate_variability",
+    "sleep": "sleep_duration_hours",
+    "sleep_eff": "sleep_efficiency",
+    "steps": "steps",
+}
+PERSONA_RANGES = {
+    template["persona_type"]: {column: template[key][4:6] for key, column in BIOMARKER_COLUMNS.items()}
+    for template in PERSONA_TEMPLATES.values()
+}
+# generation_info["generation_method"] of the generators that clip to those templates; other cohorts
+# (the synthetic generator records no method) were never held to them
+CLIPPING_GENERATORS = {"realistic_time_series_with_autocorrelation", "counter_based_cohort"}
+
+
+def _violation(rule: str, stream: str, rows: np.ndarray, message: str, column: Optional[str] = None) -> Dict[str, Any]:
+    return {"rule": rule, "stream": stream, "column": column, "rows": rows.astype(np.int64), "message": message}
+
+
+def _out_of_range(values: np.ndarray, low, high) -> np.ndarray:
+    """Row mask of values outside [low, high], comparing in the column's own dtype"""
+    bad = np.zeros(len(values), dtype=bool)
+    if low is not None:
+        bad |= values < np.asarray(low, dtype=values.dtype)
+    if high is not None:
+        bad |= values > np.asarray(high, dtype=values.dtype)
+    return bad
+
+
+def _patient_day_order(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Row order sorted by (patient, day); skips the sort when rows are already in generator order"""
+    key = columns["patient"].astype(np.int64) << 32 | columns["day"].astype(np.int64) & 0xFFFFFFFF
+    if len(key) < 2 or np.all(key[1:] >= key[:-1]):
+        return np.arange(len(key))
+    return np.argsort(key, kind="stable")
+
+
+def check_value_ranges(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    violations = []
+    for stream, ranges in VALUE_RANGES.items():
+        columns = cohort.streams.get(stream, {})
+        for column, (low, high) in ranges.items():
+            if column not in columns:
+                continue
+            rows = np.flatnonzero(_out_of_range(columns[column], low, high))
+            if len(rows):
+                violations.append(_violation("value_range", stream, rows, f"outside [{low}, {high}]", column))
+    return violations
+
+
+def check_persona_ranges(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    """Biomarkers must stay within the clip range of the patient's own persona (clipping generators only)"""
+    if cohort.generation_info.get("generation_method") not in CLIPPING_GENERATORS:
+        return []
+    columns = cohort.streams.get("apple_watch", {})
+    if len(columns.get("patient", [])) == 0:
+        return []
+    violations = []
+    types = np.asarray(cohort.persona_types, dtype=object)
+    for column in BIOMARKER_COLUMNS.values():
+        # Per-patient bounds, gathered to rows with one fancy index
+        low = np.array([PERSONA_RANGES.get(t, {}).get(column, (-np.inf, np.inf))[0] for t in types], dtype=np.float64)
+        high = np.array([PERSONA_RANGES.get(t, {}).get(column, (-np.inf, np.inf))[1] for t in types], dtype=np.float64)
+        values = columns[column].astype(np.float64)
+        patient = columns["patient"]
+        tolerance = 1e-4 * np.maximum(np.abs(high[patient]), 1)  # float32 storage
+        rows = np.flatnonzero((values < low[patient] - tolerance) | (values > high[patient] + tolerance))
+        if len(rows):
+            violations.append(_violation("persona_range", "apple_watch", rows, "outside the persona's clip range", column))
+    return violations
+
+
+def check_phq5_totals(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    columns = cohort.streams.get("phq5", {})
+    if len(columns.get("patient", [])) == 0:
+        return []
+    items = sum(columns[item].astype(np.int32) for item in PHQ5_ITEMS)
+    rows = np.flatnonzero(items != columns["total_score"])
+    return [_violation("phq5_total", "phq5", rows, "total_score != sum of items", "total_score")] if len(rows) else []
+
+
+def check_sleep_stages(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    columns = cohort.streams.get("apple_watch", {})
+    if len(columns.get("patient", [])) == 0:
+        return []
+    stages = columns["deep_sleep_hours"].astype(np.float64) + columns["rem_sleep_hours"]
+    rows = np.flatnonzero((stages > columns["sleep_duration_hours"] + 1e-4)
+                          | (columns["deep_sleep_hours"] < 0) | (columns["rem_sleep_hours"] < 0))
+    return [_violation("sleep_stages", "apple_watch", rows, "deep + REM sleep exceeds sleep duration")] if len(rows) else []
+
+
+def check_sobriety_counter(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    """days_sober advances with the calendar, except on days flagged as a relapse"""
+    columns = cohort.streams.get("sobriety", {})
+    if len(columns.get("patient", [])) < 2:
+        return []
+    order = _patient_day_order(columns)
+    patient, day = columns["patient"][order], columns["day"][order].astype(np.int64)
+    days_sober = columns["days_sober"][order].astype(np.int64)
+    relapse = columns["relapse_occurred"][order]
+    same_patient = patient[1:] == patient[:-1]
+    bad = same_patient & (np.diff(days_sober) != np.diff(day)) & ~relapse[1:]
+    rows = order[1:][bad]
+    return [_violation("sobriety_counter", "sobriety", rows, "days_sober did not advance by the elapsed days "
+                       "and no relapse was flagged", "days_sober")] if len(rows) else []
+
+
+def check_chat_times(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    columns = cohort.streams.get("chat", {})
+    if "minute_of_day" not in columns:
+        return []
+    minutes = columns["minute_of_day"]
+    rows = np.flatnonzero((minutes == INVALID_MINUTE) | (minutes < 0) | (minutes >= 24 * 60))
+    return [_violation("chat_time", "chat", rows, "time is not a valid HH:MM", "minute_of_day")] if len(rows) else []
+
+
+def check_days(cohort: CompactCohort) -> List[Dict[str, Any]]:
+    """Records fall inside the study window, and daily streams have one record per patient and day"""
+    n_days = cohort.generation_info.get("days_generated")
+    violations = []
+    for stream, columns in cohort.streams.items():
+        if len(columns.get("patient", [])) == 0:
+            continue
+        day = columns["day"]
+        outside = (day < 0) | (day >= n_days) if n_days else day < 0
+        rows = np.flatnonzero(outside)
+        if len(rows):
+            violations.append(_violation("study_window", stream, rows, f"day outside [0, {n_days})", "day"))
+        if stream in DAILY_STREAMS:
+            order = _patient_day_order(columns)
+            key = columns["patient"][order].astype(np.int64) << 32 | columns["day"][order].astype(np.int64)
+            rows = order[1:][key[1:] == key[:-1]]
+            if len(rows):
+                violations.append(_violation("duplicate_day", stream, rows, "more than one record for the day", "day"))
+    return violations
+
+
+RULES: Dict[str, Callable[[CompactCohort], List[Dict[str, Any]]]] = {
+    "value_range": check_value_ranges,
+    "persona_range": check_persona_ranges,
+    "phq5_total": check_phq5_totals,
+    "sleep_stages": check_sleep_stages,
+    "sobriety_counter": check_sobriety_counter,
+    "chat_time": check_chat_times,
+    "days": check_days,
+}
+
+
+class ValidationReport:
+    """Violations found by validate(), each with the stream row indices that broke the rule"""
+
+    def __init__(self, cohort: CompactCohort, violations: List[Dict[str, Any]], rows_checked: int, elapsed: float):
+        self.cohort = cohort
+        self.violations = violations
+        self.rows_checked = rows_checked
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return not self.violations
+
+    def n_violations(self) -> int:
+        return sum(len(v["rows"]) for v in self.violations)
+
+    def locate(self, violation: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Patient id, date and offending value for the rows of one violation"""
+        columns = self.cohort.streams[violation["stream"]]
+        rows = violation["rows"][:limit]
+        dates = self.cohort.date_strings(columns["day"][rows])
+        return [{
+            "row": int(row),
+            "patient_id": self.cohort.patient_ids[columns["patient"][row]],
+            "date": date,
+            "value": columns[violation["column"]][row].item() if violation["column"] else None,
+        } for row, date in zip(rows, dates)]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [{"rule": v["rule"], "stream": v["stream"], "column": v["column"], "rows": len(v["rows"]),
+                 "message": v["message"]} for v in self.violations]
+
+    def to_dataframe(self):
+        """One row per violating record"""
+        import pandas as pd
+
+        return pd.DataFrame([{"rule": v["rule"], "stream": v["stream"], "column": v["column"], **location}
+                             for v in self.violations for location in self.locate(v)])
+
+    def print_report(self, examples: int = 3):
+        print(f"Checked {self.rows_checked:,} rows in {self.elapsed * 1000:.0f} ms: "
+              f"{self.n_violations():,} violations across {len(self.violations)} checks")
+        for violation in self.violations:
+            target = f"{violation['stream']}.{violation['column']}" if violation["column"] else violation["stream"]
+            print(f"  [{violation['rule']}] {target}: {len(violation['rows']):,} rows {violation['message']}")
+            for location in self.locate(violation, examples):
+                print(f"      row {location['row']}: {location['patient_id']} {location['date']} value={location['value']}")
+
+
+def validate(cohort: CompactCohort, rules: Optional[List[str]] = None) -> ValidationReport:
+    """Run the named rules (default: all) over whole columns of a cohort"""
+    start = time.perf_counter()
+    violations = []
+    for name in rules or list(RULES):
+        violations.extend(RULES[name](cohort))
+    rows_checked = sum(len(columns.get("patient", [])) for columns in cohort.streams.values())
+    return ValidationReport(cohort, violations, rows_checked, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    for filename in ['data/realistic_patient_data.json', 'data/synthetic_patient_data.json']:
+        print(f"\n{filename}")
+        cohort = CompactCohort.load_json(filename)
+        if cohort.generation_info.get("generation_method") not in CLIPPING_GENERATORS:
+            print("Expected: generate_synthetic_data draws unclipped series, so the value_range hits below "
+                  "(e.g. sleep efficiency over 100%) are real problems in this dataset, not validator noise; "
+                  "persona_range is skipped because this generator never clips to the persona ranges")
+        validate(cohort).print_report()
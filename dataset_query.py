@@ -0,0 +1,172 @@
+import operator
+import os
+import numpy as np
+from typing import Dict, List, Any, Optional
+
+from compact_dataset import CATEGORICAL_COLUMNS, mask_for
+from sharded_dataset import ShardedDataset
+
+COMPARISONS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+def _may_match(stats: Optional[Dict[str, Any]], op: str, value) -> bool:
+    """Decide from a shard's zone map whether any row could satisfy a predicate"""
+    if stats is None:
+        return True
+    if op == "has_any":
+        return bool(stats["mask_union"] & int(value))
+    low, high = stats["min"], stats["max"]
+    if op == ">":
+        return high > value
+    if op == ">=":
+        return high >= value
+    if op == "<":
+        return low < value
+    if op == "<=":
+        return low <= value
+    if op == "==":
+        return low <= value <= high
+    if op == "!=":
+        return not (low == high == value)
+    return True
+
+
+class DatasetQuery:
+    """Column/row selection over a sharded dataset with filters pushed down to the shards.
+
+    Shards are pruned by the manifest (patient bucket, date range, per-column zone
+    maps) before any file is opened; within a shard only the filter columns are
+    decoded first, and the selected columns are decoded only if some row matches.
+    """
+
+    def __init__(self, dataset: ShardedDataset, stream: str):
+        self.dataset = dataset
+        self.stream_name = stream
+        self.selected: Optional[List[str]] = None
+        self.patient_filter: Optional[List[str]] = None
+        self.start_date: Optional[str] = None
+        self.end_date: Optional[str] = None
+        self.predicates: List[tuple] = []
+        self.stats = {"shards_total": 0, "shards_pruned": 0, "shards_scanned": 0, "shards_decoded": 0}
+
+    @classmethod
+    def open(cls, root: str, stream: str) -> "DatasetQuery":
+        return cls(ShardedDataset(root), stream)
+
+    def columns(self, names: List[str]) -> "DatasetQuery":
+        self.selected = list(names)
+        return self
+
+    def patients(self, patient_ids: List[str]) -> "DatasetQuery":
+        self.patient_filter = list(patient_ids)
+        return self
+
+    def dates(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> "DatasetQuery":
+        """Restrict to an inclusive YYYY-MM-DD date range"""
+        self.start_date, self.end_date = start_date, end_date
+        return self
+
+    def days(self, first_day: int, last_day: int) -> "DatasetQuery":
+        """Restrict to an inclusive range of study day offsets"""
+        start = np.datetime64(self.dataset.start_date, "D")
+        return self.dates(str(start + first_day), str(start + last_day))
+
+    def where(self, column: str, op: str, value) -> "DatasetQuery":
+        """Add a value predicate; op is a comparison or 'has_any' for trigger/coping/topic sets"""
+        if op == "has_any":
+            vocab = CATEGORICAL_COLUMNS[self.stream_name][column]
+            value = mask_for([value] if isinstance(value, str) else value, vocab)
+        elif op not in COMPARISONS:
+            raise ValueError(f"Unsupported operator: {op}")
+        self.predicates.append((column, op, value))
+        return self
+
+    def _candidate_shards(self) -> List[Dict[str, Any]]:
+        """Shards that survive patient, date and zone-map pruning"""
+        shards = self.dataset.select_shards(self.stream_name, self.patient_filter, self.start_date, self.end_date)
+        self.stats["shards_total"] = sum(1 for s in self.dataset.shards if self.stream_name in s["streams"])
+        kept = []
+        for shard in shards:
+            stats = shard["streams"][self.stream_name].get("stats", {})
+            if all(_may_match(stats.get(column), op, value) for column, op, value in self.predicates):
+                kept.append(shard)
+        self.stats["shards_pruned"] = self.stats["shards_total"] - len(kept)
+        return kept
+
+    def _row_mask(self, part: Dict[str, np.ndarray]) -> np.ndarray:
+        """Evaluate patient, date and value predicates on already-decoded filter columns"""
+        mask = np.ones(len(part["day"]), dtype=bool)
+        if self.patient_filter is not None:
+            codes = [self.dataset.patient_index[p] for p in self.patient_filter if p in self.dataset.patient_index]
+            mask &= np.isin(part["patient"], codes)
+        if self.start_date:
+            mask &= part["day"] >= self.dataset.day_offset(self.start_date)
+        if self.end_date:
+            mask &= part["day"] <= self.dataset.day_offset(self.end_date)
+        for column, op, value in self.predicates:
+            if op == "has_any":
+                mask &= (part[column] & value) != 0
+            else:
+                mask &= COMPARISONS[op](part[column], value)
+        return mask
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        """Execute the query and return matching rows as a dict of column arrays"""
+        filter_columns = list(dict.fromkeys(["patient", "day"] + [c for c, _, _ in self.predicates]))
+        parts = []
+        for shard in self._candidate_shards():
+            self.stats["shards_scanned"] += 1
+            path = os.path.join(self.dataset.root, shard["path"], shard["streams"][self.stream_name]["file"])
+            with np.load(path) as archive:
+                part = {name: archive[name] for name in filter_columns}
+                mask = self._row_mask(part)
+                if not mask.any():
+                    continue
+                self.stats["shards_decoded"] += 1
+                names = archive.files if self.selected is None else self.selected
+                for name in names:
+                    if name not in part:
+                        part[name] = archive[name]
+            wanted = list(dict.fromkeys(["patient", "day"] + list(names)))
+            parts.append({name: part[name][mask] for name in wanted})
+
+        if not parts:
+            return {}
+        return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+    def to_dataframe(self):
+        """Execute the query and return a DataFrame with decoded patient ids and dates"""
+        import pandas as pd
+
+        columns = self.to_numpy()
+        if not columns:
+            return pd.DataFrame()
+        frame = pd.DataFrame(columns)
+        frame.insert(0, "patient_id", np.asarray(self.dataset.patient_ids, dtype=object)[columns["patient"]])
+        frame.insert(1, "date", np.datetime64(self.dataset.start_date, "D") + columns["day"].astype(np.int64))
+        return frame.sort_values(["patient", "day"], kind="stable").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # Equivalent of the "High Risk Days (>0.6)" count in risk_profiles_visualization.py
+    query = DatasetQuery.open('data/sharded', "sobriety").columns(["relapse_risk_score"]) \
+        .where("relapse_risk_score", ">", 0.6)
+    high_risk = query.to_dataframe()
+    print("High-risk days per persona:")
+    print(high_risk.groupby("patient_id").size().to_string())
+    print(f"Shard stats: {query.stats}")
+
+    # Equivalent of the first-30-days slice in demo_realistic_patterns.py
+    query = DatasetQuery.open('data/sharded', "apple_watch") \
+        .columns(["heart_rate_resting", "sleep_efficiency"]).patients(["sarah_chen"]).days(0, 29)
+    first_month = query.to_numpy()
+    print(f"\nSarah Chen first 30 days: {len(first_month['day'])} rows, "
+          f"mean resting HR {first_month['heart_rate_resting'].mean():.1f}")
+    print(f"Shard stats: {query.stats}")
@@ -0,0 +1,209 @@
+import hashlib
+import math
+import numpy as np
+from typing import Dict, List, Any
+
+from compact_dataset import STREAMS, _minute_of_day
+from log_store import LogStore, EPOCH
+from sharded_dataset import patient_bucket
+
+BITS_PER_KEY = 10       # ~1% false positives; 1.25 MB per million keys
+EXPECTED_KEYS = 1_000_000
+N_PARTITIONS = 64
+
+
+def content_key(patient_id: str, stream: str, day: int, minute: int = -1, message_count: int = -1) -> bytes:
+    """Identity of a record: one per patient, stream and day, plus time and size for chat sessions.
+
+    Built only from fields that survive the log store's fixed-width encoding
+    exactly, so keys of stored records match keys of incoming ones.
+    """
+    if stream != "chat":
+        minute = message_count = -1
+    return f"{patient_id}|{stream}|{day}|{minute}|{message_count}".encode()
+
+
+def record_key(patient_id: str, stream: str, record: Dict[str, Any]) -> bytes:
+    day = int((np.datetime64(record["date"], "D") - EPOCH).astype(np.int64))
+    if stream == "chat":
+        return content_key(patient_id, stream, day, _minute_of_day(record["time"]), int(record["message_count"]))
+    return content_key(patient_id, stream, day)
+
+
+class PartitionedBloomFilter:
+    """Bloom filters for N patient partitions packed into one bit array.
+
+    Each partition gets expected_keys / n_partitions * bits_per_key bits and
+    k = bits_per_key * ln 2 probes from double hashing of a 128-bit digest,
+    so memory is bits_per_key / 8 bytes per expected key and lookups for a
+    whole batch are a few vectorized gathers.
+    """
+
+    def __init__(self, expected_keys: int = EXPECTED_KEYS, bits_per_key: float = BITS_PER_KEY,
+                 n_partitions: int = N_PARTITIONS):
+        self.n_partitions = n_partitions
+        self.partition_bits = max(64, int(math.ceil(expected_keys / n_partitions * bits_per_key / 64)) * 64)
+        self.n_hashes = max(1, round(bits_per_key * math.log(2)))
+        self.bits = np.zeros(self.partition_bits * n_partitions // 8, dtype=np.uint8)
+        self.partition_keys = np.zeros(n_partitions, dtype=np.int64)
+
+    @property
+    def n_keys(self) -> int:
+        return int(self.partition_keys.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def _positions(self, partitions: np.ndarray, keys: List[bytes]) -> np.ndarray:
+        digests = np.frombuffer(b"".join(hashlib.blake2b(key, digest_size=16).digest() for key in keys),
+                                dtype=np.uint64).reshape(len(keys), 2)
+        probes = np.arange(self.n_hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            hashes = digests[:, :1] + probes * (digests[:, 1:] | np.uint64(1))
+        local = hashes % np.uint64(self.partition_bits)
+        return partitions.astype(np.uint64)[:, None] * np.uint64(self.partition_bits) + local
+
+    def add(self, partitions: np.ndarray, keys: List[bytes]):
+        if not keys:
+            return
+        positions = self._positions(partitions, keys).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+        np.add.at(self.partition_keys, partitions, 1)
+
+    def might_contain(self, partitions: np.ndarray, keys: List[bytes]) -> np.ndarray:
+        if not keys:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(partitions, keys)
+        hits = self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8) & 1
+        return hits.all(axis=1)
+
+    def false_positive_rate(self) -> float:
+        """Expected rate for a lookup at the current fill, weighting partitions by their share of keys"""
+        if self.n_keys == 0:
+            return 0.0
+        rates = (1 - np.exp(-self.n_hashes * self.partition_keys / self.partition_bits)) ** self.n_hashes
+        return float((rates * self.partition_keys).sum() / self.n_keys)
+
+
+class DeduplicatingStore:
+    """Drops retried records before they reach a LogStore; same append_batch/close interface.
+
+    Every incoming record's content key is tested against the Bloom filter of
+    its patient partition. A definite miss is new and skips any lookup. Only
+    a possible hit reads that patient-day through the store's sparse index to
+    confirm. Duplicates inside one batch are dropped too. The filter is
+    rebuilt from the stored columns when the store is reopened.
+    """
+
+    def __init__(self, store: LogStore, expected_keys: int = EXPECTED_KEYS, bits_per_key: float = BITS_PER_KEY,
+                 n_partitions: int = N_PARTITIONS):
+        self.store = store
+        self.bloom = PartitionedBloomFilter(expected_keys, bits_per_key, n_partitions)
+        self.counters = {"received": 0, "duplicates": 0, "bloom_maybe": 0, "index_lookups": 0, "false_positives": 0}
+        self._partitions: Dict[str, int] = {}
+        self._rebuild()
+
+    def _partition(self, patient_id: str) -> int:
+        if patient_id not in self._partitions:
+            self._partitions[patient_id] = patient_bucket(patient_id, self.bloom.n_partitions)
+        return self._partitions[patient_id]
+
+    def _rebuild(self):
+        for stream in STREAMS:
+            for segment in self.store.segments[stream]:
+                if not segment["records"]:
+                    continue
+                columns, _ = self.store._read_rows(stream, segment, 0, segment["records"])
+                patients = [self.store.patient_ids[code] for code in columns["patient"].tolist()]
+                minutes = columns["minute_of_day"].tolist() if stream == "chat" else [-1] * len(patients)
+                counts = columns["message_count"].tolist() if stream == "chat" else [-1] * len(patients)
+                keys = [content_key(p, stream, d, m, c)
+                        for p, d, m, c in zip(patients, columns["day"].tolist(), minutes, counts)]
+                self.bloom.add(np.array([self._partition(p) for p in patients]), keys)
+
+    def _stored(self, patient_id: str, stream: str, record: Dict[str, Any]) -> bool:
+        """Exact check against the store, reading only the indexed blocks of that patient-day"""
+        self.counters["index_lookups"] += 1
+        key = record_key(patient_id, stream, record)
+        return any(record_key(patient_id, stream, stored) == key
+                   for stored in self.store.query(patient_id, stream, record["date"], record["date"]))
+
+    def append_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """Append the rows not stored yet; returns how many were new"""
+        self.counters["received"] += len(rows)
+        keys = [record_key(row["patient_id"], row["stream"], row["record"]) for row in rows]
+        partitions = np.array([self._partition(row["patient_id"]) for row in rows], dtype=np.int64)
+        maybe = self.bloom.might_contain(partitions, keys)
+        self.counters["bloom_maybe"] += int(maybe.sum())
+
+        fresh, seen = [], set()
+        for i, row in enumerate(rows):
+            if keys[i] in seen:
+                continue
+            if maybe[i]:
+                if self._stored(row["patient_id"], row["stream"], row["record"]):
+                    continue
+                self.counters["false_positives"] += 1
+            seen.add(keys[i])
+            fresh.append(i)
+        self.counters["duplicates"] += len(rows) - len(fresh)
+
+        if fresh:
+            self.store.append_batch([rows[i] for i in fresh])
+            self.bloom.add(partitions[fresh], [keys[i] for i in fresh])
+        return len(fresh)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "bloom_bytes": self.bloom.nbytes, "bloom_keys": self.bloom.n_keys,
+                "bloom_expected_fpr": self.bloom.false_positive_rate()}
+
+    def close(self):
+        self.store.close()
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import shutil
+    import tempfile
+    import time
+    from event_stream import event_stream
+
+    with open('data/realistic_patient_data.json', 'r') as f:
+        data = json.load(f)
+    events = [{"patient_id": e.patient_id, "stream": e.stream, "record": e.record} for e in event_stream(data)]
+
+    # Mobile retries: 30% of uploads are sent again, up to a few hundred events later
+    rng = random.Random(7)
+    schedule = [(i, event) for i, event in enumerate(events)]
+    schedule += [(i + rng.randint(1, 500), event) for i, event in enumerate(events) if rng.random() < 0.3]
+    uploads = [event for _, event in sorted(schedule, key=lambda item: item[0])]
+
+    root = tempfile.mkdtemp()
+    try:
+        store = DeduplicatingStore(LogStore(root), expected_keys=100_000)
+        start = time.perf_counter()
+        for i in range(0, len(uploads), 64):
+            store.append_batch(uploads[i:i + 64])
+        elapsed = time.perf_counter() - start
+        stats = store.stats()
+        print(f"{stats['received']:,} uploads -> {stats['received'] - stats['duplicates']:,} stored "
+              f"({stats['duplicates']:,} duplicates dropped) in {elapsed:.2f} s")
+        print(f"Bloom: {stats['bloom_bytes'] / 1024:.0f} KB, {stats['bloom_maybe']:,} possible hits, "
+              f"{stats['index_lookups']:,} index lookups, {stats['false_positives']} false positives "
+              f"(expected rate {stats['bloom_expected_fpr']:.2%})")
+        store.close()
+
+        # After a restart the filter is rebuilt, so a full re-upload stores nothing
+        store = DeduplicatingStore(LogStore(root), expected_keys=100_000)
+        stored = store.append_batch(events)
+        print(f"Re-uploading all {len(events):,} events after restart: {stored} stored")
+        store.close()
+
+        for bits in (4, 8, 10, 16):
+            bloom = PartitionedBloomFilter(1_000_000, bits)
+            print(f"  {bits:>2} bits/key: {bloom.nbytes / 1e6:.2f} MB per million keys, "
+                  f"{bloom.n_hashes} hashes, ~{(1 - math.exp(-bloom.n_hashes / bits)) ** bloom.n_hashes:.2%} false positives")
+    finally:
+        shutil.rmtree(root)
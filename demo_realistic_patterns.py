@@ -1,56 +1,62 @@
 import json
 import matplotlib.pyplot as plt
 
-# Load the realistic data
-with open('data/realistic_patient_data.json', 'r') as f:
-    data = json.load(f)
-
-# Extract data for Sarah Chen
-sarah = data['personas']['sarah_chen']
-risks = [s['relapse_risk_score'] for s in sarah['sobriety'][:30]]  # First 30 days
-hrs = [w['heart_rate_resting'] for w in sarah['apple_watch'][:30]]
-sleep_eff = [w['sleep_efficiency'] for w in sarah['apple_watch'][:30]]
-
-# Create visualization
-fig, axes = plt.subplots(3, 1, figsize=(14, 10))
-
-# Plot 1: Relapse Risk with persistence
-axes[0].plot(risks, 'b-', linewidth=3, marker='o', markersize=6, alpha=0.8)
-axes[0].set_title('Realistic Relapse Risk - Notice Persistence & Gradual Changes', fontsize=14, fontweight='bold')
-axes[0].set_ylabel('Relapse Risk Score', fontsize=12)
-axes[0].grid(True, alpha=0.3)
-axes[0].set_ylim(0, 1)
-
-# Add annotations for patterns
-axes[0].annotate('High-risk period\n(persists for days)', 
-                xy=(7, max(risks[5:10])), xytext=(12, 0.9),
-                arrowprops=dict(arrowstyle='->', color='red', lw=2),
-                fontsize=10, color='red', fontweight='bold')
-
-# Plot 2: Correlated Heart Rate
-axes[1].plot(hrs, 'r-', linewidth=3, marker='s', markersize=6, alpha=0.8)
-axes[1].set_title('Correlated Resting Heart Rate (↑ during stress periods)', fontsize=14, fontweight='bold')
-axes[1].set_ylabel('Resting HR (bpm)', fontsize=12)
-axes[1].grid(True, alpha=0.3)
-
-# Plot 3: Sleep Efficiency (also correlated)
-axes[2].plot(sleep_eff, 'g-', linewidth=3, marker='^', markersize=6, alpha=0.8)
-axes[2].set_title('Sleep Efficiency (↓ during stress periods)', fontsize=14, fontweight='bold')
-axes[2].set_ylabel('Sleep Efficiency (%)', fontsize=12)
-axes[2].set_xlabel('Days', fontsize=12)
-axes[2].grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('data/realistic_patterns_demo.png', dpi=300, bbox_inches='tight')
-plt.show()
-
-print("\n" + "="*60)
-print("REALISTIC PATTERNS DEMONSTRATED")
-print("="*60)
-print("Key improvements over previous 'always baseline' data:")
-print("1. ✅ Autocorrelation - today's values influence tomorrow's")
-print("2. ✅ Persistence - bad days cluster together")
-print("3. ✅ Regime switching - natural high/low periods")
-print("4. ✅ Biomarker correlation - HR ↑ when risk ↑")
-print("5. ✅ Gradual changes - no sudden return to baseline")
-print("\nThis matches real patient data patterns!") 
\ No newline at end of file
+def main(data_file: str = 'data/realistic_patient_data.json'):
+    """Plot Sarah Chen's first 30 days to show persistence and correlated biomarkers"""
+    # Load the realistic data
+    with open(data_file, 'r') as f:
+        data = json.load(f)
+
+    # Extract data for Sarah Chen
+    sarah = data['personas']['sarah_chen']
+    risks = [s['relapse_risk_score'] for s in sarah['sobriety'][:30]]  # First 30 days
+    hrs = [w['heart_rate_resting'] for w in sarah['apple_watch'][:30]]
+    sleep_eff = [w['sleep_efficiency'] for w in sarah['apple_watch'][:30]]
+
+    # Create visualization
+    fig, axes = plt.subplots(3, 1, figsize=(14, 10))
+
+    # Plot 1: Relapse Risk with persistence
+    axes[0].plot(risks, 'b-', linewidth=3, marker='o', markersize=6, alpha=0.8)
+    axes[0].set_title('Realistic Relapse Risk - Notice Persistence & Gradual Changes', fontsize=14, fontweight='bold')
+    axes[0].set_ylabel('Relapse Risk Score', fontsize=12)
+    axes[0].grid(True, alpha=0.3)
+    axes[0].set_ylim(0, 1)
+
+    # Add annotations for patterns
+    axes[0].annotate('High-risk period\n(persists for days)', 
+                    xy=(7, max(risks[5:10])), xytext=(12, 0.9),
+                    arrowprops=dict(arrowstyle='->', color='red', lw=2),
+                    fontsize=10, color='red', fontweight='bold')
+
+    # Plot 2: Correlated Heart Rate
+    axes[1].plot(hrs, 'r-', linewidth=3, marker='s', markersize=6, alpha=0.8)
+    axes[1].set_title('Correlated Resting Heart Rate (↑ during stress periods)', fontsize=14, fontweight='bold')
+    axes[1].set_ylabel('Resting HR (bpm)', fontsize=12)
+    axes[1].grid(True, alpha=0.3)
+
+    # Plot 3: Sleep Efficiency (also correlated)
+    axes[2].plot(sleep_eff, 'g-', linewidth=3, marker='^', markersize=6, alpha=0.8)
+    axes[2].set_title('Sleep Efficiency (↓ during stress periods)', fontsize=14, fontweight='bold')
+    axes[2].set_ylabel('Sleep Efficiency (%)', fontsize=12)
+    axes[2].set_xlabel('Days', fontsize=12)
+    axes[2].grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig('data/realistic_patterns_demo.png', dpi=300, bbox_inches='tight')
+    plt.show()
+
+    print("\n" + "="*60)
+    print("REALISTIC PATTERNS DEMONSTRATED")
+    print("="*60)
+    print("Key improvements over previous 'always baseline' data:")
+    print("1. ✅ Autocorrelation - today's values influence tomorrow's")
+    print("2. ✅ Persistence - bad days cluster together")
+    print("3. ✅ Regime switching - natural high/low periods")
+    print("4. ✅ Biomarker correlation - HR ↑ when risk ↑")
+    print("5. ✅ Gradual changes - no sudden return to baseline")
+    print("\nThis matches real patient data patterns!")
+
+
+if __name__ == "__main__":
+    main()
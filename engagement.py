@@ -0,0 +1,218 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from compact_dataset import CompactCohort
+from rollups import RollupStore, aggregate
+
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def group_offsets(groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Start offset of every group in a sorted group column (n_groups + 1 entries)"""
+    return np.searchsorted(groups, np.arange(n_groups + 1))
+
+
+def group_quantiles(groups: np.ndarray, values: np.ndarray, n_groups: int,
+                    quantiles: Sequence[float] = LATENCY_QUANTILES) -> np.ndarray:
+    """Per-group quantiles (linear interpolation) from one lexsort; NaN for empty groups"""
+    order = np.lexsort((values, groups))
+    values = values[order].astype(np.float64)
+    offsets = group_offsets(groups[order], n_groups)
+    sizes = np.diff(offsets)
+    result = np.full((n_groups, len(quantiles)), np.nan)
+    has_rows = sizes > 0
+    for j, q in enumerate(quantiles):
+        position = offsets[:-1] + q * np.maximum(sizes - 1, 0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, offsets[1:] - 1)
+        fraction = position - lower
+        lower, upper = lower[has_rows], upper[has_rows]
+        result[has_rows, j] = values[lower] + (values[upper] - values[lower]) * fraction[has_rows]
+    return result
+
+
+def group_slopes(groups: np.ndarray, x: np.ndarray, y: np.ndarray, n_groups: int) -> np.ndarray:
+    """Least-squares slope of y on x within every group, from five bincount sums"""
+    x, y = x.astype(np.float64), y.astype(np.float64)
+    n = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    sx, sy = np.bincount(groups, x, n_groups), np.bincount(groups, y, n_groups)
+    sxx, sxy = np.bincount(groups, x * x, n_groups), np.bincount(groups, x * y, n_groups)
+    denominator = n * sxx - sx ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((n >= 2) & (denominator > 0), (n * sxy - sx * sy) / denominator, np.nan)
+
+
+def streaks(patient: np.ndarray, day: np.ndarray, n_patients: int, last_day: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Longest and current run of consecutive active days per patient.
+
+    Rows may repeat a (patient, day) pair and need not be sorted. A current
+    streak is the run ending on `last_day`, zero otherwise.
+    """
+    keys = np.unique(patient.astype(np.int64) << 32 | day.astype(np.int64))
+    patient, day = (keys >> 32).astype(np.int64), (keys & 0xFFFFFFFF).astype(np.int64)
+    longest = np.zeros(n_patients, dtype=np.int64)
+    current = np.zeros(n_patients, dtype=np.int64)
+    if len(keys) == 0:
+        return longest, current
+    new_run = np.r_[True, (patient[1:] != patient[:-1]) | (day[1:] != day[:-1] + 1)]
+    starts = np.flatnonzero(new_run)
+    lengths = np.diff(np.r_[starts, len(keys)])
+    run_patient = patient[starts]
+    np.maximum.at(longest, run_patient, lengths)
+    ends_today = day[np.r_[starts[1:], len(keys)] - 1] == last_day
+    current[run_patient[ends_today]] = lengths[ends_today]
+    return longest, current
+
+
+class EngagementAnalytics:
+    """Chat and mood diary engagement metrics for every patient of a cohort at once.
+
+    Rows are grouped on integer (patient, day) keys, so every metric is a
+    handful of bincount/sort passes over the stream columns regardless of
+    cohort size. Per-patient results are arrays indexed by patient code.
+    Given the RollupStore materialized at generation time, the daily chat
+    table is read from it instead of being re-aggregated.
+    """
+
+    def __init__(self, cohort: CompactCohort, n_days: Optional[int] = None, rollups: Optional[RollupStore] = None):
+        self.cohort = cohort
+        self.n_patients = cohort.n_patients
+        if n_days is None:
+            n_days = cohort.generation_info.get("days_generated") or 1 + max(
+                int(columns["day"].max()) for columns in cohort.streams.values() if len(columns.get("day", [])))
+        self.n_days = n_days
+        self.chat = cohort.streams.get("chat", {})
+        self.diary = cohort.streams.get("mood_diary", {})
+
+        # One row per (patient, day) with at least one chat session
+        if rollups is not None and rollups.tables["daily"].get("chat"):
+            self.chat_days = self._rollup_chat_days(rollups)
+        else:
+            chat = self._columns(self.chat, ["message_count", "sentiment_score"])
+            self.chat_days = aggregate(chat["patient"], chat["day"], {
+                "message_count": chat["message_count"],
+                "sentiment_score": chat["sentiment_score"],
+            })
+
+    def _rollup_chat_days(self, rollups: RollupStore) -> Dict[str, np.ndarray]:
+        """The daily chat table from materialized rollups, re-coded to this cohort's patients"""
+        table = rollups.tables["daily"]["chat"]
+        remap = np.array([self.cohort.patient_index.get(p, -1) for p in rollups.patient_ids], dtype=np.int32)
+        patient = remap[table["patient"]]
+        rows = patient >= 0
+        return aggregate(patient[rows], table["period"][rows], {
+            "message_count": table["message_count_sum"][rows],
+            "sentiment_score": table["sentiment_score_sum"][rows],
+        }, counts=table["count"][rows])
+
+    @staticmethod
+    def _columns(columns: Dict[str, np.ndarray], names: List[str]) -> Dict[str, np.ndarray]:
+        if len(columns.get("patient", [])):
+            return columns
+        empty = {"patient": np.array([], np.int32), "day": np.array([], np.int16)}
+        empty.update({name: np.array([], np.float32) for name in names})
+        return empty
+
+    def _per_patient(self, table: Dict[str, np.ndarray], name: str, patient_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        rows = table["patient"] == self.cohort.patient_index[patient_id]
+        return table["period"][rows], table[name][rows]
+
+    # Per-patient time series
+
+    def chats_per_day(self, patient_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Chat sessions on each day the patient chatted"""
+        return self._per_patient(self.chat_days, "count", patient_id)
+
+    def daily_sentiment(self, patient_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean chat sentiment on each day the patient chatted"""
+        days, total = self._per_patient(self.chat_days, "sentiment_score", patient_id)
+        _, count = self._per_patient(self.chat_days, "count", patient_id)
+        return days, total / count
+
+    def values(self, stream: str, column: str, patient_id: str) -> np.ndarray:
+        """Raw column values of one patient (e.g. diary word counts)"""
+        return self.cohort.streams[stream][column][self.cohort.patient_rows(stream, patient_id)]
+
+    # Cohort-wide per-patient metrics
+
+    def chat_frequency(self) -> Dict[str, np.ndarray]:
+        days = self.chat_days
+        active_days = np.bincount(days["patient"], minlength=self.n_patients)
+        sessions = np.bincount(days["patient"], days["count"], self.n_patients)
+        messages = np.bincount(days["patient"], days["message_count"], self.n_patients)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "chat_days": active_days,
+                "chats_per_day": sessions / self.n_days,
+                "chats_per_active_day": np.where(active_days > 0, sessions / active_days, np.nan),
+                "messages_per_session": np.where(sessions > 0, messages / sessions, np.nan),
+            }
+
+    def latency_quantiles(self, quantiles: Sequence[float] = LATENCY_QUANTILES) -> np.ndarray:
+        """Quantiles of avg_response_time_hours across each patient's sessions (patients x quantiles)"""
+        chat = self._columns(self.chat, ["avg_response_time_hours"])
+        return group_quantiles(chat["patient"], chat["avg_response_time_hours"], self.n_patients, quantiles)
+
+    def latency_histogram(self, bins: int = 24, max_hours: float = 24.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Cohort-wide response latency distribution (counts per bin, bin edges)"""
+        chat = self._columns(self.chat, ["avg_response_time_hours"])
+        return np.histogram(chat["avg_response_time_hours"], bins=bins, range=(0, max_hours))
+
+    def sentiment_trend(self) -> np.ndarray:
+        """Slope of daily mean chat sentiment per week of study, per patient"""
+        days = self.chat_days
+        mean = days["sentiment_score"] / days["count"]
+        return group_slopes(days["patient"], days["period"] / 7.0, mean, self.n_patients)
+
+    def diary_adherence(self) -> Dict[str, np.ndarray]:
+        diary = self._columns(self.diary, [])
+        longest, current = streaks(diary["patient"], diary["day"], self.n_patients, self.n_days - 1)
+        entry_days = aggregate(diary["patient"], diary["day"], {})
+        days_logged = np.bincount(entry_days["patient"], minlength=self.n_patients)
+        return {
+            "diary_days": days_logged,
+            "diary_adherence": days_logged / self.n_days,
+            "diary_longest_streak": longest,
+            "diary_current_streak": current,
+        }
+
+    def summary(self) -> Dict[str, np.ndarray]:
+        """Every engagement metric as one column per metric, one row per patient"""
+        result = {"patient_id": np.asarray(self.cohort.patient_ids, dtype=object)}
+        result.update(self.chat_frequency())
+        for q, values in zip(LATENCY_QUANTILES, self.latency_quantiles().T):
+            result[f"latency_p{round(q * 100)}_hours"] = values
+        result["sentiment_slope_per_week"] = self.sentiment_trend()
+        chat = self._columns(self.chat, [])
+        result["chat_longest_streak"] = streaks(chat["patient"], chat["day"], self.n_patients, self.n_days - 1)[0]
+        result.update(self.diary_adherence())
+        return result
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.summary())
+
+
+if __name__ == "__main__":
+    import time
+
+    cohort = CompactCohort.load_json('data/realistic_patient_data.json')
+    engagement = EngagementAnalytics(cohort)
+    summary = engagement.summary()
+    print("\n" + "="*60)
+    print("ENGAGEMENT SUMMARY")
+    print("="*60)
+    for i, patient_id in enumerate(summary["patient_id"]):
+        print(f"{patient_id:<20} {summary['chats_per_active_day'][i]:.2f} chats/active day, "
+              f"{summary['messages_per_session'][i]:.1f} msgs/session, "
+              f"latency p50 {summary['latency_p50_hours'][i]:.1f}h p99 {summary['latency_p99_hours'][i]:.1f}h, "
+              f"sentiment {summary['sentiment_slope_per_week'][i]:+.3f}/wk, "
+              f"diary {summary['diary_adherence'][i]:.0%} (longest streak {summary['diary_longest_streak'][i]})")
+
+    # Scale: the same cohort repeated to many thousands of patients
+    big = CompactCohort.concat([cohort] * 2000)
+    start = time.perf_counter()
+    EngagementAnalytics(big).summary()
+    rows = sum(len(big.streams[s].get("patient", [])) for s in ("chat", "mood_diary"))
+    print(f"\n{big.n_patients:,} patients, {rows:,} chat/diary rows: {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,94 @@
+import heapq
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Any, Iterable, Iterator, NamedTuple, Optional
+
+from compact_dataset import STREAMS, INVALID_MINUTE, _minute_of_day
+
+# Nominal minute of day at which a once-per-day record arrives (chats carry their own HH:MM)
+STREAM_MINUTES = {
+    "apple_watch": 6 * 60,    # Overnight sleep summary synced in the morning
+    "phq5": 10 * 60,
+    "mood_diary": 21 * 60,    # Evening diary entry
+    "sobriety": 23 * 60 + 59,  # End-of-day check-in
+}
+# Chats whose time is not a valid HH:MM are placed at the end of their day
+LATE_MINUTE = 23 * 60 + 59
+
+
+class Event(NamedTuple):
+    timestamp: datetime
+    patient_id: str
+    stream: str
+    record: Dict[str, Any]
+
+
+def _stream_events(patient_id: str, stream: str, records: Iterable[Dict[str, Any]]) -> Iterator[Event]:
+    """One stream of one patient in time order (records are already in date order).
+
+    Chats are buffered one day at a time and sorted by time, so the buffer
+    never holds more than a single day of a single patient.
+    """
+    for day, group in groupby(records, key=lambda record: record["date"]):
+        midnight = datetime.combine(date.fromisoformat(day), datetime.min.time())
+        if stream == "chat":
+            timed = []
+            for record in group:
+                minute = _minute_of_day(record.get("time", ""))
+                timed.append((LATE_MINUTE if minute == INVALID_MINUTE else minute, record))
+            timed.sort(key=lambda item: item[0])
+        else:
+            timed = [(STREAM_MINUTES.get(stream, 0), record) for record in group]
+        for minute, record in timed:
+            yield Event(midnight + timedelta(minutes=minute), patient_id, stream, record)
+
+
+def patient_events(patient_id: str, persona_data: Dict[str, Any], streams: Optional[List[str]] = None) -> Iterator[Event]:
+    """All streams of one patient merged into one time-ordered iterator"""
+    iterators = [_stream_events(patient_id, stream, persona_data.get(stream, [])) for stream in (streams or STREAMS)]
+    return heapq.merge(*iterators, key=lambda event: event.timestamp)
+
+
+def event_stream(data: Dict[str, Any], streams: Optional[List[str]] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Event]:
+    """Globally time-ordered events of every patient in a generated dataset.
+
+    A heap holds the next pending event of each patient's sorted iterator
+    (itself a heap over that patient's streams), so memory is
+    O(patients * streams) regardless of the number of events. Ties keep
+    persona order, then stream order. start/end bound the half-open window
+    [start, end).
+    """
+    iterators = [patient_events(patient_id, persona_data, streams)
+                 for patient_id, persona_data in data["personas"].items()]
+    for event in heapq.merge(*iterators, key=lambda event: event.timestamp):
+        if start is not None and event.timestamp < start:
+            continue
+        if end is not None and event.timestamp >= end:
+            return
+        yield event
+
+
+if __name__ == "__main__":
+    import json
+    import time
+    from collections import Counter
+
+    with open('data/realistic_patient_data.json', 'r') as f:
+        data = json.load(f)
+
+    print("First events of the merged stream:")
+    for event in event_stream(data, end=datetime(2024, 1, 2)):
+        print(f"  {event.timestamp:%Y-%m-%d %H:%M}  {event.patient_id:<20} {event.stream}")
+
+    start = time.perf_counter()
+    counts, previous, in_order = Counter(), None, True
+    for event in event_stream(data):
+        counts[event.stream] += 1
+        in_order &= previous is None or previous <= event.timestamp
+        previous = event.timestamp
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"\n{total:,} events in {elapsed:.2f} s ({total / elapsed:,.0f} events/s), "
+          f"chronological: {in_order}")
+    print(f"  {dict(counts)}")
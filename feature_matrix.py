@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+from compact_dataset import CompactCohort, STREAM_COLUMNS
+
+# How each stream lands on the patient x day grid
+DAILY_STREAMS = ["apple_watch", "sobriety"]  # One record every day
+SPARSE_STREAMS = {"phq5": "ffill", "mood_diary": "none"}  # Weekly / skipped days: carry forward or leave NaN
+CHAT_AGGREGATES = {
+    "count": None,
+    "message_count_sum": "message_count",
+    "sentiment_score_mean": "sentiment_score",
+    "sentiment_score_min": "sentiment_score",
+    "avg_response_time_hours_mean": "avg_response_time_hours",
+    "engagement_level_mean": "engagement_level",
+    "crisis_indicators_any": "crisis_indicators",
+}
+
+
+def grid_keys(patient: np.ndarray, day: np.ndarray, n_days: int) -> np.ndarray:
+    """Integer join key: row of (patient, day) in a patient-major grid"""
+    return patient.astype(np.int64) * n_days + day.astype(np.int64)
+
+
+def rows_on_grid(columns: Dict[str, np.ndarray], n_days: int) -> Dict[str, np.ndarray]:
+    """A stream's rows with 0 <= day < n_days; others would key into a neighbouring patient's rows"""
+    if len(columns.get("day", [])) == 0:
+        return columns
+    keep = (columns["day"] >= 0) & (columns["day"] < n_days)
+    return columns if keep.all() else {name: values[keep] for name, values in columns.items()}
+
+
+def sort_by_key(keys: np.ndarray) -> np.ndarray:
+    """Stable order that sorts the keys; free when the stream is already in generator order"""
+    if len(keys) < 2 or np.all(keys[1:] >= keys[:-1]):
+        return np.arange(len(keys))
+    return np.argsort(keys, kind="stable")
+
+
+def merge_join(left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort-merge two sorted key arrays: positions in left of each right key, and whether it matched"""
+    positions = np.searchsorted(left, right)
+    matched = positions < len(left)
+    matched[matched] = left[positions[matched]] == right[matched]
+    return positions, matched
+
+
+def forward_fill(values: np.ndarray, present: np.ndarray, group_start: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Carry the last present value forward within each group; also returns rows since that value"""
+    rows = np.arange(len(values))
+    last = np.maximum.accumulate(np.where(present, rows, -1))
+    valid = last >= group_start
+    filled = np.where(valid, values[np.maximum(last, 0)], np.nan)
+    age = np.where(valid, rows - last, -1)
+    return filled, age
+
+
+def cohort_fingerprint(cohort: CompactCohort) -> str:
+    """Content hash of a cohort's columns, used as the feature cache key"""
+    digest = hashlib.sha1(json.dumps([cohort.start_date, cohort.patient_ids]).encode())
+    for stream in sorted(cohort.streams):
+        for name in sorted(cohort.streams[stream]):
+            values = np.ascontiguousarray(cohort.streams[stream][name])
+            digest.update(f"{stream}.{name}:{values.dtype.str}".encode())
+            digest.update(values.data)
+    return digest.hexdigest()
+
+
+class FeatureMatrix:
+    """Patient x day grid of features from every stream, patient-major (row = patient * n_days + day)"""
+
+    def __init__(self, start_date: str, patient_ids: List[str], n_days: int, columns: Dict[str, np.ndarray]):
+        self.start_date = start_date
+        self.patient_ids = list(patient_ids)
+        self.patient_index = {p: i for i, p in enumerate(self.patient_ids)}
+        self.n_days = n_days
+        self.columns = columns
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.patient_ids) * self.n_days
+
+    @property
+    def patient(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.patient_ids), dtype=np.int32), self.n_days)
+
+    @property
+    def day(self) -> np.ndarray:
+        return np.tile(np.arange(self.n_days, dtype=np.int16), len(self.patient_ids))
+
+    def patient_slice(self, patient_id: str) -> slice:
+        start = self.patient_index[patient_id] * self.n_days
+        return slice(start, start + self.n_days)
+
+    def matrix(self, names: List[str]) -> np.ndarray:
+        """Selected columns stacked into an (n_rows, len(names)) float32 array"""
+        return np.column_stack([self.columns[name] for name in names]).astype(np.float32, copy=False)
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        frame = pd.DataFrame(self.columns)
+        frame.insert(0, "patient_id", np.asarray(self.patient_ids, dtype=object)[self.patient])
+        frame.insert(1, "date", np.datetime64(self.start_date, "D") + self.day.astype(np.int64))
+        return frame
+
+    def save(self, filename: str):
+        meta = {"start_date": self.start_date, "patient_ids": self.patient_ids, "n_days": self.n_days}
+        np.savez(filename, __meta__=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **self.columns)
+
+    @classmethod
+    def load(cls, filename: str) -> "FeatureMatrix":
+        with np.load(filename) as archive:
+            meta = json.loads(archive["__meta__"].tobytes().decode())
+            columns = {name: archive[name] for name in archive.files if name != "__meta__"}
+        return cls(meta["start_date"], meta["patient_ids"], meta["n_days"], columns)
+
+
+class FeatureJoiner:
+    """Builds FeatureMatrix objects with a sort-merge on integer day offsets, memoized per cohort.
+
+    Results are cached in memory and as .npz files keyed by the cohort's content
+    hash and grid length, so every analysis over the same data reuses one join.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = "data/feature_cache"):
+        self.cache_dir = cache_dir
+        self.cache: Dict[str, FeatureMatrix] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def build(self, cohort: CompactCohort, n_days: Optional[int] = None) -> FeatureMatrix:
+        """Feature matrix for a cohort, from cache when the same data was joined before"""
+        n_days = self.resolve_days(cohort, n_days)
+        key = f"{cohort_fingerprint(cohort)}-{n_days}d"
+        if key in self.cache:
+            return self.cache[key]
+        path = os.path.join(self.cache_dir, f"{key}.npz") if self.cache_dir else None
+        if path and os.path.exists(path):
+            features = FeatureMatrix.load(path)
+        else:
+            features = self.join(cohort, n_days)
+            if path:
+                features.save(path)
+        self.cache[key] = features
+        return features
+
+    @staticmethod
+    def resolve_days(cohort: CompactCohort, n_days: Optional[int] = None) -> int:
+        """Grid length: as given, else the generated horizon, else the last recorded day + 1"""
+        if n_days is None:
+            n_days = cohort.generation_info.get("days_generated") or 1 + max(
+                int(columns["day"].max()) for columns in cohort.streams.values() if len(columns.get("day", [])))
+        return n_days
+
+    @staticmethod
+    def join(cohort: CompactCohort, n_days: Optional[int] = None) -> FeatureMatrix:
+        """Align every stream onto the patient x day grid (rows outside the first n_days are dropped)"""
+        n_days = FeatureJoiner.resolve_days(cohort, n_days)
+        n_patients = len(cohort.patient_ids)
+        grid = np.arange(n_patients * n_days, dtype=np.int64)
+        group_start = np.repeat(np.arange(n_patients, dtype=np.int64) * n_days, n_days)
+        columns: Dict[str, np.ndarray] = {}
+
+        for stream in DAILY_STREAMS + list(SPARSE_STREAMS):
+            source = rows_on_grid(cohort.streams.get(stream, {}), n_days)
+            keys = grid_keys(source.get("patient", np.array([], np.int32)), source.get("day", np.array([], np.int16)), n_days)
+            order = sort_by_key(keys)
+            positions, matched = merge_join(grid, keys[order])
+            target, rows = positions[matched], order[matched]
+            present = np.zeros(len(grid), dtype=bool)
+            present[target] = True
+
+            for name in STREAM_COLUMNS[stream]:
+                values = np.full(len(grid), np.nan, dtype=np.float32)
+                if name in source:
+                    values[target] = source[name][rows]
+                if SPARSE_STREAMS.get(stream) == "ffill":
+                    values, age = forward_fill(values, present, group_start)
+                    values = values.astype(np.float32)
+                columns[f"{stream}.{name}"] = values
+            if stream in SPARSE_STREAMS:
+                columns[f"{stream}.present"] = present
+            if SPARSE_STREAMS.get(stream) == "ffill":
+                columns[f"{stream}.days_since"] = age.astype(np.int16)
+
+        columns.update(FeatureJoiner._chat_features(cohort, grid, n_days))
+        return FeatureMatrix(cohort.start_date, cohort.patient_ids, n_days, columns)
+
+    @staticmethod
+    def _chat_features(cohort: CompactCohort, grid: np.ndarray, n_days: int) -> Dict[str, np.ndarray]:
+        """Aggregate the several chats of a day into one row with reduceat over sorted runs"""
+        chat = rows_on_grid(cohort.streams.get("chat", {}), n_days)
+        result = {f"chat.{name}": np.zeros(len(grid), dtype=np.float32) for name in CHAT_AGGREGATES}
+        for name in CHAT_AGGREGATES:
+            if name.endswith(("_mean", "_min")):
+                result[f"chat.{name}"][:] = np.nan
+        if len(chat.get("patient", [])) == 0:
+            return result
+
+        keys = grid_keys(chat["patient"], chat["day"], n_days)
+        order = sort_by_key(keys)
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        run_keys = keys[starts]
+        positions, matched = merge_join(grid, run_keys)
+        target = positions[matched]
+        counts = np.diff(np.r_[starts, len(keys)])
+
+        for name, source in CHAT_AGGREGATES.items():
+            if source is None:
+                values = counts
+            else:
+                column = chat[source][order].astype(np.float64)
+                if name.endswith("_min"):
+                    values = np.minimum.reduceat(column, starts)
+                elif name.endswith("_any"):
+                    values = np.maximum.reduceat(column, starts)
+                else:
+                    values = np.add.reduceat(column, starts)
+                    if name.endswith("_mean"):
+                        values = values / counts
+            result[f"chat.{name}"][target] = values[matched]
+        return result
+
+
+if __name__ == "__main__":
+    import time
+
+    cohort = CompactCohort.load_json('data/realistic_patient_data.json')
+    joiner = FeatureJoiner()
+    start = time.perf_counter()
+    features = joiner.join(cohort)
+    print(f"Joined {sum(len(c['patient']) for c in cohort.streams.values()):,} records into "
+          f"{features.n_rows:,} patient-days x {len(features.columns)} features "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    joiner.build(cohort)
+    joiner.build(cohort)
+    print(f"Cached build (hash + reuse): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    risk = features.columns["sobriety.relapse_risk_score"]
+    print("\nCorrelation with relapse risk:")
+    for name in ["apple_watch.heart_rate_variability", "apple_watch.sleep_efficiency", "phq5.total_score",
+                 "chat.count", "chat.sentiment_score_mean", "mood_diary.craving_intensity"]:
+        values = features.columns[name]
+        rows = ~np.isnan(values)
+        print(f"  {name:<40} {np.corrcoef(values[rows], risk[rows])[0, 1]:+.3f}  ({rows.sum()} patient-days)")
@@ -2,11 +2,46 @@ import json
 import random
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
-import pandas as pd
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass
+from compact_dataset import CompactCohort
+from rollups import RollupStore
+from generation_profiler import NullProfiler, profiler_from_env
 import math
-from scipy import stats
+
+# Baseline relapse risk decay shared by all personas
+DECAY_RATE = 0.008
+BASE_RISK = 0.08  # Long-term steady state
+INITIAL_RISK = 0.75
+RELAPSE_MULTIPLIER = 0.01  # Daily relapse probability = risk * multiplier
+
+# Regime-switching stress models per persona (base_mean is always 0.0)
+PERSONA_RISK_MODELS = {
+    "sarah_chen": {
+        "initial_sobriety": 45,
+        "base_std": 0.05, "high_mean": 0.15, "high_std": 0.08,
+        "prob_enter_high": 0.08, "prob_exit_high": 0.25,  # Stress periods last ~4 days on average
+        "max_risk": 0.9,
+    },
+    "marcus_rodriguez": {
+        "initial_sobriety": 180,  # Already 6 months sober
+        "base_std": 0.03, "high_mean": 0.25, "high_std": 0.12,  # More intense than Sarah's work stress
+        "prob_enter_high": 0.05, "prob_exit_high": 0.4,  # Less frequent, shorter duration
+        "max_risk": 0.8,
+    },
+    "jessica_thompson": {
+        "initial_sobriety": 30,  # Early recovery
+        "base_std": 0.06, "high_mean": 0.20, "high_std": 0.10,
+        "prob_enter_high": 0.12, "prob_exit_high": 0.3,  # More frequent social challenges
+        "max_risk": 0.85,
+    },
+    "robert_williams": {
+        "initial_sobriety": 90,  # 3 months sober
+        "base_std": 0.04, "high_mean": 0.18, "high_std": 0.09,
+        "prob_enter_high": 0.06, "prob_exit_high": 0.2,  # Longer depression periods
+        "max_risk": 0.75,
+    },
+}
 
 @dataclass
 class AppleWatchData:
@@ -72,16 +107,18 @@ class SobrietyData:
 class RealisticTimeSeriesGenerator:
     """Generate realistic time series with autocorrelation and persistence"""
     
-    def __init__(self, random_seed=42):
+    def __init__(self, random_seed=42, profiler=None):
         np.random.seed(random_seed)
+        self.profiler = profiler or NullProfiler()
         
     def generate_ar1_series(self, n_days: int, mean: float, std: float, phi: float = 0.7) -> np.ndarray:
         """Generate AR(1) time series with persistence parameter phi"""
-        series = np.zeros(n_days)
-        series[0] = np.random.normal(mean, std)
-        
-        for t in range(1, n_days):
-            series[t] = phi * series[t-1] + (1 - phi) * mean + np.random.normal(0, std * np.sqrt(1 - phi**2))
+        with self.profiler.span("ar1_series"):
+            series = np.zeros(n_days)
+            series[0] = np.random.normal(mean, std)
+            
+            for t in range(1, n_days):
+                series[t] = phi * series[t-1] + (1 - phi) * mean + np.random.normal(0, std * np.sqrt(1 - phi**2))
         
         return series
     
@@ -89,37 +126,38 @@ class RealisticTimeSeriesGenerator:
                                        high_mean: float, high_std: float, 
                                        prob_enter_high: float = 0.05, prob_exit_high: float = 0.3) -> np.ndarray:
         """Generate series that switches between normal and high-risk regimes"""
-        series = np.zeros(n_days)
-        is_high_regime = np.zeros(n_days, dtype=bool)
-        
-        # Start in normal regime
-        current_regime = 'normal'
-        
-        for t in range(n_days):
-            # Regime switching logic
-            if current_regime == 'normal':
-                if np.random.random() < prob_enter_high:
-                    current_regime = 'high'
-            else:  # high regime
-                if np.random.random() < prob_exit_high:
-                    current_regime = 'normal'
+        with self.profiler.span("regime_series"):
+            series = np.zeros(n_days)
+            is_high_regime = np.zeros(n_days, dtype=bool)
+        
+            # Start in normal regime
+            current_regime = 'normal'
+        
+            for t in range(n_days):
+                # Regime switching logic
+                if current_regime == 'normal':
+                    if np.random.random() < prob_enter_high:
+                        current_regime = 'high'
+                else:  # high regime
+                    if np.random.random() < prob_exit_high:
+                        current_regime = 'normal'
             
-            is_high_regime[t] = (current_regime == 'high')
+                is_high_regime[t] = (current_regime == 'high')
             
-            # Generate values based on current regime
-            if current_regime == 'normal':
-                if t == 0:
-                    series[t] = np.random.normal(base_mean, base_std)
-                else:
-                    # AR(1) within regime
-                    series[t] = 0.8 * series[t-1] + 0.2 * base_mean + np.random.normal(0, base_std * 0.5)
-            else:
-                if t == 0 or not is_high_regime[t-1]:
-                    # Entering high regime
-                    series[t] = np.random.normal(high_mean, high_std)
+                # Generate values based on current regime
+                if current_regime == 'normal':
+                    if t == 0:
+                        series[t] = np.random.normal(base_mean, base_std)
+                    else:
+                        # AR(1) within regime
+                        series[t] = 0.8 * series[t-1] + 0.2 * base_mean + np.random.normal(0, base_std * 0.5)
                 else:
-                    # Continuing in high regime
-                    series[t] = 0.9 * series[t-1] + 0.1 * high_mean + np.random.normal(0, high_std * 0.3)
+                    if t == 0 or not is_high_regime[t-1]:
+                        # Entering high regime
+                        series[t] = np.random.normal(high_mean, high_std)
+                    else:
+                        # Continuing in high regime
+                        series[t] = 0.9 * series[t-1] + 0.1 * high_mean + np.random.normal(0, high_std * 0.3)
         
         return series, is_high_regime
     
@@ -138,9 +176,11 @@ class RealisticTimeSeriesGenerator:
         return series + seasonal * np.mean(series)
 
 class PersonaDataGenerator:
-    def __init__(self, start_date: str = "2024-01-01"):
+    def __init__(self, start_date: str = "2024-01-01", profiler=None):
         self.start_date = datetime.strptime(start_date, "%Y-%m-%d")
-        self.ts_gen = RealisticTimeSeriesGenerator(random_seed=42)
+        # Opt-in instrumentation; the default NullProfiler leaves output and RNG use unchanged
+        self.profiler = profiler or NullProfiler()
+        self.ts_gen = RealisticTimeSeriesGenerator(random_seed=42, profiler=self.profiler)
         random.seed(42)
         np.random.seed(42)
         
@@ -150,11 +190,7 @@ class PersonaDataGenerator:
             return 0.9
         
         # Risk decays exponentially but levels off at steady state
-        decay_rate = 0.008
-        base_risk = 0.08  # Long-term steady state
-        initial_risk = 0.75
-        
-        risk = base_risk + (initial_risk - base_risk) * math.exp(-decay_rate * days_sober)
+        risk = BASE_RISK + (INITIAL_RISK - BASE_RISK) * math.exp(-DECAY_RATE * days_sober)
         return min(max(risk, 0.05), 0.9)
     
     def generate_sarah_data(self) -> Dict[str, Any]:
@@ -170,13 +206,14 @@ class PersonaDataGenerator:
         }
         
         n_days = 180
-        initial_sobriety = 45
+        model = PERSONA_RISK_MODELS["sarah_chen"]
+        initial_sobriety = model["initial_sobriety"]
         
         # Generate realistic variation with work stress periods
         stress_periods, is_high_stress = self.ts_gen.generate_regime_switching_series(
-            n_days, base_mean=0.0, base_std=0.05, 
-            high_mean=0.15, high_std=0.08,
-            prob_enter_high=0.08, prob_exit_high=0.25  # Stress periods last ~4 days on average
+            n_days, base_mean=0.0, base_std=model["base_std"], 
+            high_mean=model["high_mean"], high_std=model["high_std"],
+            prob_enter_high=model["prob_enter_high"], prob_exit_high=model["prob_exit_high"]
         )
         
         # Generate correlated biomarkers (will be adjusted for individual days)
@@ -214,7 +251,8 @@ class PersonaDataGenerator:
         
         for day in range(n_days):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             
             current_sobriety += 1
             
@@ -223,15 +261,15 @@ class PersonaDataGenerator:
             
             # Add stress variation to baseline risk
             stress_addition = stress_periods[day]
-            current_risk = np.clip(base_risk + stress_addition, 0.05, 0.9)
+            current_risk = np.clip(base_risk + stress_addition, 0.05, model["max_risk"])
             
             # Check for relapse (very rare, based on risk)
-            relapse_occurred = np.random.random() < current_risk * 0.01
+            relapse_occurred = np.random.random() < current_risk * RELAPSE_MULTIPLIER
             if relapse_occurred and current_sobriety > 30:
                 current_sobriety = random.randint(1, 7)
                 # Recalculate risk after relapse - should be very high
                 base_risk = self.calculate_base_relapse_risk(current_sobriety)
-                current_risk = np.clip(base_risk + stress_addition, 0.05, 0.9)
+                current_risk = np.clip(base_risk + stress_addition, 0.05, model["max_risk"])
             
             # Generate mood/craving based on current risk
             mood_rating = max(1, min(10, 7.5 - current_risk * 4 + np.random.normal(0, 0.8)))
@@ -240,7 +278,7 @@ class PersonaDataGenerator:
             # Apple Watch data
             is_weekday = current_date.weekday() < 5
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=resting_hr_series[day] + random.randint(15, 25),
                 heart_rate_resting=resting_hr_series[day],
@@ -267,7 +305,7 @@ class PersonaDataGenerator:
                 tired_energy = min(3, max(0, int(base_depression + stress_level + np.random.normal(0, 0.5))))
                 appetite = min(3, max(0, int(base_depression + np.random.normal(0, 0.5))))
                 
-                phq5 = PHQ5Response(
+                phq5 = self.profiler.make(PHQ5Response,
                     date=date_str,
                     little_interest=little_interest,
                     feeling_down=feeling_down,
@@ -276,7 +314,7 @@ class PersonaDataGenerator:
                     appetite=appetite,
                     total_score=little_interest + feeling_down + sleep_trouble + tired_energy + appetite
                 )
-                data["phq5"].append(asdict(phq5))
+                data["phq5"].append(self.profiler.asdict(phq5))
             
             # Mood diary (Sarah is consistent but varies by stress)
             if random.random() < (0.95 if not is_high_stress[day] else 0.85):
@@ -302,7 +340,7 @@ class PersonaDataGenerator:
                     coping_strategies.extend(random.sample(["journaling", "gratitude", "exercise", "routine"], 
                                                          random.randint(1, 2)))
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=mood_rating,
                     anxiety_level=max(1, min(10, 4 + len(triggers) + current_risk * 3)),
@@ -315,7 +353,7 @@ class PersonaDataGenerator:
                     notes=f"Day {current_sobriety} sober. {'Just relapsed - need to reset and focus' if relapse_occurred else 'Challenging period' if is_high_stress[day] else 'Staying focused on recovery'}.",
                     word_count=random.randint(80, 200)
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Chat interactions (frequent, varies with stress and risk)
             chat_freq = 3 if not is_high_stress[day] else 5  # More chats when stressed
@@ -333,7 +371,7 @@ class PersonaDataGenerator:
                 elif current_sobriety < 30:
                     topics = ["early recovery", "cravings", "support", "routine"]
                 
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{random.randint(8, 22):02d}:{random.randint(0, 59):02d}",
                     message_count=random.randint(2, 15),
@@ -343,10 +381,10 @@ class PersonaDataGenerator:
                     crisis_indicators=is_high_stress[day] and current_risk > 0.5,
                     engagement_level=max(1, min(10, 8 - current_risk * 3))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
             # Sobriety tracking
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=current_risk,
@@ -355,8 +393,8 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(2, 3),
                 relapse_occurred=relapse_occurred
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
@@ -373,20 +411,21 @@ class PersonaDataGenerator:
         }
         
         n_days = 180
-        initial_sobriety = 180  # Already 6 months sober
+        model = PERSONA_RISK_MODELS["marcus_rodriguez"]
+        initial_sobriety = model["initial_sobriety"]
         
         # Generate base relapse risk trend (lower due to longer sobriety)
         base_risks = np.array([self.calculate_base_relapse_risk(initial_sobriety + i) for i in range(n_days)])
         
         # PTSD episodes create different stress pattern - less frequent but more intense
         ptsd_periods, is_ptsd_episode = self.ts_gen.generate_regime_switching_series(
-            n_days, base_mean=0.0, base_std=0.03, 
-            high_mean=0.25, high_std=0.12,  # More intense than Sarah's work stress
-            prob_enter_high=0.05, prob_exit_high=0.4  # Less frequent, shorter duration
+            n_days, base_mean=0.0, base_std=model["base_std"], 
+            high_mean=model["high_mean"], high_std=model["high_std"],
+            prob_enter_high=model["prob_enter_high"], prob_exit_high=model["prob_exit_high"]
         )
         
         # Combine base risk with PTSD variations
-        relapse_risks = np.clip(base_risks + ptsd_periods, 0.05, 0.8)
+        relapse_risks = np.clip(base_risks + ptsd_periods, 0.05, model["max_risk"])
         
         # Generate biomarkers - Marcus has different baselines
         resting_hr_base = 72  # Lower baseline than Sarah
@@ -421,10 +460,11 @@ class PersonaDataGenerator:
         
         for day in range(n_days):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             current_sobriety += 1
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=resting_hr_series[day] + random.randint(12, 20),
                 heart_rate_resting=resting_hr_series[day],
@@ -447,7 +487,7 @@ class PersonaDataGenerator:
                     triggers.extend(random.sample(["nightmare", "flashback", "loud noise", "crowd"], 
                                                 random.randint(1, 2)))
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, 6.5 - relapse_risks[day] * 3)),
                     anxiety_level=max(1, min(10, 5 + len(triggers) + relapse_risks[day] * 2)),
@@ -460,14 +500,14 @@ class PersonaDataGenerator:
                     notes=f"Day {current_sobriety}. {'Rough night' if is_ptsd_episode[day] else 'Steady'}",
                     word_count=random.randint(15, 50)
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Less frequent chat interactions
             if random.random() < 0.35:
                 # Define chat topics based on PTSD episodes
                 chat_topics = ["PTSD", "pain", "family"] if is_ptsd_episode[day] else ["work", "routine", "meetings"]
                 
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{random.randint(18, 21):02d}:{random.randint(0, 59):02d}",
                     message_count=random.randint(2, 8),
@@ -477,9 +517,9 @@ class PersonaDataGenerator:
                     crisis_indicators=is_ptsd_episode[day] and relapse_risks[day] > 0.5,
                     engagement_level=max(1, min(10, 6 - relapse_risks[day] * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risks[day],
@@ -488,8 +528,8 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(3, 5),
                 relapse_occurred=False
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
@@ -506,19 +546,20 @@ class PersonaDataGenerator:
         }
         
         n_days = 180
-        initial_sobriety = 30  # Early recovery
+        model = PERSONA_RISK_MODELS["jessica_thompson"]
+        initial_sobriety = model["initial_sobriety"]
         
         # Higher baseline risk due to early recovery
         base_risks = np.array([self.calculate_base_relapse_risk(initial_sobriety + i) for i in range(n_days)])
         
         # Social pressure periods - more frequent, college environment
         social_stress, is_social_pressure = self.ts_gen.generate_regime_switching_series(
-            n_days, base_mean=0.0, base_std=0.06, 
-            high_mean=0.20, high_std=0.10,
-            prob_enter_high=0.12, prob_exit_high=0.3  # More frequent social challenges
+            n_days, base_mean=0.0, base_std=model["base_std"], 
+            high_mean=model["high_mean"], high_std=model["high_std"],
+            prob_enter_high=model["prob_enter_high"], prob_exit_high=model["prob_exit_high"]
         )
         
-        relapse_risks = np.clip(base_risks + social_stress, 0.05, 0.85)
+        relapse_risks = np.clip(base_risks + social_stress, 0.05, model["max_risk"])
         
         # Higher baseline HR due to youth and anxiety
         resting_hr_base = 82
@@ -552,10 +593,11 @@ class PersonaDataGenerator:
         
         for day in range(n_days):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             current_sobriety += 1
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=resting_hr_series[day] + random.randint(18, 28),
                 heart_rate_resting=resting_hr_series[day],
@@ -578,7 +620,7 @@ class PersonaDataGenerator:
                     triggers.extend(random.sample(["party invite", "peer pressure", "exam stress", "social anxiety"], 
                                                 random.randint(1, 3)))
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, 7.2 - relapse_risks[day] * 3.5)),
                     anxiety_level=max(1, min(10, 5 + len(triggers) + relapse_risks[day] * 2.5)),
@@ -591,7 +633,7 @@ class PersonaDataGenerator:
                     notes=f"Day {current_sobriety} clean! 🌟 {'Challenging but staying strong' if triggers else 'Grateful for support'}",
                     word_count=random.randint(150, 350)
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Frequent chat interactions
             for _ in range(random.randint(4, 9)):
@@ -602,7 +644,7 @@ class PersonaDataGenerator:
                 else:
                     chat_triggers = ["progress", "career", "recovery"]
                 
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{random.randint(7, 23):02d}:{random.randint(0, 59):02d}",
                     message_count=random.randint(6, 25),
@@ -612,9 +654,9 @@ class PersonaDataGenerator:
                     crisis_indicators=is_social_pressure[day] and relapse_risks[day] > 0.6,
                     engagement_level=max(1, min(10, 8.5 - relapse_risks[day] * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risks[day],
@@ -623,8 +665,8 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(2, 4),
                 relapse_occurred=False
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
@@ -641,18 +683,19 @@ class PersonaDataGenerator:
         }
         
         n_days = 180
-        initial_sobriety = 90  # 3 months sober
+        model = PERSONA_RISK_MODELS["robert_williams"]
+        initial_sobriety = model["initial_sobriety"]
         
         base_risks = np.array([self.calculate_base_relapse_risk(initial_sobriety + i) for i in range(n_days)])
         
         # Loneliness/depression episodes
         depression_periods, is_depressed = self.ts_gen.generate_regime_switching_series(
-            n_days, base_mean=0.0, base_std=0.04, 
-            high_mean=0.18, high_std=0.09,
-            prob_enter_high=0.06, prob_exit_high=0.2  # Longer depression periods
+            n_days, base_mean=0.0, base_std=model["base_std"], 
+            high_mean=model["high_mean"], high_std=model["high_std"],
+            prob_enter_high=model["prob_enter_high"], prob_exit_high=model["prob_exit_high"]
         )
         
-        relapse_risks = np.clip(base_risks + depression_periods, 0.05, 0.75)
+        relapse_risks = np.clip(base_risks + depression_periods, 0.05, model["max_risk"])
         
         # Lower resting HR but affected by depression
         resting_hr_base = 68
@@ -687,10 +730,11 @@ class PersonaDataGenerator:
         
         for day in range(n_days):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             current_sobriety += 1
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=resting_hr_series[day] + random.randint(8, 15),
                 heart_rate_resting=resting_hr_series[day],
@@ -713,7 +757,7 @@ class PersonaDataGenerator:
                     triggers.extend(random.sample(["loneliness", "missing family", "boredom"], 
                                                 random.randint(1, 2)))
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, 5.2 - relapse_risks[day] * 2.5)),
                     anxiety_level=max(1, min(10, 4 + len(triggers) + relapse_risks[day] * 1.5)),
@@ -726,14 +770,14 @@ class PersonaDataGenerator:
                     notes=f"{current_sobriety} days. {'Tough day' if triggers else 'Getting by'}",
                     word_count=random.randint(8, 30)
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Infrequent chat interactions
             if random.random() < 0.25:
                 # Define chat topics based on depression state
                 chat_topics = ["loneliness", "health", "family"] if is_depressed[day] else ["routine", "court", "medication"]
                 
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{random.randint(14, 19):02d}:{random.randint(0, 59):02d}",
                     message_count=random.randint(1, 5),
@@ -743,9 +787,9 @@ class PersonaDataGenerator:
                     crisis_indicators=is_depressed[day] and relapse_risks[day] > 0.4,
                     engagement_level=max(1, min(10, 4.5 - relapse_risks[day] * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risks[day],
@@ -754,13 +798,25 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(2, 4),
                 relapse_occurred=False
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
 
     def generate_all_personas(self) -> Dict[str, Any]:
         """Generate realistic data for all personas"""
+        with self.profiler.stage("generate_all_personas"):
+            all_data = self._generate_all_personas()
+        for persona_id, persona in all_data["personas"].items():
+            self.profiler.count(f"generate_all_personas/persona:{persona_id}", self._record_count(persona))
+        self.profiler.count("generate_all_personas", sum(self._record_count(p) for p in all_data["personas"].values()))
+        return all_data
+
+    @staticmethod
+    def _record_count(persona: Dict[str, Any]) -> int:
+        return sum(len(records) for records in persona.values() if isinstance(records, list))
+
+    def _generate_all_personas(self) -> Dict[str, Any]:
         print("Generating realistic synthetic data...")
         
         all_data = {
@@ -774,16 +830,20 @@ class PersonaDataGenerator:
         }
         
         print("Generating realistic data for Sarah Chen...")
-        all_data["personas"]["sarah_chen"] = self.generate_sarah_data()
+        with self.profiler.stage("persona:sarah_chen"):
+            all_data["personas"]["sarah_chen"] = self.generate_sarah_data()
         
         print("Generating realistic data for Marcus Rodriguez...")
-        all_data["personas"]["marcus_rodriguez"] = self.generate_marcus_data()
+        with self.profiler.stage("persona:marcus_rodriguez"):
+            all_data["personas"]["marcus_rodriguez"] = self.generate_marcus_data()
         
         print("Generating realistic data for Jessica Thompson...")
-        all_data["personas"]["jessica_thompson"] = self.generate_jessica_data()
+        with self.profiler.stage("persona:jessica_thompson"):
+            all_data["personas"]["jessica_thompson"] = self.generate_jessica_data()
         
         print("Generating realistic data for Robert Williams...")
-        all_data["personas"]["robert_williams"] = self.generate_robert_data()
+        with self.profiler.stage("persona:robert_williams"):
+            all_data["personas"]["robert_williams"] = self.generate_robert_data()
         
         return all_data
     
@@ -806,17 +866,34 @@ class PersonaDataGenerator:
             else:
                 return obj
         
-        data_clean = convert_numpy_types(data)
-        
-        with open(filename, 'w') as f:
-            json.dump(data_clean, f, indent=2)
+        with self.profiler.stage("save_data"):
+            with self.profiler.stage("convert_numpy_types"):
+                data_clean = convert_numpy_types(data)
+            
+            with self.profiler.stage("json_dump"):
+                with open(filename, 'w') as f:
+                    json.dump(data_clean, f, indent=2)
+        if "personas" in data:
+            self.profiler.count("save_data", sum(self._record_count(p) for p in data["personas"].values()))
         print(f"Realistic data saved to {filename}")
 
-if __name__ == "__main__":
-    generator = PersonaDataGenerator(start_date="2024-01-01")
+def main(output: str = "data/realistic_patient_data.json",
+         rollups_output: Optional[str] = "data/realistic_patient_rollups.npz", profiler=None):
+    """Generate all personas, save the records and (optionally) their rollups"""
+    # GENERATION_PROFILE=1 records per-stage timings and allocation peaks
+    generator = PersonaDataGenerator(start_date="2024-01-01", profiler=profiler or profiler_from_env())
     all_data = generator.generate_all_personas()
-    generator.save_data(all_data, "data/realistic_patient_data.json")
-    
+    generator.save_data(all_data, output)
+    if generator.profiler.enabled:
+        generator.profiler.print_report()
+        generator.profiler.save_report("data/generation_profile.json")
+
+    # Materialize daily/weekly/monthly rollups alongside the raw records
+    if rollups_output:
+        rollups = RollupStore.build(CompactCohort.from_dataset(all_data))
+        rollups.save(rollups_output)
+        print(f"Rollups saved to {rollups_output}")
+
     print("\n" + "="*50)
     print("REALISTIC DATA GENERATION COMPLETE")
     print("="*50)
@@ -826,13 +903,17 @@ if __name__ == "__main__":
     print("- Regime-switching patterns")
     print("- Weekly seasonality")
     print("- Correlated biomarkers")
-    
+
     sarah_data = all_data["personas"]["sarah_chen"]
     print(f"\nSarah Chen records: {len(sarah_data['apple_watch'])} days")
     print(f"Chat interactions: {len(sarah_data['chat'])}")
     print(f"Mood diary entries: {len(sarah_data['mood_diary'])}")
-    
+
     # Show sample risk variation
     risks = [s['relapse_risk_score'] for s in sarah_data['sobriety'][:14]]
     print(f"\nFirst 14 days relapse risk: {[f'{r:.3f}' for r in risks]}")
-    print("Notice: Values cluster around mean with persistence!") 
\ No newline at end of file
+    print("Notice: Values cluster around mean with persistence!")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,12 @@ import json
 import random
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
-import pandas as pd
-from dataclasses import dataclass, asdict
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass
+from compact_dataset import CompactCohort
+from rollups import RollupStore
+from quantile_sketch import KLLSketch, SKETCH_COLUMNS, sketch_seed
+from generation_profiler import NullProfiler, profiler_from_env
 import math
 
 @dataclass
@@ -69,8 +72,9 @@ class SobrietyData:
     relapse_occurred: bool
 
 class PersonaDataGenerator:
-    def __init__(self, start_date: str = "2024-01-01"):
+    def __init__(self, start_date: str = "2024-01-01", profiler=None):
         self.start_date = datetime.strptime(start_date, "%Y-%m-%d")
+        self.profiler = profiler or NullProfiler()
         self.random_seed = 42
         random.seed(self.random_seed)
         np.random.seed(self.random_seed)
@@ -112,7 +116,8 @@ class PersonaDataGenerator:
         
         for day in range(180):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             
             # Update sobriety status
             current_sobriety += 1
@@ -139,7 +144,7 @@ class PersonaDataGenerator:
             sleep_duration = self.add_noise(6.5 if is_work_stress_day else 7.5, 0.15)
             sleep_efficiency = self.add_noise(78 if is_work_stress_day else 85, 0.1)
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=avg_hr,
                 heart_rate_resting=resting_hr,
@@ -166,7 +171,7 @@ class PersonaDataGenerator:
                 tired_energy = min(3, max(0, 2 + stress_modifier + relapse_modifier - (current_sobriety // 30)))
                 appetite = min(3, max(0, 1 + stress_modifier - (current_sobriety // 60)))
                 
-                phq5 = PHQ5Response(
+                phq5 = self.profiler.make(PHQ5Response,
                     date=date_str,
                     little_interest=little_interest,
                     feeling_down=feeling_down,
@@ -175,7 +180,7 @@ class PersonaDataGenerator:
                     appetite=appetite,
                     total_score=little_interest + feeling_down + sleep_trouble + tired_energy + appetite
                 )
-                data["phq5"].append(asdict(phq5))
+                data["phq5"].append(self.profiler.asdict(phq5))
             
             # Mood diary (daily, detailed entries)
             if random.random() < 0.9:  # Sarah is consistent
@@ -189,7 +194,7 @@ class PersonaDataGenerator:
                 
                 mood_rating = self.add_noise(7 - relapse_risk * 3 - len(triggers))
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, mood_rating)),
                     anxiety_level=max(1, min(10, 4 + len(triggers) + relapse_risk * 2)),
@@ -202,12 +207,12 @@ class PersonaDataGenerator:
                     notes=f"Day {current_sobriety} sober. {'Stressful work day' if is_work_stress_day else 'Feeling stable'}",
                     word_count=random.randint(50, 150)
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Chat interactions (2-3 times daily)
             for chat_session in range(random.randint(2, 4)):
                 hour = random.randint(8, 22)
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{hour:02d}:{random.randint(0, 59):02d}",
                     message_count=random.randint(3, 12),
@@ -217,10 +222,10 @@ class PersonaDataGenerator:
                     crisis_indicators=relapse_risk > 0.6 and len(triggers) > 2,
                     engagement_level=max(1, min(10, 8 - relapse_risk * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
             # Sobriety tracking
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risk,
@@ -229,8 +234,8 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(2, 3),  # Outpatient groups
                 relapse_occurred=relapse_occurred
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
@@ -252,7 +257,8 @@ class PersonaDataGenerator:
         
         for day in range(180):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             
             current_sobriety += 1
             relapse_risk = self.calculate_relapse_risk(current_sobriety)
@@ -286,7 +292,7 @@ class PersonaDataGenerator:
             is_weekday = current_date.weekday() < 5
             steps = random.randint(8000, 15000) if is_weekday else random.randint(2000, 6000)
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=avg_hr,
                 heart_rate_resting=resting_hr,
@@ -314,7 +320,7 @@ class PersonaDataGenerator:
                 tired_energy = min(3, max(0, 3 + pain_modifier - (current_sobriety // 30)))
                 appetite = min(3, max(0, 1 + ptsd_modifier))
                 
-                phq5 = PHQ5Response(
+                phq5 = self.profiler.make(PHQ5Response,
                     date=date_str,
                     little_interest=little_interest,
                     feeling_down=feeling_down,
@@ -323,7 +329,7 @@ class PersonaDataGenerator:
                     appetite=appetite,
                     total_score=little_interest + feeling_down + sleep_trouble + tired_energy + appetite
                 )
-                data["phq5"].append(asdict(phq5))
+                data["phq5"].append(self.profiler.asdict(phq5))
             
             # Mood diary (brief entries, focuses on practical)
             if random.random() < 0.7:  # Less consistent than Sarah
@@ -337,7 +343,7 @@ class PersonaDataGenerator:
                 
                 coping_strategies = ["breathing exercises", "call sponsor", "walk"] if triggers else ["work", "routine"]
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, 6 - relapse_risk * 2 - len(triggers))),
                     anxiety_level=max(1, min(10, 5 + len(triggers) + relapse_risk * 2)),
@@ -350,11 +356,11 @@ class PersonaDataGenerator:
                     notes=f"Sober {current_sobriety} days. Pain level {'high' if high_pain_day else 'manageable'}",
                     word_count=random.randint(10, 40)  # Brief entries
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Chat interactions (every 2-3 days, practical focus)
             if random.random() < 0.4:
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{random.randint(18, 21):02d}:{random.randint(0, 59):02d}",  # Evening
                     message_count=random.randint(2, 6),
@@ -364,10 +370,10 @@ class PersonaDataGenerator:
                     crisis_indicators=ptsd_episode and relapse_risk > 0.5,
                     engagement_level=max(1, min(10, 6 - relapse_risk * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
             # Sobriety tracking
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risk,
@@ -376,8 +382,8 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(3, 5),  # AA + IOP
                 relapse_occurred=relapse_occurred
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
@@ -399,7 +405,8 @@ class PersonaDataGenerator:
         
         for day in range(180):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             
             current_sobriety += 1
             relapse_risk = self.calculate_relapse_risk(current_sobriety)
@@ -435,7 +442,7 @@ class PersonaDataGenerator:
             is_weekday = current_date.weekday() < 5
             base_steps = 8000 if is_weekday else random.randint(3000, 12000)  # Variable weekends
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=avg_hr,
                 heart_rate_resting=resting_hr,
@@ -462,7 +469,7 @@ class PersonaDataGenerator:
                 tired_energy = min(3, max(0, 2 + exam_modifier - (current_sobriety // 30)))
                 appetite = min(3, max(0, 1 + exam_modifier))
                 
-                phq5 = PHQ5Response(
+                phq5 = self.profiler.make(PHQ5Response,
                     date=date_str,
                     little_interest=little_interest,
                     feeling_down=feeling_down,
@@ -471,7 +478,7 @@ class PersonaDataGenerator:
                     appetite=appetite,
                     total_score=little_interest + feeling_down + sleep_trouble + tired_energy + appetite
                 )
-                data["phq5"].append(asdict(phq5))
+                data["phq5"].append(self.profiler.asdict(phq5))
             
             # Mood diary (very detailed, emotional)
             if random.random() < 0.95:  # Very consistent
@@ -485,7 +492,7 @@ class PersonaDataGenerator:
                 
                 coping_strategies = ["text friend", "listen to music", "journal", "exercise"] if triggers else ["gratitude practice", "study group", "self-care"]
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, 7 - relapse_risk * 3 - len(triggers) * 0.5)),
                     anxiety_level=max(1, min(10, 4 + len(triggers) * 1.5 + relapse_risk * 2)),
@@ -498,12 +505,12 @@ class PersonaDataGenerator:
                     notes=f"Day {current_sobriety} clean! 🌟 {'Stressed about exams' if is_exam_period else 'Feeling grateful for support system'}. Future goals: graduate school in counseling! 💪",
                     word_count=random.randint(100, 300)  # Very detailed
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Chat interactions (multiple times daily)
             for chat_session in range(random.randint(3, 8)):
                 hour = random.randint(7, 23)
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{hour:02d}:{random.randint(0, 59):02d}",
                     message_count=random.randint(5, 20),
@@ -513,10 +520,10 @@ class PersonaDataGenerator:
                     crisis_indicators=social_pressure_day and relapse_risk > 0.7,
                     engagement_level=max(1, min(10, 9 - relapse_risk * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
             # Sobriety tracking
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risk,
@@ -525,8 +532,8 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(1, 3),  # College group + some AA
                 relapse_occurred=relapse_occurred
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
@@ -548,7 +555,8 @@ class PersonaDataGenerator:
         
         for day in range(180):
             current_date = self.start_date + timedelta(days=day)
-            date_str = current_date.strftime("%Y-%m-%d")
+            with self.profiler.span("format_date"):
+                date_str = current_date.strftime("%Y-%m-%d")
             
             current_sobriety += 1
             relapse_risk = self.calculate_relapse_risk(current_sobriety)
@@ -582,7 +590,7 @@ class PersonaDataGenerator:
             # Low activity baseline
             steps = random.randint(1500, 4000) + (1000 if random.random() < 0.3 else 0)  # Occasional walks
             
-            apple_watch = AppleWatchData(
+            apple_watch = self.profiler.make(AppleWatchData,
                 date=date_str,
                 heart_rate_avg=avg_hr,
                 heart_rate_resting=resting_hr,
@@ -610,7 +618,7 @@ class PersonaDataGenerator:
                 tired_energy = min(3, max(0, 3 + pain_modifier + lonely_modifier - (current_sobriety // 45)))
                 appetite = min(3, max(0, 1 + lonely_modifier))
                 
-                phq5 = PHQ5Response(
+                phq5 = self.profiler.make(PHQ5Response,
                     date=date_str,
                     little_interest=little_interest,
                     feeling_down=feeling_down,
@@ -619,7 +627,7 @@ class PersonaDataGenerator:
                     appetite=appetite,
                     total_score=little_interest + feeling_down + sleep_trouble + tired_energy + appetite
                 )
-                data["phq5"].append(asdict(phq5))
+                data["phq5"].append(self.profiler.asdict(phq5))
             
             # Mood diary (minimal entries, gaps during depression)
             if random.random() < (0.4 if lonely_day else 0.6):
@@ -633,7 +641,7 @@ class PersonaDataGenerator:
                 
                 coping_strategies = ["TV", "medication", "nap"] if triggers else ["routine", "walk", "call kids"]
                 
-                mood_entry = MoodDiaryEntry(
+                mood_entry = self.profiler.make(MoodDiaryEntry,
                     date=date_str,
                     mood_rating=max(1, min(10, 5 - relapse_risk * 2 - len(triggers))),
                     anxiety_level=max(1, min(10, 4 + len(triggers) + (2 if court_date else 0))),
@@ -646,11 +654,11 @@ class PersonaDataGenerator:
                     notes=f"{current_sobriety} days. {'Rough day' if triggers else 'Getting by'}",
                     word_count=random.randint(5, 25)  # Very brief
                 )
-                data["mood_diary"].append(asdict(mood_entry))
+                data["mood_diary"].append(self.profiler.asdict(mood_entry))
             
             # Chat interactions (2-3 times per week, structured)
             if random.random() < 0.35:
-                chat = ChatInteraction(
+                chat = self.profiler.make(ChatInteraction,
                     date=date_str,
                     time=f"{random.randint(14, 18):02d}:{random.randint(0, 59):02d}",  # Afternoon
                     message_count=random.randint(1, 4),
@@ -660,10 +668,10 @@ class PersonaDataGenerator:
                     crisis_indicators=lonely_day and relapse_risk > 0.4,
                     engagement_level=max(1, min(10, 5 - relapse_risk * 2))
                 )
-                data["chat"].append(asdict(chat))
+                data["chat"].append(self.profiler.asdict(chat))
             
             # Sobriety tracking
-            sobriety = SobrietyData(
+            sobriety = self.profiler.make(SobrietyData,
                 date=date_str,
                 days_sober=current_sobriety,
                 relapse_risk_score=relapse_risk,
@@ -672,13 +680,25 @@ class PersonaDataGenerator:
                 meeting_attendance=random.randint(2, 4),  # Court-mandated meetings
                 relapse_occurred=relapse_occurred
             )
-            data["sobriety"].append(asdict(sobriety))
-            data["apple_watch"].append(asdict(apple_watch))
+            data["sobriety"].append(self.profiler.asdict(sobriety))
+            data["apple_watch"].append(self.profiler.asdict(apple_watch))
         
         return data
     
     def generate_all_personas(self) -> Dict[str, Any]:
         """Generate data for all personas"""
+        with self.profiler.stage("generate_all_personas"):
+            all_data = self._generate_all_personas()
+        for persona_id, persona in all_data["personas"].items():
+            self.profiler.count(f"generate_all_personas/persona:{persona_id}", self._record_count(persona))
+        self.profiler.count("generate_all_personas", sum(self._record_count(p) for p in all_data["personas"].values()))
+        return all_data
+
+    @staticmethod
+    def _record_count(persona: Dict[str, Any]) -> int:
+        return sum(len(records) for records in persona.values() if isinstance(records, list))
+
+    def _generate_all_personas(self) -> Dict[str, Any]:
         print("Generating synthetic data for all personas...")
         
         all_data = {
@@ -701,18 +721,24 @@ class PersonaDataGenerator:
         
         for persona_id, generator_func in personas:
             print(f"Generating data for {persona_id}...")
-            all_data["personas"][persona_id] = generator_func()
+            with self.profiler.stage(f"persona:{persona_id}"):
+                all_data["personas"][persona_id] = generator_func()
         
         return all_data
     
     def save_data(self, data: Dict[str, Any], filename: str = "synthetic_patient_data.json"):
         """Save generated data to JSON file"""
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"Data saved to {filename}")
-        
-        # Also save summary statistics
-        self.generate_summary_stats(data, filename.replace('.json', '_summary.json'))
+        with self.profiler.stage("save_data"):
+            with self.profiler.stage("json_dump"):
+                with open(filename, 'w') as f:
+                    json.dump(data, f, indent=2)
+            print(f"Data saved to {filename}")
+            
+            # Also save summary statistics
+            with self.profiler.stage("summary_stats"):
+                self.generate_summary_stats(data, filename.replace('.json', '_summary.json'))
+        if "personas" in data:
+            self.profiler.count("save_data", sum(self._record_count(p) for p in data["personas"].values()))
     
     def generate_summary_stats(self, data: Dict[str, Any], filename: str):
         """Generate summary statistics for the dataset"""
@@ -720,6 +746,7 @@ class PersonaDataGenerator:
             "dataset_info": data["generation_info"],
             "persona_summaries": {}
         }
+        month_values: Dict[tuple, List[float]] = {}
         
         for persona_id, persona_data in data["personas"].items():
             persona_summary = {
@@ -754,22 +781,51 @@ class PersonaDataGenerator:
                 }
             
             summary["persona_summaries"][persona_id] = persona_summary
+
+            # One sketch per persona, month and biomarker, merged below like per-shard sketches
+            for stream, columns in SKETCH_COLUMNS.items():
+                for record in persona_data[stream]:
+                    for column in columns:
+                        key = (column, persona_data["persona_type"], record["date"][:7])
+                        month_values.setdefault(key, []).append(record[column])
+        distributions: Dict[str, Dict[str, Dict[str, KLLSketch]]] = {}
+        for (column, persona_type, month), values in sorted(month_values.items()):
+            sketch = KLLSketch(seed=sketch_seed(column, persona_type, month)).update(values)
+            groups = distributions.setdefault(column, {"by_persona_type": {}, "by_month": {}})
+            for by, label in (("by_persona_type", persona_type), ("by_month", month)):
+                groups[by].setdefault(label, KLLSketch(seed=sketch_seed(column, label))).merge(sketch)
+        summary["distributions"] = {
+            column: {by: {label: sketch.summary() for label, sketch in merged.items()} for by, merged in groups.items()}
+            for column, groups in distributions.items()
+        }
         
         with open(filename, 'w') as f:
             json.dump(summary, f, indent=2)
         print(f"Summary statistics saved to {filename}")
 
-if __name__ == "__main__":
-    generator = PersonaDataGenerator(start_date="2024-01-01")
+def main(output: str = "data/synthetic_patient_data.json",
+         rollups_output: Optional[str] = "data/synthetic_patient_rollups.npz", profiler=None):
+    """Generate all personas, save the records, summary and (optionally) rollups"""
+    # GENERATION_PROFILE=1 records per-stage timings and allocation peaks
+    generator = PersonaDataGenerator(start_date="2024-01-01", profiler=profiler or profiler_from_env())
     all_data = generator.generate_all_personas()
-    generator.save_data(all_data, "data/synthetic_patient_data.json")
-    
+    generator.save_data(all_data, output)
+    if generator.profiler.enabled:
+        generator.profiler.print_report()
+        generator.profiler.save_report("data/synthetic_generation_profile.json")
+
+    # Materialize daily/weekly/monthly rollups alongside the raw records
+    if rollups_output:
+        rollups = RollupStore.build(CompactCohort.from_dataset(all_data))
+        rollups.save(rollups_output)
+        print(f"Rollups saved to {rollups_output}")
+
     print("\n" + "="*50)
     print("SYNTHETIC DATA GENERATION COMPLETE")
     print("="*50)
     print(f"Generated 180 days of data for 4 personas")
     print(f"Total records generated:")
-    
+
     total_records = 0
     for persona_id, persona_data in all_data["personas"].items():
         persona_total = (len(persona_data["apple_watch"]) + 
@@ -779,8 +835,14 @@ if __name__ == "__main__":
                         len(persona_data["sobriety"]))
         print(f"  {persona_data['persona']}: {persona_total:,} records")
         total_records += persona_total
-    
+
     print(f"\nGrand Total: {total_records:,} synthetic data points")
     print("Files created:")
-    print("  - data/synthetic_patient_data.json (full dataset)")
-    print("  - data/synthetic_patient_data_summary.json (summary statistics)") 
\ No newline at end of file
+    print(f"  - {output} (full dataset)")
+    print(f"  - {output.replace('.json', '_summary.json')} (summary statistics)")
+    if rollups_output:
+        print(f"  - {rollups_output} (daily/weekly/monthly rollups)")
+
+
+if __name__ == "__main__":
+    main()
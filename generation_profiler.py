@@ -0,0 +1,158 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict
+from typing import Dict, List, Any, Optional
+
+
+class NullProfiler:
+    """Default profiler: same API as StageProfiler, no measurement"""
+
+    enabled = False
+
+    def stage(self, name: str, records: int = 0):
+        return nullcontext()
+
+    def span(self, name: str):
+        return nullcontext()
+
+    def count(self, name: str, records: int):
+        pass
+
+    def make(self, cls, **fields):
+        return cls(**fields)
+
+    def asdict(self, obj) -> Dict[str, Any]:
+        return asdict(obj)
+
+
+class StageProfiler:
+    """Opt-in stage timing and allocation tracking for the data generators.
+
+    stage() is for coarse phases (whole run, one persona, saving): it records
+    wall time with perf_counter_ns and, when trace_memory is on, how far the
+    tracemalloc peak inside the stage rose above the memory already traced on
+    entry, so a stage is not charged for what earlier stages still hold. span() is for hot per-record operations
+    (dataclass construction, asdict, series generation): time and call counts
+    only, aggregated per name under the enclosing stage.
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._stack: List[Dict[str, Any]] = []
+
+    def _entry(self, path: str, kind: str = "span") -> Dict[str, Any]:
+        return self.stats.setdefault(path, {"kind": kind, "calls": 0, "total_ns": 0, "child_ns": 0,
+                                            "peak_bytes": 0, "records": 0})
+
+    def _path(self, name: str) -> str:
+        return "/".join([frame["path"] for frame in self._stack[-1:]] + [name])
+
+    @contextmanager
+    def stage(self, name: str, records: int = 0):
+        path = self._path(name)
+        entry = self._entry(path, "stage")
+        started_tracing, baseline = False, 0
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            # Keep the parent's peak before resetting so nested stages do not hide it
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        frame = {"path": path, "peak": 0}
+        self._stack.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self._stack.pop()
+            entry["calls"] += 1
+            entry["total_ns"] += elapsed
+            entry["records"] += records
+            if self._stack:
+                self._entry(self._stack[-1]["path"])["child_ns"] += elapsed
+            if self.trace_memory:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                entry["peak_bytes"] = max(entry["peak_bytes"], peak - baseline)
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+
+    @contextmanager
+    def span(self, name: str):
+        path = self._path(name)
+        start = time.perf_counter_ns()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            entry = self._entry(path)
+            entry["calls"] += 1
+            entry["total_ns"] += elapsed
+            if self._stack:
+                self._entry(self._stack[-1]["path"])["child_ns"] += elapsed
+
+    def count(self, name: str, records: int):
+        """Attach a record count to a stage or span under the current stage"""
+        self._entry(self._path(name))["records"] += records
+
+    def make(self, cls, **fields):
+        """Construct a record dataclass, timing only the constructor"""
+        with self.span(f"construct:{cls.__name__}"):
+            return cls(**fields)
+
+    def asdict(self, obj) -> Dict[str, Any]:
+        with self.span("asdict"):
+            return asdict(obj)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """One row per stage/span path, in the order they were first entered"""
+        rows = []
+        for path, entry in self.stats.items():
+            total_s = entry["total_ns"] / 1e9
+            rows.append({
+                "stage": path,
+                "kind": entry["kind"],
+                "calls": entry["calls"],
+                "total_ms": entry["total_ns"] / 1e6,
+                "self_ms": (entry["total_ns"] - entry["child_ns"]) / 1e6,
+                "peak_kb": entry["peak_bytes"] / 1024 if entry["kind"] == "stage" and self.trace_memory else None,
+                "records": entry["records"],
+                "records_per_s": entry["records"] / total_s if entry["records"] and total_s else None,
+            })
+        return rows
+
+    def save_report(self, filename: str = "data/generation_profile.json"):
+        """Dump the structured profile report to JSON"""
+        with open(filename, 'w') as f:
+            json.dump({"trace_memory": self.trace_memory, "stages": self.report()}, f, indent=2)
+        print(f"Generation profile saved to {filename}")
+
+    def print_report(self):
+        rows = self.report()
+        width = max([len(row["stage"]) for row in rows] + [5])
+        print(f"\n{'Stage':<{width}} {'Calls':>8} {'Total ms':>10} {'Self ms':>10} {'Peak KB':>10} {'Records':>8}")
+        print("-" * (width + 52))
+        for row in rows:
+            peak = f"{row['peak_kb']:.0f}" if row["peak_kb"] is not None else ""
+            print(f"{row['stage']:<{width}} {row['calls']:>8} {row['total_ms']:>10.1f} {row['self_ms']:>10.1f} "
+                  f"{peak:>10} {row['records'] or '':>8}")
+
+
+def profiler_from_env(environ: Optional[Dict[str, str]] = None):
+    """StageProfiler when GENERATION_PROFILE is set (GENERATION_PROFILE=time skips tracemalloc), else NullProfiler"""
+    import os
+
+    value = (environ if environ is not None else os.environ).get("GENERATION_PROFILE", "")
+    if not value or value == "0":
+        return NullProfiler()
+    return StageProfiler(trace_memory=value != "time")
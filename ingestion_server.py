@@ -0,0 +1,335 @@
+import asyncio
+import json
+import math
+import re
+import time
+from collections import deque
+from dataclasses import fields
+from datetime import date
+from typing import Dict, List, Any, Optional, Tuple, get_type_hints
+
+import numpy as np
+
+from compact_dataset import INVALID_MINUTE, STREAM_COLUMNS, _minute_of_day
+from generate_realistic_data import AppleWatchData, PHQ5Response, MoodDiaryEntry, ChatInteraction, SobrietyData
+from load_replay import read_headers, encode_response
+from dedup import DeduplicatingStore
+from log_store import LogStore
+
+# Record shape accepted for each stream: the generator dataclasses
+RECORD_TYPES = {
+    "apple_watch": AppleWatchData,
+    "phq5": PHQ5Response,
+    "mood_diary": MoodDiaryEntry,
+    "chat": ChatInteraction,
+    "sobriety": SobrietyData,
+}
+MAX_BODY_BYTES = 8 * 1024 * 1024
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")  # The only form the store's datetime64 parsing accepts
+
+
+def _schema(record_type) -> Dict[str, Any]:
+    hints = get_type_hints(record_type)
+    return {field.name: hints[field.name] for field in fields(record_type)}
+
+
+SCHEMAS = {stream: _schema(record_type) for stream, record_type in RECORD_TYPES.items()}
+
+
+def _type_error(value: Any, expected: Any) -> Optional[str]:
+    if expected is bool:
+        ok = isinstance(value, bool)
+    elif expected is int:
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif expected is float:
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif expected is str:
+        ok = isinstance(value, str)
+    else:  # List[str]
+        ok = isinstance(value, list) and all(isinstance(item, str) for item in value)
+    return None if ok else f"expected {getattr(expected, '__name__', str(expected))}, got {type(value).__name__}"
+
+
+def validate_record(stream: str, record: Any) -> List[str]:
+    """Problems with one record against its dataclass shape (empty list = valid)"""
+    schema = SCHEMAS.get(stream)
+    if schema is None:
+        return [f"unknown stream {stream!r}"]
+    if not isinstance(record, dict):
+        return ["record must be an object"]
+    errors = [f"missing field {name!r}" for name in schema if name not in record]
+    errors += [f"unknown field {name!r}" for name in record if name not in schema]
+    for name, expected in schema.items():
+        if name in record:
+            problem = _type_error(record[name], expected)
+            if problem:
+                errors.append(f"{name}: {problem}")
+    if not errors:
+        try:
+            if not DATE_PATTERN.fullmatch(record["date"]):
+                raise ValueError
+            date.fromisoformat(record["date"])
+        except ValueError:
+            errors.append(f"date: not YYYY-MM-DD ({record['date']!r})")
+        if stream == "chat" and _minute_of_day(record["time"]) == INVALID_MINUTE:
+            errors.append(f"time: not HH:MM ({record['time']!r})")
+        for name, dtype in STREAM_COLUMNS[stream].items():
+            # Integer columns are stored at fixed width; reject what would wrap instead of storing it
+            if np.dtype(dtype).kind == "i":
+                info = np.iinfo(dtype)
+                value = record[name]
+                if not (math.isfinite(value) and info.min <= round(value) <= info.max):
+                    errors.append(f"{name}: {value} outside {info.min}..{info.max}")
+    return errors
+
+
+def parse_batch(payload: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Rows (patient_id, stream, record) from a request body, plus validation errors.
+
+    Accepted bodies: a single event {"patient_id", "stream", "record"}, one
+    patient's batch of a stream {"patient_id", "stream", "records": [...]},
+    or a mixed batch {"events": [event, ...]}.
+    """
+    if not isinstance(payload, dict):
+        return [], ["body must be a JSON object"]
+    if "events" in payload:
+        events = payload["events"] if isinstance(payload["events"], list) else [None]
+    elif "records" in payload:
+        records = payload["records"] if isinstance(payload["records"], list) else [None]
+        events = [{"patient_id": payload.get("patient_id"), "stream": payload.get("stream"), "record": record}
+                  for record in records]
+    else:
+        events = [payload]
+
+    rows, errors = [], []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict) or not isinstance(event.get("patient_id"), str) or not event["patient_id"]:
+            errors.append(f"[{i}] patient_id must be a non-empty string")
+            continue
+        if not event["patient_id"].isprintable():
+            # Control and line-separator characters have no place in an id and break line-based tooling
+            errors.append(f"[{i}] patient_id contains control or line-separator characters")
+            continue
+        problems = validate_record(event.get("stream"), event.get("record"))
+        if problems:
+            errors.extend(f"[{i}] {problem}" for problem in problems)
+            continue
+        rows.append({"patient_id": event["patient_id"], "stream": event["stream"], "record": event["record"]})
+    return rows, errors
+
+
+class IngestionServer:
+    """Asyncio HTTP ingestion endpoint with bounded-queue backpressure and group commit.
+
+    Request handlers validate a batch and put it on a bounded queue, then wait
+    until it is durable before answering 202. A single committer task drains
+    the queue, coalescing everything that arrived within `max_delay` (up to
+    `max_group_rows` rows) into one storage append and fsync. When the queue
+    stays full for `enqueue_timeout` seconds the request is refused with 503
+    and Retry-After, pushing back on clients instead of buffering unboundedly.
+    If a group fails to commit, its requests are committed one at a time, and
+    only the requests that still fail are answered with 500. Row metrics
+    count what store.append_batch reports as stored, not what was received.
+
+    Routes: POST /ingest, GET /metrics, GET /health.
+    """
+
+    def __init__(self, store, host: str = "127.0.0.1", port: int = 8765, queue_size: int = 256,
+                 max_group_rows: int = 4096, max_delay: float = 0.005, enqueue_timeout: float = 0.5):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.max_group_rows = max_group_rows
+        self.max_delay = max_delay
+        self.enqueue_timeout = enqueue_timeout
+        self.counters = {"requests": 0, "accepted_rows": 0, "rejected_requests": 0,
+                         "throttled_requests": 0, "failed_requests": 0, "groups_committed": 0}
+        self.commit_ms: deque = deque(maxlen=1000)
+        self.group_rows: deque = deque(maxlen=1000)
+        self.recent: deque = deque(maxlen=10000)  # (commit time, rows) for the trailing-rate window
+        self.started_at = time.monotonic()
+        self._server = None
+        self._committer = None
+
+    async def start(self):
+        self.started_at = time.monotonic()
+        self._committer = asyncio.create_task(self._commit_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop accepting connections, commit everything already queued, close the store"""
+        self._server.close()
+        await self._server.wait_closed()
+        await self.queue.put(None)
+        await self._committer
+        self.store.close()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Ingesting on http://{self.host}:{self.port}/ingest (metrics at /metrics)")
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _commit_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            group = [item]
+            rows = len(item[0])
+            deadline = loop.time() + self.max_delay
+            while rows < self.max_group_rows:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+                rows += len(item[0])
+
+            batch = [row for request_rows, _ in group for row in request_rows]
+            start = time.perf_counter()
+            try:
+                # File I/O and fsync run off the event loop so handlers keep accepting
+                stored = await loop.run_in_executor(None, self.store.append_batch, batch)
+            except Exception:
+                # Commit request by request so one bad request cannot fail the rest of its group
+                stored = 0
+                for request_rows, done in group:
+                    try:
+                        stored += await loop.run_in_executor(None, self.store.append_batch, request_rows)
+                    except Exception as exc:
+                        self.counters["failed_requests"] += 1
+                        done.set_exception(exc)
+                    else:
+                        done.set_result(None)
+            else:
+                for _, done in group:
+                    done.set_result(None)
+            # Count rows the store actually kept; a deduplicating store drops retried ones
+            self.commit_ms.append((time.perf_counter() - start) * 1000)
+            self.group_rows.append(stored)
+            self.recent.append((time.monotonic(), stored))
+            self.counters["groups_committed"] += 1
+            self.counters["accepted_rows"] += stored
+
+    async def _ingest(self, body: bytes) -> Tuple[int, str, Dict[str, Any]]:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self.counters["rejected_requests"] += 1
+            return 400, "Bad Request", {"error": "invalid JSON"}
+        rows, errors = parse_batch(payload)
+        if errors:
+            self.counters["rejected_requests"] += 1
+            return 422, "Unprocessable Entity", {"errors": errors[:50]}
+        done = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.queue.put((rows, done)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["throttled_requests"] += 1
+            return 503, "Service Unavailable", {"error": "ingest queue full"}
+        try:
+            await done
+        except Exception as exc:
+            return 500, "Internal Server Error", {"error": f"storage failed: {type(exc).__name__}: {exc}"}
+        return 202, "Accepted", {"accepted": len(rows)}
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        uptime = now - self.started_at
+        window_rows = sum(rows for at, rows in self.recent if now - at <= 10)
+        commit_ms = sorted(self.commit_ms)
+        return {
+            **self.counters,
+            "uptime_s": uptime,
+            "rows_per_s": self.counters["accepted_rows"] / uptime if uptime > 0 else 0.0,
+            "rows_per_s_10s": window_rows / min(10, uptime) if uptime > 0 else 0.0,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "mean_group_rows": sum(self.group_rows) / len(self.group_rows) if self.group_rows else 0.0,
+            "commit_ms_p50": commit_ms[len(commit_ms) // 2] if commit_ms else None,
+            "commit_ms_p99": commit_ms[int(len(commit_ms) * 0.99)] if commit_ms else None,
+            "storage": self.store.stats() if hasattr(self.store, "stats") else {},
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line, headers = await read_headers(reader)
+                method, path = request_line.split()[:2]
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    writer.write(encode_response(413, "Payload Too Large", b"", keep_alive=False))
+                    break
+                body = await reader.readexactly(length)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.counters["requests"] += 1
+
+                if method == "POST" and path == "/ingest":
+                    status, reason, result = await self._ingest(body)
+                elif method == "GET" and path == "/metrics":
+                    status, reason, result = 200, "OK", self.metrics()
+                elif method == "GET" and path == "/health":
+                    status, reason, result = 200, "OK", {"status": "ok"}
+                else:
+                    status, reason, result = 404, "Not Found", {"error": f"no route for {method} {path}"}
+                response = encode_response(status, reason, json.dumps(result).encode(), keep_alive)
+                if status == 503:
+                    response = response.replace(b"\r\n\r\n", b"\r\nRetry-After: 1\r\n\r\n", 1)
+                writer.write(response)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def main(store_root: str = "data/ingest", host: str = "127.0.0.1", port: int = 8765):
+    log = LogStore(store_root)
+    log.start_compaction()
+    server = IngestionServer(DeduplicatingStore(log), host, port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    import tempfile
+    from load_replay import replay_file
+
+    async def demo():
+        # Replay the realistic dataset through the real server instead of the stub
+        with tempfile.TemporaryDirectory() as tmp:
+            server = IngestionServer(DeduplicatingStore(LogStore(tmp)), port=0)
+            await server.start()
+            report = await replay_file('data/realistic_patient_data.json', f"http://127.0.0.1:{server.port}/ingest",
+                                       concurrency=64)
+            # A client retrying its first 500 uploads is acknowledged without storing anything twice
+            await replay_file('data/realistic_patient_data.json', f"http://127.0.0.1:{server.port}/ingest", limit=500)
+            metrics = server.metrics()
+            await server.stop()
+            stored = LogStore(tmp).recent("sarah_chen", days=7)
+        return report, metrics, stored
+
+    report, metrics, stored = asyncio.run(demo())
+    print(f"Replayed {report['sent']:,} events at {report['throughput_per_s']:,.0f}/s, "
+          f"p50 {report['latency_ms']['p50']:.2f} ms p99 {report['latency_ms']['p99']:.2f} ms, "
+          f"statuses {report['statuses']}")
+    print(f"Server: {metrics['accepted_rows']:,} rows in {metrics['groups_committed']:,} group commits "
+          f"(mean {metrics['mean_group_rows']:.1f} rows, fsync p50 {metrics['commit_ms_p50']:.2f} ms)")
+    print(f"Dedup: {metrics['storage']['duplicates']:,} retried records dropped, "
+          f"{metrics['storage']['index_lookups']:,} index lookups after Bloom hits")
+    print(f"Read back from the log store, Sarah Chen's last 7 days: "
+          f"{ {stream: len(records) for stream, records in stored.items()} }")
@@ -0,0 +1,332 @@
+import heapq
+import random
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from compact_dataset import STREAMS, STREAM_COLUMNS
+from event_stream import Event
+from relapse_training import FEATURES, MISSING_INDICATORS
+
+# Sync delay per stream: log-normal around a median, plus occasional multi-day offline spells
+# after which everything recorded meanwhile arrives at once
+LAG_PROFILES = {
+    "apple_watch": {"median_hours": 6.0, "sigma": 1.0, "offline_prob": 0.03, "offline_days": (1, 5)},
+    "sobriety": {"median_hours": 1.0, "sigma": 0.8, "offline_prob": 0.01, "offline_days": (1, 3)},
+    "phq5": {"median_hours": 2.0, "sigma": 1.0, "offline_prob": 0.0, "offline_days": (0, 0)},
+    "mood_diary": {"median_hours": 0.5, "sigma": 1.2, "offline_prob": 0.02, "offline_days": (1, 3)},
+    "chat": {"median_hours": 0.01, "sigma": 0.5, "offline_prob": 0.0, "offline_days": (0, 0)},
+}
+WEEK_DAYS = 7
+
+
+class Arrival(NamedTuple):
+    arrival: datetime
+    event: Event
+
+
+def delay_events(events: Iterable[Event], profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 seed: int = 42) -> Iterator[Arrival]:
+    """Re-order a chronological event stream into the order a server would receive it.
+
+    Each event is held in a heap until its sampled arrival time has passed in
+    event time, so only in-flight events are buffered.
+    """
+    profiles = profiles or LAG_PROFILES
+    rng = random.Random(seed)
+    offline_until: Dict[Tuple[str, str], datetime] = {}
+    pending: List[Tuple[datetime, int, Event]] = []
+    for sequence, event in enumerate(events):
+        while pending and pending[0][0] <= event.timestamp:
+            arrival, _, delayed = heapq.heappop(pending)
+            yield Arrival(arrival, delayed)
+
+        profile = profiles.get(event.stream, {"median_hours": 0.0, "sigma": 0.0})
+        lag = timedelta(hours=profile["median_hours"] * rng.lognormvariate(0, profile["sigma"]))
+        device = (event.patient_id, event.stream)
+        if device not in offline_until and rng.random() < profile.get("offline_prob", 0.0):
+            offline_until[device] = event.timestamp + timedelta(days=rng.randint(*profile["offline_days"]))
+        arrival = event.timestamp + lag
+        if device in offline_until:
+            if event.timestamp < offline_until[device]:
+                arrival = offline_until[device] + lag
+            else:
+                del offline_until[device]
+        heapq.heappush(pending, (arrival, sequence, event))
+    while pending:
+        arrival, _, delayed = heapq.heappop(pending)
+        yield Arrival(arrival, delayed)
+
+
+class WatermarkAggregator:
+    """Incremental daily/weekly rollups and relapse risk over out-of-order arrivals.
+
+    Sums and counts live in dense patient x day (and patient x week) grids, so
+    a batch of records only touches its own cells. The watermark trails the
+    latest event time seen by `allowed_lateness`. A day is closed (and its
+    risk scored for every patient) once the watermark passes its end. A
+    patient first seen after some days closed is scored for those days when
+    they join. A record for an already closed day is late. It still updates the rollups,
+    and the risk is rescored for just the affected patient-days: that day,
+    plus the following days that forward-fill the PHQ-5 score for a late
+    PHQ-5.
+
+    score takes the relapse_training design matrix (FEATURE_NAMES columns) and
+    returns a risk per row.
+    """
+
+    def __init__(self, start_date: str, score: Callable[[np.ndarray], np.ndarray],
+                 allowed_lateness: timedelta = timedelta(days=1), n_patients: int = 64, n_days: int = 64):
+        self.start_date = start_date
+        self.start = datetime.fromisoformat(start_date)
+        self.score = score
+        self.allowed_lateness = allowed_lateness
+        self.patient_ids: List[str] = []
+        self.patient_index: Dict[str, int] = {}
+        self.n_days = 0             # Days seen so far (grid columns in use)
+        self.max_event_time: Optional[datetime] = None
+        self.closed_days = 0        # Days 0..closed_days-1 are closed
+        self.counters = {"records": 0, "late_records": 0, "risk_cells_scored": 0, "late_risk_updates": 0}
+        self.daily: Dict[str, Dict[str, np.ndarray]] = {}
+        self.weekly: Dict[str, Dict[str, np.ndarray]] = {}
+        self.risk = np.zeros((0, 0), dtype=np.float32)
+        self._allocate(n_patients, n_days)
+
+    # Grids
+
+    def _allocate(self, n_patients: int, n_days: int):
+        """(Re)allocate every grid to at least the given shape, keeping existing cells"""
+        n_weeks = -(-n_days // WEEK_DAYS)
+        for grids, width in ((self.daily, n_days), (self.weekly, n_weeks)):
+            for stream in STREAMS:
+                old = grids.get(stream, {})
+                new = {"count": np.zeros((n_patients, width), dtype=np.int64)}
+                new.update({f"{name}_sum": np.zeros((n_patients, width)) for name in STREAM_COLUMNS[stream]})
+                for name, values in old.items():
+                    new[name][:values.shape[0], :values.shape[1]] = values
+                grids[stream] = new
+        risk = np.full((n_patients, n_days), np.nan, dtype=np.float32)
+        risk[:self.risk.shape[0], :self.risk.shape[1]] = self.risk
+        self.risk = risk
+
+    def _ensure(self, n_patients: int, n_days: int):
+        capacity_patients, capacity_days = self.risk.shape
+        if n_patients > capacity_patients or n_days > capacity_days:
+            self._allocate(max(n_patients, 2 * capacity_patients), max(n_days, 2 * capacity_days))
+
+    def _patient_code(self, patient_id: str) -> int:
+        if patient_id not in self.patient_index:
+            self.patient_index[patient_id] = len(self.patient_ids)
+            self.patient_ids.append(patient_id)
+        return self.patient_index[patient_id]
+
+    def _day(self, timestamp: datetime) -> int:
+        return (timestamp - self.start).days
+
+    # Ingest
+
+    def ingest(self, events: List[Event]) -> Dict[str, int]:
+        """Apply a batch of arrivals; returns what changed"""
+        if not events:
+            return {"records": 0, "late_records": 0, "late_cells": 0, "newly_closed_days": 0}
+        by_stream: Dict[str, List[Event]] = {}
+        for event in events:
+            by_stream.setdefault(event.stream, []).append(event)
+            if self.max_event_time is None or event.timestamp > self.max_event_time:
+                self.max_event_time = event.timestamp
+        known = len(self.patient_ids)
+        codes = {event.patient_id: self._patient_code(event.patient_id) for event in events}
+        days_needed = max(self._day(event.timestamp) for event in events) + 1
+        self._ensure(len(self.patient_ids), days_needed)
+        self.n_days = max(self.n_days, days_needed)
+
+        late_cells: List[Tuple[np.ndarray, np.ndarray]] = []
+        late_records = 0
+        for stream, stream_events in by_stream.items():
+            patient = np.array([codes[e.patient_id] for e in stream_events], dtype=np.int64)
+            day = np.array([self._day(e.timestamp) for e in stream_events], dtype=np.int64)
+            n = len(stream_events)
+            for grids, period in ((self.daily[stream], day), (self.weekly[stream], day // WEEK_DAYS)):
+                np.add.at(grids["count"], (patient, period), 1)
+                for name, dtype in STREAM_COLUMNS[stream].items():
+                    # Same dtype round trip as CompactCohort, so sums match RollupStore exactly
+                    values = np.fromiter((e.record[name] for e in stream_events), dtype=np.float64, count=n)
+                    values = (np.rint(values) if np.dtype(dtype).kind == "i" else values).astype(dtype)
+                    np.add.at(grids[f"{name}_sum"], (patient, period), values.astype(np.float64))
+
+            late = day < self.closed_days
+            late_records += int(late.sum())
+            if late.any():
+                late_cells.append(self._affected_cells(stream, patient[late], day[late]))
+
+        self.counters["records"] += len(events)
+        self.counters["late_records"] += late_records
+        n_late_cells = self._rescore(late_cells)
+        # Patients first seen now still need a score for the days that closed before they joined
+        self._score_days(0, self.closed_days, np.arange(known, len(self.patient_ids)))
+
+        previous = self.closed_days
+        watermark = self.max_event_time - self.allowed_lateness
+        self.closed_days = max(self.closed_days, min(self.n_days, self._day(watermark)))
+        self._score_days(previous, self.closed_days)
+        return {"records": len(events), "late_records": late_records, "late_cells": n_late_cells,
+                "newly_closed_days": self.closed_days - previous}
+
+    def flush(self) -> int:
+        """Close every day seen (end of stream); returns the number of days newly closed"""
+        previous = self.closed_days
+        self.closed_days = self.n_days
+        self._score_days(previous, self.closed_days)
+        return self.closed_days - previous
+
+    def _affected_cells(self, stream: str, patient: np.ndarray, day: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Closed patient-days whose features depend on late records at (patient, day)"""
+        if stream != "phq5":
+            return patient, day
+        # A PHQ-5 score is carried forward until the patient's next PHQ-5
+        present = self.daily["phq5"]["count"][:, :self.closed_days] > 0
+        cells_p, cells_d = [], []
+        for p, d in zip(patient.tolist(), day.tolist()):
+            later = np.flatnonzero(present[p, d + 1:])
+            stop = d + 1 + int(later[0]) if len(later) else self.closed_days
+            cells_p.append(np.full(stop - d, p))
+            cells_d.append(np.arange(d, stop))
+        return np.concatenate(cells_p), np.concatenate(cells_d)
+
+    def _rescore(self, cells: List[Tuple[np.ndarray, np.ndarray]]) -> int:
+        if not cells:
+            return 0
+        keys = np.unique(np.concatenate([p * self.risk.shape[1] + d for p, d in cells]))
+        patient, day = np.divmod(keys, self.risk.shape[1])
+        self.risk[patient, day] = self.score(self.features(patient, day))
+        self.counters["risk_cells_scored"] += len(keys)
+        self.counters["late_risk_updates"] += len(keys)
+        return len(keys)
+
+    def _score_days(self, first: int, stop: int, patients: Optional[np.ndarray] = None):
+        """Score days first..stop-1 for the given patients (default: everyone)"""
+        patients = np.arange(len(self.patient_ids)) if patients is None else patients
+        if stop <= first or not len(patients):
+            return
+        row, day = np.divmod(np.arange(len(patients) * (stop - first)), stop - first)
+        patient, day = patients[row], day + first
+        self.risk[patient, day] = self.score(self.features(patient, day))
+        self.counters["risk_cells_scored"] += len(patient)
+
+    # Features and outputs
+
+    def _daily_mean(self, stream: str, column: str, patient: np.ndarray, day: np.ndarray) -> np.ndarray:
+        grids = self.daily[stream]
+        count = grids["count"][patient, day]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, grids[f"{column}_sum"][patient, day] / count, np.nan)
+
+    def features(self, patient: np.ndarray, day: np.ndarray) -> np.ndarray:
+        """relapse_training design matrix for the given patient-days, built from the daily grids"""
+        columns = {}
+        for name in FEATURES:
+            stream, column = name.split(".", 1)
+            if stream == "phq5":
+                # Forward fill from the latest PHQ-5 on or before each day
+                rows, inverse = np.unique(patient, return_inverse=True)
+                present = self.daily["phq5"]["count"][rows, :self.n_days] > 0
+                last = np.maximum.accumulate(np.where(present, np.arange(self.n_days), -1), axis=1)
+                source = last[inverse.ravel(), day]
+                values = self._daily_mean(stream, column, patient, np.maximum(source, 0))
+                columns[name] = np.where(source >= 0, values, np.nan)
+            else:
+                columns[name] = self._daily_mean(stream, column.removesuffix("_mean"), patient, day)
+        X = np.column_stack([columns[name] for name in FEATURES])
+        missing = np.column_stack([np.isnan(columns[name]) for name in MISSING_INDICATORS])
+        return np.column_stack([np.nan_to_num(X, nan=0.0), missing]).astype(np.float32)
+
+    def table(self, resolution: str, stream: str) -> Dict[str, np.ndarray]:
+        """Rollups in RollupStore.table() layout (only cells with data)"""
+        grids = self.daily[stream] if resolution == "daily" else self.weekly[stream]
+        width = self.n_days if resolution == "daily" else -(-self.n_days // WEEK_DAYS)
+        count = grids["count"][:len(self.patient_ids), :width]
+        patient, period = np.nonzero(count)
+        result = {"patient": patient.astype(np.int32), "period": period.astype(np.int32), "count": count[patient, period]}
+        for name in STREAM_COLUMNS[stream]:
+            result[f"{name}_sum"] = grids[f"{name}_sum"][patient, period]
+            result[f"{name}_mean"] = result[f"{name}_sum"] / result["count"]
+        return result
+
+    def risk_grid(self) -> np.ndarray:
+        """Relapse risk for every patient and closed day (NaN for days still open)"""
+        return self.risk[:len(self.patient_ids), :self.closed_days]
+
+
+def fit_risk_model(cohort, epochs: int = 5, seed: int = 0) -> Callable[[np.ndarray], np.ndarray]:
+    """Train the relapse_training model on a complete cohort and return its scoring function"""
+    from relapse_training import chunk_features, StreamingScaler, MiniBatchLogisticRegression, FEATURE_NAMES
+
+    X, y = chunk_features(cohort)
+    scaler = StreamingScaler(len(FEATURE_NAMES))
+    scaler.partial_fit(X)
+    model = MiniBatchLogisticRegression(len(FEATURE_NAMES))
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        order = rng.permutation(len(X))
+        for start in range(0, len(X), 256):
+            rows = order[start:start + 256]
+            model.partial_fit(scaler.transform(X[rows]), y[rows])
+    return lambda features: model.predict_proba(scaler.transform(features))
+
+
+if __name__ == "__main__":
+    import json
+    import time
+    from compact_dataset import CompactCohort
+    from event_stream import event_stream
+    from feature_matrix import FeatureJoiner
+    from relapse_training import FEATURE_NAMES
+    from rollups import RollupStore
+
+    with open('data/realistic_patient_data.json', 'r') as f:
+        data = json.load(f)
+    cohort = CompactCohort.from_dataset(data)
+    score = fit_risk_model(cohort)
+
+    arrivals = list(delay_events(event_stream(data)))
+    lags = np.array([(a.arrival - a.event.timestamp).total_seconds() / 3600 for a in arrivals
+                     if a.event.stream == "apple_watch"])
+    out_of_order = sum(1 for prev, cur in zip(arrivals, arrivals[1:]) if cur.event.timestamp < prev.event.timestamp)
+    print(f"Simulated {len(arrivals):,} arrivals, {out_of_order:,} out of event-time order; "
+          f"Apple Watch sync lag median {np.median(lags):.1f} h, p99 {np.percentile(lags, 99):.0f} h")
+
+    # Micro-batches of one hour of arrivals
+    aggregator = WatermarkAggregator(data["generation_info"]["start_date"], score)
+    start, batch, batch_end = time.perf_counter(), [], None
+    for arrival in arrivals:
+        if batch_end is not None and arrival.arrival >= batch_end:
+            aggregator.ingest(batch)
+            batch = []
+        if not batch:
+            batch_end = arrival.arrival + timedelta(hours=1)
+        batch.append(arrival.event)
+    aggregator.ingest(batch)
+    aggregator.flush()
+    incremental = time.perf_counter() - start
+    counters = aggregator.counters
+    print(f"Incremental: {counters['records']:,} records, {counters['late_records']:,} late, "
+          f"{counters['late_risk_updates']:,} patient-days rescored for late data, "
+          f"{counters['risk_cells_scored']:,} risk scores in total ({incremental:.2f} s)")
+
+    # Same answers as reprocessing everything at the end
+    rollups = RollupStore.build(cohort)
+    codes = np.array([aggregator.patient_index[p] for p in cohort.patient_ids])
+    for resolution in ("daily", "weekly"):
+        for stream in STREAMS:
+            expected, actual = rollups.table(resolution, stream), aggregator.table(resolution, stream)
+            order_e = np.lexsort((expected["period"], codes[expected["patient"]]))
+            order_a = np.lexsort((actual["period"], actual["patient"]))
+            assert all(np.allclose(expected[name][order_e], actual[name][order_a]) for name in expected
+                       if name not in ("patient",))
+    features = FeatureJoiner.join(cohort)
+    X = features.matrix(FEATURES)
+    missing = np.isnan(features.matrix(MISSING_INDICATORS))
+    full = score(np.column_stack([np.nan_to_num(X, nan=0.0), missing]).astype(np.float32))
+    full = full.reshape(len(cohort.patient_ids), features.n_days)
+    print(f"Daily/weekly rollups match a full rebuild; max risk difference vs full recompute: "
+          f"{np.abs(aggregator.risk_grid()[codes] - full).max():.2e} ({len(FEATURE_NAMES)} features)")
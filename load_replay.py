@@ -0,0 +1,252 @@
+import asyncio
+import json
+from collections import Counter
+from itertools import islice
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from event_stream import Event, event_stream
+
+DEFAULT_URL = "http://127.0.0.1:8765/ingest"
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+async def read_headers(reader: asyncio.StreamReader) -> Tuple[str, Dict[str, str]]:
+    """Read an HTTP/1.1 start line and headers (header names lower-cased)"""
+    start_line = (await reader.readline()).decode("latin-1").strip()
+    if not start_line:
+        raise ConnectionResetError("connection closed")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return start_line, headers
+
+
+def encode_response(status: int, reason: str, body: bytes = b"", keep_alive: bool = True) -> bytes:
+    return (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + body
+
+
+def encode_payload(event: Event) -> bytes:
+    return json.dumps({
+        "patient_id": event.patient_id,
+        "stream": event.stream,
+        "timestamp": event.timestamp.isoformat(),
+        "record": event.record,
+    }).encode()
+
+
+class ConnectionPool:
+    """Bounded pool of keep-alive connections to one host; at most `size` are open at once"""
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host = host
+        self.port = port
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.opened = 0
+
+    async def acquire(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        """A connection and whether it was reused (reused ones may have been closed by the server)"""
+        await self._slots.acquire()
+        if self._idle:
+            reader, writer = self._idle.pop()
+            return reader, writer, True
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, reusable: bool):
+        if reusable:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        self._slots.release()
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            await writer.wait_closed()
+
+
+async def post(pool: ConnectionPool, path: str, body: bytes) -> int:
+    """POST a JSON body over a pooled connection and return the status code.
+
+    A request that fails on a reused connection is retried once on a fresh
+    one, since the server may have closed an idle keep-alive connection.
+    A malformed status line or Content-Length raises ValueError and the
+    connection is discarded.
+    """
+    request = (f"POST {path} HTTP/1.1\r\nHost: {pool.host}:{pool.port}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n").encode("latin-1") + body
+    for attempt in range(2):
+        reader, writer, reused = await pool.acquire()
+        reusable = False
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line, headers = await read_headers(reader)
+            version, _, rest = status_line.partition(" ")
+            if not version.startswith("HTTP/"):
+                raise ValueError(f"malformed status line {status_line!r}")
+            status = int(rest.split(" ", 1)[0])
+            await reader.readexactly(int(headers.get("content-length", 0)))
+            reusable = headers.get("connection", "").lower() != "close"
+            return status
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if not reused or attempt:
+                raise
+        finally:
+            pool.release(reader, writer, reusable)
+
+
+def schedule(events: Iterable[Event], rate: Optional[float] = None,
+             compression: Optional[float] = None) -> Iterator[Tuple[float, Event]]:
+    """Pair each event with its send offset in seconds from the start of the replay.
+
+    With a compression factor, event time is replayed `compression` times
+    faster than recorded (86400 = one study day per second). A target rate
+    spaces sends at least 1/rate apart. Neither means as fast as the
+    concurrency allows.
+    """
+    first = None
+    for i, event in enumerate(events):
+        due = 0.0
+        if compression:
+            first = first or event.timestamp
+            due = (event.timestamp - first).total_seconds() / compression
+        if rate:
+            due = max(due, i / rate)
+        yield due, event
+
+
+async def replay(events: Iterable[Event], url: str = DEFAULT_URL, rate: Optional[float] = None,
+                 compression: Optional[float] = None, concurrency: int = 16) -> Dict[str, Any]:
+    """Post events to an ingestion endpoint on schedule and measure per-request latency"""
+    parts = urlsplit(url)
+    pool = ConnectionPool(parts.hostname, parts.port or 80, concurrency)
+    path = parts.path or "/"
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    latencies, lags, statuses, errors = [], [], Counter(), Counter()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def produce():
+        for due, event in schedule(events, rate, compression):
+            delay = start + due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await queue.put((due, encode_payload(event)))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def send():
+        while (item := await queue.get()) is not None:
+            due, body = item
+            sent = loop.time()
+            lags.append(sent - start - due)
+            try:
+                statuses[await post(pool, path, body)] += 1
+                latencies.append(loop.time() - sent)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                errors[type(exc).__name__] += 1
+
+    try:
+        await asyncio.gather(produce(), *(send() for _ in range(concurrency)))
+    finally:
+        await pool.close()
+    elapsed = loop.time() - start
+
+    latency_ms = np.array(latencies) * 1000
+    return {
+        "url": url,
+        "sent": len(lags),
+        "ok": sum(n for status, n in statuses.items() if status < 400),
+        "statuses": dict(statuses),
+        "errors": dict(errors),
+        "elapsed_s": elapsed,
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {f"p{p}": float(np.percentile(latency_ms, p)) if len(latency_ms) else None
+                       for p in LATENCY_PERCENTILES},
+        "max_schedule_lag_ms": max(lags) * 1000 if lags else 0.0,
+        "connections_opened": pool.opened,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print("\n" + "="*60)
+    print(f"LOAD REPLAY - {report['url']}")
+    print("="*60)
+    print(f"Sent {report['sent']:,} events in {report['elapsed_s']:.2f} s "
+          f"({report['throughput_per_s']:,.0f} events/s), {report['ok']:,} accepted")
+    print(f"Statuses: {report['statuses']}  Errors: {report['errors'] or 'none'}")
+    latency = "  ".join(f"{name} {value:.2f} ms" for name, value in report["latency_ms"].items() if value is not None)
+    print(f"Latency: {latency or 'n/a'}")
+    print(f"Max schedule lag: {report['max_schedule_lag_ms']:.1f} ms, "
+          f"connections opened: {report['connections_opened']}")
+
+
+async def start_stub_server(host: str = "127.0.0.1", port: int = 8765, delay: float = 0.0) -> asyncio.AbstractServer:
+    """Local endpoint that accepts every POST with 202 after an optional simulated delay"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                _, headers = await read_headers(reader)
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                if delay:
+                    await asyncio.sleep(delay)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(encode_response(202, "Accepted", b'{"status":"accepted"}', keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def replay_file(data_file: str, url: str = DEFAULT_URL, rate: Optional[float] = None,
+                      compression: Optional[float] = None, concurrency: int = 16, limit: Optional[int] = None,
+                      stub: bool = False) -> Dict[str, Any]:
+    """Replay a generated dataset, optionally against an in-process stub server at the same URL"""
+    with open(data_file, 'r') as f:
+        data = json.load(f)
+    events = islice(event_stream(data), limit)
+    server = None
+    if stub:
+        parts = urlsplit(url)
+        server = await start_stub_server(parts.hostname, parts.port or 80)
+    try:
+        return await replay(events, url, rate, compression, concurrency)
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+
+def main(data_file: str = 'data/realistic_patient_data.json', url: str = DEFAULT_URL, rate: Optional[float] = None,
+         compression: Optional[float] = None, concurrency: int = 16, limit: Optional[int] = None,
+         stub: bool = False) -> Dict[str, Any]:
+    report = asyncio.run(replay_file(data_file, url, rate, compression, concurrency, limit, stub))
+    print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    # Offline: the whole study replayed at 20 study days per second against the bundled stub
+    main(compression=20 * 86400, stub=True)
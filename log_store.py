@@ -0,0 +1,533 @@
+import json
+import os
+import shutil
+import threading
+import zlib
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+from compact_dataset import (CompactCohort, STREAMS, STREAM_COLUMNS, CATEGORICAL_COLUMNS, INVALID_MINUTE,
+                             encode_terms, encode_times, decode_mask)
+
+BLOCK_RECORDS = 128  # Granularity of the sparse index and of reads
+SEGMENT_BYTES = 16 * 1024 * 1024
+EPOCH = np.datetime64("1970-01-01", "D")
+PATIENTS_FILE = "patients.jsonl"  # One JSON string per line; escaping keeps every id on its own line
+CHECKPOINT_FILE = "index.npz"
+# Compacted extras: sorted rows that have one, offsets into the concatenated JSON bytes, the bytes
+EXTRA_ROWS, EXTRA_OFFSETS, EXTRA_DATA = "__extra_rows__", "__extra_offsets__", "__extra_data__"
+
+
+def record_dtype(stream: str) -> np.dtype:
+    """Fixed-width little-endian layout of one log record.
+
+    Variable-length parts (diary notes, terms outside the vocabularies) live
+    in the segment's .blob file and are referenced by offset and length.
+    """
+    fields = [("crc", "<u4"), ("patient", "<i4"), ("day", "<i4")]  # day: days since 1970-01-01
+    if stream == "chat":
+        fields.append(("minute_of_day", "<i2"))
+    fields += [(name, np.dtype(dtype).newbyteorder("<")) for name, dtype in STREAM_COLUMNS[stream].items()]
+    fields += [(name, "<u8") for name in CATEGORICAL_COLUMNS.get(stream, {})]
+    fields += [("extra_offset", "<u8"), ("extra_length", "<u4")]
+    return np.dtype(fields)
+
+
+RECORD_DTYPES = {stream: record_dtype(stream) for stream in STREAMS}
+
+
+def _crc(records: np.ndarray) -> np.ndarray:
+    """CRC32 of every record's bytes after the crc field"""
+    raw = records.view(np.uint8).reshape(len(records), records.dtype.itemsize)
+    return np.fromiter((zlib.crc32(row[4:].tobytes()) for row in raw), dtype=np.uint32, count=len(records))
+
+
+def _fsync_write(path: str, write):
+    """Write a file atomically: temporary file, fsync, rename"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class LogStore:
+    """Append-only segmented log of the five record types with a per-patient, per-day sparse index.
+
+    Each stream has its own sequence of segments holding fixed-width records,
+    so a segment is a flat array of one numpy structured dtype. Appends only
+    write to the end of the active segment. The index maps each patient to
+    (segment, block, first day, last day) entries, so a patient/date query
+    reads just the blocks that can contain matching rows.
+
+    The index is checkpointed when a segment rolls over and on close.
+    Recovery loads the checkpoint and re-scans only the records written
+    after it, validating CRCs and truncating a torn tail. Sealed segments
+    are compacted into a directory of .npy columns (CompactCohort column
+    layout), in the background if requested. Compacted columns are opened
+    with mmap_mode="r" once and sliced per block, so the sparse index
+    still bounds what a query reads. Block boundaries stay valid, so the
+    index is unaffected by compaction.
+    """
+
+    def __init__(self, root: str = "data/ingest", segment_bytes: int = SEGMENT_BYTES):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self._lock = threading.RLock()
+        self._handles: Dict[str, Tuple[Any, Any]] = {}
+        self._compacted: Dict[Tuple[str, int], Dict[str, np.ndarray]] = {}
+        self._compactor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        for stream in STREAMS:
+            os.makedirs(os.path.join(root, stream), exist_ok=True)
+        self.recovered_records = 0
+        self._load_patients()
+        self._recover()
+
+    # Files
+
+    def _path(self, stream: str, seq: int, ext: str) -> str:
+        return os.path.join(self.root, stream, f"{seq:08d}.{ext}")
+
+    def _load_patients(self):
+        path = os.path.join(self.root, PATIENTS_FILE)
+        lines = []
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                content = f.read()
+            complete = content[:content.rfind(b"\n") + 1]  # Drop a torn final line
+            if len(complete) != len(content):
+                with open(path, "r+b") as f:
+                    f.truncate(len(complete))
+            # Split on b"\n" only: splitlines() also breaks on \r, \x85, \u2028 and friends
+            lines = [json.loads(line) for line in complete.split(b"\n")[:-1]]
+        self.patient_ids: List[str] = lines
+        self.patient_index = {p: i for i, p in enumerate(lines)}
+        self._patients_file = open(path, "ab")
+
+    def _register(self, patient_ids: List[str]) -> np.ndarray:
+        """Patient codes, appending unseen ids to the registry"""
+        new = [p for p in dict.fromkeys(patient_ids) if p not in self.patient_index]
+        if new:
+            self._patients_file.write("".join(f"{json.dumps(p)}\n" for p in new).encode())
+            self._patients_file.flush()
+            os.fsync(self._patients_file.fileno())
+            for p in new:
+                self.patient_index[p] = len(self.patient_ids)
+                self.patient_ids.append(p)
+        return np.array([self.patient_index[p] for p in patient_ids], dtype=np.int32)
+
+    def _handle(self, stream: str):
+        if stream not in self._handles:
+            seq = self.segments[stream][-1]["seq"]
+            self._handles[stream] = (open(self._path(stream, seq, "log"), "ab"), open(self._path(stream, seq, "blob"), "ab"))
+        return self._handles[stream]
+
+    # Recovery and checkpoints
+
+    def _recover(self):
+        """Load the last checkpoint, then index records appended after it"""
+        self.segments: Dict[str, List[Dict[str, Any]]] = {}
+        self.index: Dict[str, Dict[int, List[List[int]]]] = {stream: {} for stream in STREAMS}
+        covered: Dict[Tuple[str, int], int] = {}
+        path = os.path.join(self.root, CHECKPOINT_FILE)
+        if os.path.exists(path):
+            with np.load(path) as archive:
+                entries = archive["entries"]
+                for stream_code, seq, records in archive["segments"]:
+                    covered[(STREAMS[stream_code], int(seq))] = int(records)
+            for stream_code, patient, seq, block, day_min, day_max in entries.tolist():
+                self.index[STREAMS[stream_code]].setdefault(patient, []).append([seq, block, day_min, day_max])
+
+        for stream in STREAMS:
+            directory = os.path.join(self.root, stream)
+            seqs = sorted({int(name.split(".")[0]) for name in os.listdir(directory) if name.endswith((".log", ".cols"))})
+            self.segments[stream] = []
+            for seq in seqs:
+                compacted = os.path.isdir(self._path(stream, seq, "cols"))
+                if compacted:
+                    records = len(self._compacted_columns(stream, seq)["patient"])
+                else:
+                    records = self._recover_segment(stream, seq, covered.get((stream, seq), 0))
+                self.segments[stream].append({"seq": seq, "records": records, "compacted": compacted})
+            if not self.segments[stream] or self.segments[stream][-1]["compacted"]:
+                self._new_segment(stream)
+
+    def _recover_segment(self, stream: str, seq: int, covered: int) -> int:
+        """Validate and index the records past the checkpoint; truncate at the first torn or corrupt record"""
+        dtype = RECORD_DTYPES[stream]
+        path = self._path(stream, seq, "log")
+        with open(path, "rb") as f:
+            f.seek(covered * dtype.itemsize)
+            tail = np.frombuffer(f.read(), dtype=np.uint8)
+        n = len(tail) // dtype.itemsize
+        records = tail[:n * dtype.itemsize].view(dtype)
+        bad = np.flatnonzero(_crc(records) != records["crc"])
+        valid = int(bad[0]) if len(bad) else n
+        if valid * dtype.itemsize != len(tail):
+            with open(path, "r+b") as f:
+                f.truncate((covered + valid) * dtype.itemsize)
+        self._index_records(stream, seq, covered, records["patient"][:valid], records["day"][:valid])
+        self.recovered_records += valid
+        return covered + valid
+
+    def checkpoint(self):
+        """Persist the index and the record count it covers for every segment"""
+        with self._lock:
+            entries = [(STREAMS.index(stream), patient, *entry)
+                       for stream in STREAMS for patient, blocks in self.index[stream].items() for entry in blocks]
+            segments = [(STREAMS.index(stream), s["seq"], s["records"]) for stream in STREAMS for s in self.segments[stream]]
+            arrays = {
+                "entries": np.array(entries, dtype=np.int64).reshape(-1, 6),
+                "segments": np.array(segments, dtype=np.int64).reshape(-1, 3),
+            }
+            _fsync_write(os.path.join(self.root, CHECKPOINT_FILE), lambda f: np.savez(f, **arrays))
+
+    def _new_segment(self, stream: str):
+        seq = self.segments[stream][-1]["seq"] + 1 if self.segments[stream] else 1
+        for ext in ("log", "blob"):
+            open(self._path(stream, seq, ext), "ab").close()
+        self.segments[stream].append({"seq": seq, "records": 0, "compacted": False})
+
+    def _index_records(self, stream: str, seq: int, first: int, patients: np.ndarray, days: np.ndarray):
+        """Extend the sparse index with records first.. of a segment"""
+        if len(patients) == 0:
+            return
+        blocks = (first + np.arange(len(patients))) // BLOCK_RECORDS
+        keys = patients.astype(np.int64) << 32 | blocks
+        unique, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        day_min = np.full(len(unique), np.iinfo(np.int64).max)
+        day_max = np.full(len(unique), np.iinfo(np.int64).min)
+        np.minimum.at(day_min, inverse, days)
+        np.maximum.at(day_max, inverse, days)
+        index = self.index[stream]
+        for key, lo, hi in zip(unique.tolist(), day_min.tolist(), day_max.tolist()):
+            patient, block = key >> 32, key & 0xFFFFFFFF
+            entries = index.setdefault(patient, [])
+            if entries and entries[-1][0] == seq and entries[-1][1] == block:
+                entries[-1][2] = min(entries[-1][2], lo)
+                entries[-1][3] = max(entries[-1][3], hi)
+            else:
+                entries.append([seq, block, lo, hi])
+
+    # Appends
+
+    def _encode(self, stream: str, records: List[Dict[str, Any]], patients: np.ndarray,
+                blob_offset: int) -> Tuple[np.ndarray, bytes]:
+        n = len(records)
+        encoded = np.zeros(n, dtype=RECORD_DTYPES[stream])
+        encoded["patient"] = patients
+        encoded["day"] = (np.array([r["date"] for r in records], dtype="datetime64[D]") - EPOCH).astype(np.int32)
+        if stream == "chat":
+            encoded["minute_of_day"] = encode_times([r["time"] for r in records])
+        for name, dtype in STREAM_COLUMNS[stream].items():
+            values = np.fromiter((r[name] for r in records), dtype=np.float64, count=n)
+            if np.dtype(dtype).kind == "i":
+                # Casting would silently wrap anything the column cannot hold
+                values = np.rint(values)
+                info = np.iinfo(dtype)
+                bad = ~((values >= info.min) & (values <= info.max))
+                if bad.any():
+                    raise ValueError(f"{stream}.{name}={values[bad][0]:g} does not fit {np.dtype(dtype).name}")
+            encoded[name] = values
+        extras: Dict[int, Dict[str, Any]] = {}
+        for name, vocab in CATEGORICAL_COLUMNS.get(stream, {}).items():
+            encoded[name], overflow = encode_terms([r[name] for r in records], vocab)
+            for row, terms in overflow.items():
+                extras.setdefault(row, {}).setdefault("overflow", {})[name] = terms
+        if stream == "mood_diary":
+            for row, record in enumerate(records):
+                if record.get("notes"):
+                    extras.setdefault(row, {})["notes"] = record["notes"]
+
+        blob = []
+        for row in sorted(extras):
+            data = json.dumps(extras[row]).encode()
+            encoded["extra_offset"][row] = blob_offset
+            encoded["extra_length"][row] = len(data)
+            blob.append(data)
+            blob_offset += len(data)
+        encoded["crc"] = _crc(encoded)
+        return encoded, b"".join(blob)
+
+    def append_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """Durably append validated rows ({"patient_id", "stream", "record"}); one fsync per touched file.
+
+        Returns the number of rows stored (all of them).
+        """
+        with self._lock:
+            patients = self._register([row["patient_id"] for row in rows])
+            by_stream: Dict[str, List[int]] = {}
+            for i, row in enumerate(rows):
+                by_stream.setdefault(row["stream"], []).append(i)
+
+            # Encode every stream before writing any, so a bad record leaves no partial append behind
+            written = []
+            for stream, positions in by_stream.items():
+                _, blob = self._handle(stream)
+                encoded, extra = self._encode(stream, [rows[i]["record"] for i in positions],
+                                              patients[positions], blob.tell())
+                written.append((stream, encoded, extra))
+            for stream, encoded, extra in written:
+                log, blob = self._handles[stream]
+                if extra:
+                    blob.write(extra)
+                log.write(encoded.tobytes())
+            for stream, _, _ in written:
+                for f in self._handles[stream]:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            rolled = False
+            for stream, encoded, _ in written:
+                segment = self.segments[stream][-1]
+                self._index_records(stream, segment["seq"], segment["records"], encoded["patient"], encoded["day"])
+                segment["records"] += len(encoded)
+                if segment["records"] * encoded.dtype.itemsize >= self.segment_bytes:
+                    for f in self._handles.pop(stream):
+                        f.close()
+                    self._new_segment(stream)
+                    rolled = True
+            if rolled:
+                self.checkpoint()
+            return len(rows)
+
+    # Reads
+
+    def _compacted_columns(self, stream: str, seq: int) -> Dict[str, np.ndarray]:
+        """A compacted segment's columns as read-only memmaps, opened once per store"""
+        key = (stream, seq)
+        if key not in self._compacted:
+            directory = self._path(stream, seq, "cols")
+            self._compacted[key] = {name[:-4]: np.load(os.path.join(directory, name), mmap_mode="r")
+                                    for name in os.listdir(directory) if name.endswith(".npy")}
+        return self._compacted[key]
+
+    def _read_rows(self, stream: str, segment: Dict[str, Any], first: int, last: int) -> Tuple[Dict[str, np.ndarray], Dict[int, Dict]]:
+        """Columns of records first..last-1 of a segment, plus their extras keyed by position"""
+        seq = segment["seq"]
+        if segment["compacted"]:
+            stored = self._compacted_columns(stream, seq)
+            columns = {name: values[first:last] for name, values in stored.items() if not name.startswith("__")}
+            rows, offsets, data = stored[EXTRA_ROWS], stored[EXTRA_OFFSETS], stored[EXTRA_DATA]
+            lo, hi = np.searchsorted(rows, [first, last])
+            extras = {int(rows[i]) - first: json.loads(data[offsets[i]:offsets[i + 1]].tobytes())
+                      for i in range(lo, hi)}
+            return columns, extras
+
+        dtype = RECORD_DTYPES[stream]
+        with open(self._path(stream, seq, "log"), "rb") as f:
+            records = np.frombuffer(os.pread(f.fileno(), (last - first) * dtype.itemsize, first * dtype.itemsize), dtype=dtype)
+        extras = {}
+        with_extras = np.flatnonzero(records["extra_length"])
+        if len(with_extras):
+            with open(self._path(stream, seq, "blob"), "rb") as f:
+                for row in with_extras:
+                    extras[int(row)] = json.loads(os.pread(f.fileno(), int(records["extra_length"][row]),
+                                                           int(records["extra_offset"][row])))
+        columns = {name: records[name] for name in dtype.names if name not in ("crc", "extra_offset", "extra_length")}
+        return columns, extras
+
+    @staticmethod
+    def _decode(stream: str, columns: Dict[str, np.ndarray], extras: Dict[int, Dict], rows: np.ndarray) -> List[Dict[str, Any]]:
+        dates = [str(d) for d in EPOCH + columns["day"][rows].astype(np.int64)]
+        records = []
+        for date, row in zip(dates, rows.tolist()):
+            record = {"date": date}
+            if stream == "chat":
+                minutes = int(columns["minute_of_day"][row])
+                record["time"] = f"{minutes // 60:02d}:{minutes % 60:02d}" if minutes != INVALID_MINUTE else None
+            for name in STREAM_COLUMNS[stream]:
+                record[name] = columns[name][row].item()
+            extra = extras.get(row, {})
+            for name, vocab in CATEGORICAL_COLUMNS.get(stream, {}).items():
+                record[name] = decode_mask(columns[name][row], vocab) + extra.get("overflow", {}).get(name, [])
+            if stream == "mood_diary":
+                record["notes"] = extra.get("notes", "")
+            records.append(record)
+        return records
+
+    def query(self, patient_id: str, stream: str, start_date: Optional[str] = None,
+              end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """One patient's records of a stream in an inclusive date range, reading only indexed blocks"""
+        code = self.patient_index.get(patient_id)
+        if code is None:
+            return []
+        lo = int((np.datetime64(start_date, "D") - EPOCH).astype(np.int64)) if start_date else -2**31
+        hi = int((np.datetime64(end_date, "D") - EPOCH).astype(np.int64)) if end_date else 2**31
+        results = []
+        self.last_blocks_read = 0
+        with self._lock:
+            segments = {s["seq"]: s for s in self.segments[stream]}
+            for seq, block, day_min, day_max in self.index[stream].get(code, []):
+                if day_max < lo or day_min > hi:
+                    continue
+                segment = segments[seq]
+                first = block * BLOCK_RECORDS
+                columns, extras = self._read_rows(stream, segment, first, min(first + BLOCK_RECORDS, segment["records"]))
+                rows = np.flatnonzero((columns["patient"] == code) & (columns["day"] >= lo) & (columns["day"] <= hi))
+                results.extend(self._decode(stream, columns, extras, rows))
+                self.last_blocks_read += 1
+        results.sort(key=lambda record: (record["date"], record.get("time") or ""))
+        return results
+
+    def recent(self, patient_id: str, days: int = 30, streams: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """The last `days` days of a patient (ending at their latest indexed record) for each stream"""
+        streams = streams or STREAMS
+        code = self.patient_index.get(patient_id)
+        latest = max((entry[3] for stream in streams for entry in self.index[stream].get(code, [])), default=None)
+        if latest is None:
+            return {stream: [] for stream in streams}
+        start = str(EPOCH + (latest - days + 1))
+        blocks = 0
+        result = {}
+        for stream in streams:
+            result[stream] = self.query(patient_id, stream, start_date=start)
+            blocks += self.last_blocks_read
+        self.last_blocks_read = blocks
+        return result
+
+    def n_blocks(self) -> int:
+        return sum(-(-s["records"] // BLOCK_RECORDS) for stream in STREAMS for s in self.segments[stream])
+
+    # Compaction
+
+    def _write_columns(self, stream: str, seq: int, columns: Dict[str, np.ndarray], extras: Dict[int, Dict]):
+        """Write a compacted segment as one .npy per column into a directory, renamed into place when complete"""
+        path = self._path(stream, seq, "cols")
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        rows = sorted(extras)
+        data = [json.dumps(extras[row]).encode() for row in rows]
+        arrays = {
+            **columns,
+            EXTRA_ROWS: np.array(rows, dtype=np.int64),
+            EXTRA_OFFSETS: np.cumsum([0] + [len(item) for item in data], dtype=np.int64),
+            EXTRA_DATA: np.frombuffer(b"".join(data), dtype=np.uint8),
+        }
+        for name, values in arrays.items():
+            _fsync_write(os.path.join(tmp, f"{name}.npy"), lambda f, values=values: np.save(f, values))
+        os.replace(tmp, path)
+
+    def compact(self) -> int:
+        """Rewrite every sealed, uncompacted segment as .npy columns and drop its log; returns segments compacted"""
+        compacted = 0
+        for stream in STREAMS:
+            with self._lock:
+                sealed = [s for s in self.segments[stream][:-1] if not s["compacted"]]
+            for segment in sealed:
+                columns, extras = self._read_rows(stream, segment, 0, segment["records"])
+                arrays = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+                for name, dtype in STREAM_COLUMNS[stream].items():
+                    arrays[name] = arrays[name].astype(dtype)
+                self._write_columns(stream, segment["seq"], arrays, extras)
+                with self._lock:
+                    segment["compacted"] = True
+                    for ext in ("log", "blob"):
+                        os.remove(self._path(stream, segment["seq"], ext))
+                compacted += 1
+        if compacted:
+            self.checkpoint()
+        return compacted
+
+    def start_compaction(self, interval: float = 30.0):
+        """Compact sealed segments from a background thread every `interval` seconds"""
+        def run():
+            while not self._stop.wait(interval):
+                self.compact()
+
+        self._stop.clear()
+        self._compactor = threading.Thread(target=run, name="log-compaction", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        if self._compactor is not None:
+            self._stop.set()
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            self.checkpoint()
+            for handles in self._handles.values():
+                for f in handles:
+                    f.close()
+            self._handles = {}
+            self._compacted = {}
+            self._patients_file.close()
+
+    # Export
+
+    def to_cohort(self, start_date: Optional[str] = None) -> CompactCohort:
+        """Everything stored so far as a CompactCohort (patient-major, chronological rows)"""
+        streams, overflow = {}, {}
+        with self._lock:
+            parts = {stream: [self._read_rows(stream, s, 0, s["records"]) for s in self.segments[stream] if s["records"]]
+                     for stream in STREAMS}
+        first_day = min((int(columns["day"].min()) for chunks in parts.values() for columns, _ in chunks), default=0)
+        start = np.datetime64(start_date, "D") if start_date else EPOCH + first_day
+        for stream, chunks in parts.items():
+            if not chunks:
+                streams[stream] = {}
+                continue
+            columns = {name: np.concatenate([c[name] for c, _ in chunks]) for name in chunks[0][0]}
+            offsets = np.cumsum([0] + [len(c["patient"]) for c, _ in chunks])
+            columns["day"] = (columns["day"] - int((start - EPOCH).astype(np.int64))).astype(np.int16)
+            order = np.lexsort((columns.get("minute_of_day", columns["day"]), columns["day"], columns["patient"]))
+            position = np.empty_like(order)
+            position[order] = np.arange(len(order))
+            streams[stream] = {name: values[order] for name, values in columns.items()}
+            for (_, extras), offset in zip(chunks, offsets):
+                for row, extra in extras.items():
+                    for name, terms in extra.get("overflow", {}).items():
+                        overflow.setdefault(f"{stream}.{name}", {})[int(position[offset + row])] = terms
+        return CompactCohort(str(start), list(self.patient_ids), list(self.patient_ids),
+                             ["unknown"] * len(self.patient_ids), streams, overflow)
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import time
+    from event_stream import event_stream
+
+    with open('data/realistic_patient_data.json', 'r') as f:
+        data = json.load(f)
+    events = [{"patient_id": e.patient_id, "stream": e.stream, "record": e.record} for e in event_stream(data)]
+
+    root = tempfile.mkdtemp()
+    try:
+        store = LogStore(root, segment_bytes=64 * 1024)
+        start = time.perf_counter()
+        for i in range(0, len(events), 50):
+            store.append_batch(events[i:i + 50])
+        elapsed = time.perf_counter() - start
+        print(f"Appended {len(events):,} records in {len(events) // 50 + 1} fsynced batches: "
+              f"{len(events) / elapsed:,.0f} records/s")
+
+        print(f"Compacted {store.compact()} sealed segments to memory-mapped .npy columns")
+        recent = store.recent("sarah_chen", days=30)
+        print(f"Sarah Chen, last 30 days: {sum(len(r) for r in recent.values())} records "
+              f"from {store.last_blocks_read} of {store.n_blocks()} blocks")
+        original = [r for r in data["personas"]["sarah_chen"]["mood_diary"] if r["date"] >= recent["mood_diary"][0]["date"]]
+        print(f"  diary round-trip matches: {[r['notes'] for r in original] == [r['notes'] for r in recent['mood_diary']]}")
+
+        # Crash: a torn half-record at the end of the active segment, no checkpoint
+        store.append_batch(events[:10])
+        log_path = store._path("apple_watch", store.segments["apple_watch"][-1]["seq"], "log")
+        with open(log_path, "ab") as f:
+            f.write(b"\x00" * (RECORD_DTYPES["apple_watch"].itemsize // 2))
+        del store  # No close(): the checkpoint does not cover the latest appends
+
+        start = time.perf_counter()
+        store = LogStore(root, segment_bytes=64 * 1024)
+        total = sum(s["records"] for stream in STREAMS for s in store.segments[stream])
+        print(f"Recovered in {(time.perf_counter() - start) * 1000:.1f} ms: {total:,} records "
+              f"({store.recovered_records:,} re-scanned past the checkpoint, torn tail truncated)")
+        cohort = store.to_cohort()
+        print(f"As CompactCohort: {cohort.n_patients} patients, "
+              f"{sum(len(c['patient']) for c in cohort.streams.values()):,} rows from {cohort.start_date}")
+        store.close()
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,197 @@
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from generate_realistic_data import (
+    DECAY_RATE, BASE_RISK, INITIAL_RISK, RELAPSE_MULTIPLIER, PERSONA_RISK_MODELS
+)
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+HIGH_RISK_THRESHOLD = 0.6
+
+
+def build_risk_model(persona_id: str, overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Combine the shared decay constants with a persona's regime model"""
+    model = {
+        "decay_rate": DECAY_RATE,
+        "base_risk": BASE_RISK,
+        "initial_risk": INITIAL_RISK,
+        "relapse_multiplier": RELAPSE_MULTIPLIER,
+        "min_sobriety_for_reset": 30,
+    }
+    model.update(PERSONA_RISK_MODELS[persona_id])
+    if overrides:
+        model.update(overrides)
+    return model
+
+
+def base_relapse_risk(days_sober: np.ndarray, model: Dict[str, float]) -> np.ndarray:
+    """Vectorized version of PersonaDataGenerator.calculate_base_relapse_risk"""
+    risk = model["base_risk"] + (model["initial_risk"] - model["base_risk"]) * np.exp(
+        -model["decay_rate"] * np.maximum(days_sober, 0))
+    risk = np.clip(risk, 0.05, 0.9)
+    return np.where(days_sober <= 0, 0.9, risk)
+
+
+def simulate_replicates(model: Dict[str, float], n_replicates: int, n_days: int, seed) -> Dict[str, np.ndarray]:
+    """Simulate replicate trajectories for one persona, vectorized across replicates.
+
+    Mirrors generate_regime_switching_series plus the relapse/reset logic of
+    generate_sarah_data, applied to every persona.
+    """
+    rng = np.random.default_rng(seed)
+    risk = np.empty((n_replicates, n_days), dtype=np.float32)
+    relapses = np.zeros((n_replicates, n_days), dtype=bool)
+    high_days = np.zeros(n_replicates, dtype=np.int32)
+
+    stress = np.zeros(n_replicates)
+    is_high = np.zeros(n_replicates, dtype=bool)
+    sobriety = np.full(n_replicates, model["initial_sobriety"], dtype=np.int64)
+
+    for t in range(n_days):
+        # Regime switching logic
+        u = rng.random(n_replicates)
+        was_high = is_high
+        is_high = np.where(was_high, u >= model["prob_exit_high"], u < model["prob_enter_high"])
+        high_days += is_high
+
+        noise = rng.standard_normal(n_replicates)
+        if t == 0:
+            normal_value = model["base_std"] * noise
+        else:
+            # AR(1) within regime
+            normal_value = 0.8 * stress + model["base_std"] * 0.5 * noise
+        entering = model["high_mean"] + model["high_std"] * noise
+        continuing = 0.9 * stress + 0.1 * model["high_mean"] + model["high_std"] * 0.3 * noise
+        high_value = entering if t == 0 else np.where(was_high, continuing, entering)
+        stress = np.where(is_high, high_value, normal_value)
+
+        sobriety += 1
+        current_risk = np.clip(base_relapse_risk(sobriety, model) + stress, 0.05, model["max_risk"])
+
+        # Check for relapse (very rare, based on risk)
+        relapsed = rng.random(n_replicates) < current_risk * model["relapse_multiplier"]
+        reset = relapsed & (sobriety > model["min_sobriety_for_reset"])
+        if reset.any():
+            sobriety[reset] = rng.integers(1, 8, size=int(reset.sum()))
+            current_risk = np.where(
+                reset,
+                np.clip(base_relapse_risk(sobriety, model) + stress, 0.05, model["max_risk"]),
+                current_risk)
+
+        risk[:, t] = current_risk
+        relapses[:, t] = relapsed
+
+    return {"risk": risk, "relapses": relapses, "final_sobriety": sobriety, "high_stress_days": high_days}
+
+
+def _simulate_chunk(args) -> Dict[str, np.ndarray]:
+    """Process pool entry point - unpack one chunk of replicates"""
+    model, n_replicates, n_days, seed = args
+    return simulate_replicates(model, n_replicates, n_days, seed)
+
+
+class MonteCarloSimulator:
+    """Estimate outcome distributions per persona from many replicate trajectories"""
+
+    def __init__(self, n_replicates: int = 5000, n_days: int = 180, random_seed: int = 42,
+                 n_workers: Optional[int] = None, chunk_size: int = 1000):
+        self.n_replicates = n_replicates
+        self.n_days = n_days
+        self.random_seed = random_seed
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def _chunks(self, persona_id: str, model: Dict[str, float]) -> List[tuple]:
+        """Split a persona's replicates into independently seeded chunks"""
+        seed_seq = np.random.SeedSequence([self.random_seed, sorted(PERSONA_RISK_MODELS).index(persona_id)])
+        sizes = [self.chunk_size] * (self.n_replicates // self.chunk_size)
+        if self.n_replicates % self.chunk_size:
+            sizes.append(self.n_replicates % self.chunk_size)
+        seeds = seed_seq.spawn(len(sizes))
+        return [(model, size, self.n_days, seed) for size, seed in zip(sizes, seeds)]
+
+    def summarize(self, chunks: List[Dict[str, np.ndarray]]) -> Dict[str, Any]:
+        """Reduce replicate chunks to outcome distributions and quantile bands"""
+        risk = np.concatenate([c["risk"] for c in chunks])
+        relapses = np.concatenate([c["relapses"] for c in chunks])
+        final_sobriety = np.concatenate([c["final_sobriety"] for c in chunks])
+        relapse_counts = relapses.sum(axis=1)
+        any_relapse = relapse_counts > 0
+        first_relapse_day = np.where(any_relapse, relapses.argmax(axis=1), -1)
+        high_risk_days = (risk > HIGH_RISK_THRESHOLD).sum(axis=1)
+
+        bands = np.quantile(risk, QUANTILES, axis=0)
+        return {
+            "n_replicates": int(risk.shape[0]),
+            "p_any_relapse": float(any_relapse.mean()),
+            "relapse_count_distribution": {
+                int(k): int(v) for k, v in zip(*np.unique(relapse_counts, return_counts=True))
+            },
+            "first_relapse_day_quantiles": (
+                dict(zip(map(str, QUANTILES), np.quantile(first_relapse_day[any_relapse], QUANTILES).tolist()))
+                if any_relapse.any() else {}
+            ),
+            "final_days_sober_quantiles": dict(zip(map(str, QUANTILES), np.quantile(final_sobriety, QUANTILES).tolist())),
+            "high_risk_days_quantiles": dict(zip(map(str, QUANTILES), np.quantile(high_risk_days, QUANTILES).tolist())),
+            "mean_risk": float(risk.mean()),
+            "risk_quantile_bands": {str(q): band.tolist() for q, band in zip(QUANTILES, bands)},
+        }
+
+    def simulate_persona(self, persona_id: str, overrides: Optional[Dict[str, float]] = None,
+                         executor: Optional[ProcessPoolExecutor] = None) -> Dict[str, Any]:
+        """Simulate one persona, optionally on an existing process pool"""
+        tasks = self._chunks(persona_id, build_risk_model(persona_id, overrides))
+        if executor is None:
+            chunks = [_simulate_chunk(task) for task in tasks]
+        else:
+            chunks = list(executor.map(_simulate_chunk, tasks))
+        return self.summarize(chunks)
+
+    def simulate_all_personas(self, overrides: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Simulate every persona, spreading replicate chunks across a process pool"""
+        results = {
+            "simulation_info": {
+                "n_replicates": self.n_replicates,
+                "n_days": self.n_days,
+                "random_seed": self.random_seed,
+                "quantiles": QUANTILES,
+                "overrides": overrides or {},
+            },
+            "personas": {}
+        }
+
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            # Submit every chunk up front so all personas share the pool
+            pending = {}
+            for persona_id in PERSONA_RISK_MODELS:
+                tasks = self._chunks(persona_id, build_risk_model(persona_id, overrides))
+                pending[persona_id] = [executor.submit(_simulate_chunk, task) for task in tasks]
+            for persona_id, futures in pending.items():
+                print(f"Simulating {self.n_replicates} trajectories for {persona_id}...")
+                results["personas"][persona_id] = self.summarize([f.result() for f in futures])
+
+        return results
+
+    def save_results(self, results: Dict[str, Any], filename: str = "data/monte_carlo_results.json"):
+        """Save simulation results to JSON file"""
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Monte Carlo results saved to {filename}")
+
+
+if __name__ == "__main__":
+    simulator = MonteCarloSimulator(n_replicates=5000, n_days=180)
+    results = simulator.simulate_all_personas()
+    simulator.save_results(results)
+
+    print("\n" + "="*60)
+    print("MONTE CARLO RELAPSE OUTCOMES - 180 DAYS")
+    print("="*60)
+    print(f"{'Persona':<20} {'P(relapse)':<12} {'Mean Risk':<12} {'Median High-Risk Days':<22}")
+    print("-" * 60)
+    for persona_id, summary in results["personas"].items():
+        print(f"{persona_id:<20} {summary['p_any_relapse']:<12.3f} {summary['mean_risk']:<12.3f} "
+              f"{summary['high_risk_days_quantiles']['0.5']:<22.0f}")
@@ -0,0 +1,172 @@
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from generate_realistic_data import PERSONA_RISK_MODELS
+from monte_carlo_simulation import MonteCarloSimulator
+
+# Constants clinicians can tune and their plausible ranges
+SWEEP_PARAMETERS = {
+    "decay_rate": (0.004, 0.016),
+    "base_risk": (0.04, 0.15),
+    "initial_risk": (0.6, 0.9),
+    "relapse_multiplier": (0.005, 0.02),
+    "prob_enter_high": (0.02, 0.15),
+    "prob_exit_high": (0.15, 0.5),
+}
+
+OUTCOME_METRICS = ["p_any_relapse", "mean_risk", "median_high_risk_days"]
+
+
+def grid_configs(grid: Dict[str, List[float]]) -> List[Dict[str, float]]:
+    """Expand a parameter grid into the full list of configurations"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def latin_hypercube_configs(bounds: Dict[str, Tuple[float, float]], n_samples: int,
+                            random_seed: int = 42) -> List[Dict[str, float]]:
+    """Draw a Latin-hypercube sample: one point per stratum along every parameter"""
+    rng = np.random.default_rng(random_seed)
+    names = sorted(bounds)
+    configs = [{} for _ in range(n_samples)]
+    for name in names:
+        low, high = bounds[name]
+        strata = (rng.permutation(n_samples) + rng.random(n_samples)) / n_samples
+        for config, u in zip(configs, strata):
+            config[name] = float(low + u * (high - low))
+    return configs
+
+
+def config_key(config: Dict[str, float], n_replicates: int, n_days: int, random_seed: int) -> str:
+    """Stable cache key for one configuration and simulation setup"""
+    payload = json.dumps({
+        "config": {k: round(float(v), 10) for k, v in sorted(config.items())},
+        "n_replicates": n_replicates,
+        "n_days": n_days,
+        "random_seed": random_seed,
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def evaluate_config(args) -> Dict[str, float]:
+    """Run the cohort simulation for one configuration (process pool entry point)"""
+    config, n_replicates, n_days, random_seed = args
+    simulator = MonteCarloSimulator(n_replicates=n_replicates, n_days=n_days,
+                                    random_seed=random_seed, chunk_size=n_replicates)
+    outcomes = {}
+    for persona_id in PERSONA_RISK_MODELS:
+        summary = simulator.simulate_persona(persona_id, overrides=config)
+        outcomes[f"p_any_relapse:{persona_id}"] = summary["p_any_relapse"]
+        outcomes[f"mean_risk:{persona_id}"] = summary["mean_risk"]
+        outcomes[f"median_high_risk_days:{persona_id}"] = summary["high_risk_days_quantiles"]["0.5"]
+
+    # Cohort-level outcomes weight every persona equally
+    for metric in OUTCOME_METRICS:
+        outcomes[metric] = float(np.mean([outcomes[f"{metric}:{p}"] for p in PERSONA_RISK_MODELS]))
+    return outcomes
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    """Average ranks (ties share a rank) for Spearman correlation"""
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return (sums / counts)[inverse]
+
+
+class ParameterSweep:
+    """Evaluate risk-model configurations across the cohort in parallel, with memoization"""
+
+    def __init__(self, n_replicates: int = 1000, n_days: int = 180, random_seed: int = 42,
+                 n_workers: Optional[int] = None, cache_dir: Optional[str] = "data/sweep_cache"):
+        self.n_replicates = n_replicates
+        self.n_days = n_days
+        self.random_seed = random_seed
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self._memo: Dict[str, Dict[str, float]] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cached(self, key: str) -> Optional[Dict[str, float]]:
+        """Look up a configuration in memory, then on disk"""
+        if key in self._memo:
+            return self._memo[key]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{key}.json")
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    self._memo[key] = json.load(f)
+                return self._memo[key]
+        return None
+
+    def _store(self, key: str, outcomes: Dict[str, float]):
+        """Memoize a configuration's outcomes"""
+        self._memo[key] = outcomes
+        if self.cache_dir:
+            with open(os.path.join(self.cache_dir, f"{key}.json"), 'w') as f:
+                json.dump(outcomes, f)
+
+    def run(self, configs: List[Dict[str, float]]) -> pd.DataFrame:
+        """Evaluate every configuration, skipping ones already memoized"""
+        keys = [config_key(c, self.n_replicates, self.n_days, self.random_seed) for c in configs]
+        missing = {}
+        for key, config in zip(keys, configs):
+            if self._cached(key) is None and key not in missing:
+                missing[key] = config
+
+        print(f"Sweep: {len(configs)} configurations, {len(configs) - len(missing)} cached, "
+              f"{len(missing)} to evaluate on {self.n_workers} workers...")
+        if missing:
+            tasks = [(config, self.n_replicates, self.n_days, self.random_seed) for config in missing.values()]
+            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+                for key, outcomes in zip(missing, executor.map(evaluate_config, tasks)):
+                    self._store(key, outcomes)
+
+        rows = [{**config, **self._cached(key)} for key, config in zip(keys, configs)]
+        return pd.DataFrame(rows)
+
+    def sensitivity_table(self, results: pd.DataFrame, metrics: List[str] = OUTCOME_METRICS) -> pd.DataFrame:
+        """Spearman rank correlation and standardized slope of each outcome on each parameter"""
+        parameters = [p for p in SWEEP_PARAMETERS if p in results.columns and results[p].nunique() > 1]
+        rows = []
+        for parameter in parameters:
+            x = results[parameter].to_numpy(dtype=float)
+            row = {"parameter": parameter, "min": x.min(), "max": x.max()}
+            for metric in metrics:
+                y = results[metric].to_numpy(dtype=float)
+                if y.std() == 0:
+                    row[f"{metric}_spearman"] = 0.0
+                    row[f"{metric}_std_slope"] = 0.0
+                    continue
+                row[f"{metric}_spearman"] = float(np.corrcoef(_rank(x), _rank(y))[0, 1])
+                row[f"{metric}_std_slope"] = float(np.polyfit(x, y, 1)[0] * x.std() / y.std())
+            rows.append(row)
+        table = pd.DataFrame(rows)
+        if not table.empty:
+            table = table.reindex(table[f"{metrics[0]}_spearman"].abs().sort_values(ascending=False).index)
+        return table.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    sweep = ParameterSweep(n_replicates=500)
+    configs = latin_hypercube_configs(SWEEP_PARAMETERS, n_samples=64)
+    results = sweep.run(configs)
+    table = sweep.sensitivity_table(results)
+
+    results.to_csv("data/parameter_sweep_results.csv", index=False)
+    table.to_csv("data/parameter_sensitivity.csv", index=False)
+
+    print("\n" + "="*80)
+    print("RISK MODEL SENSITIVITY (Latin hypercube, 64 configurations)")
+    print("="*80)
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print("\nResults saved to: data/parameter_sweep_results.csv, data/parameter_sensitivity.csv")
@@ -0,0 +1,207 @@
+import math
+import zlib
+import numpy as np
+from typing import Dict, List, Any, Optional, Sequence, Union
+
+DEFAULT_K = 200
+MIN_WIDTH = 8
+CAPACITY_DECAY = 2 / 3
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Biomarker columns sketched per shard and per persona type
+SKETCH_COLUMNS = {
+    "apple_watch": ["heart_rate_resting", "heart_rate_variability", "sleep_duration_hours"],
+    "phq5": ["total_score"],
+}
+
+
+def rank_error(k: int = DEFAULT_K) -> float:
+    """Normalized rank error of one KLL quantile estimate at 99% confidence.
+
+    The empirical fit Apache DataSketches publishes for this compactor
+    schedule: about 1.3% of n at k=200, 0.3% at k=1000.
+    A reported p-th percentile lies between the true (p - e)-th and
+    (p + e)-th percentiles.
+    """
+    return 2.296 / k ** 0.9723
+
+
+class KLLSketch:
+    """Mergeable streaming quantile sketch (Karnin, Lang & Liberty).
+
+    Values enter level 0. A level that outgrows its capacity is sorted and
+    every other item, from a random offset, is promoted to the next level
+    with twice the weight. Capacities shrink geometrically towards the lower
+    levels, so a sketch holds O(k) values for any n and its rank error is
+    bounded by `rank_error(k)`. Two sketches merge by concatenating levels
+    and compacting, so per-shard sketches combine into per-group ones in
+    any order with the same guarantee.
+    """
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[np.ndarray] = [np.zeros(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def retained(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(MIN_WIDTH, int(math.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def _compact(self, level: int):
+        items = np.sort(self.levels[level])
+        # An odd item out stays behind so the promoted weight is exact
+        leftover, items = (items[-1:], items[:-1]) if len(items) % 2 else (items[:0], items)
+        if level + 1 == len(self.levels):
+            self.levels.append(np.zeros(0))
+        self.levels[level] = leftover
+        self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[self._rng.integers(2)::2]])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                self._compact(level)
+                level = 0  # adding a level lowers every capacity below it
+            else:
+                level += 1
+
+    def update(self, values: Union[float, Sequence[float], np.ndarray]) -> "KLLSketch":
+        """Add values (a scalar or an array; NaNs are ignored)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold another sketch into this one (in place)"""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _weighted(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """Approximate q-quantile(s), 0 <= q <= 1; q=0 and q=1 are the exact min and max"""
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            result = np.full(len(qs), np.nan)
+        else:
+            values, cumulative = self._weighted()
+            index = np.searchsorted(cumulative, qs * cumulative[-1], side="left").clip(0, len(values) - 1)
+            result = values[index]
+            result[qs <= 0] = self.min
+            result[qs >= 1] = self.max
+        return float(result[0]) if np.ndim(q) == 0 else result
+
+    def rank(self, x: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """Approximate fraction of values <= x"""
+        xs = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        if self.n == 0:
+            result = np.full(len(xs), np.nan)
+        else:
+            values, cumulative = self._weighted()
+            index = np.searchsorted(values, xs, side="right")
+            result = np.where(index > 0, cumulative[np.maximum(index - 1, 0)], 0) / cumulative[-1]
+        return float(result[0]) if np.ndim(x) == 0 else result
+
+    def summary(self, quantiles: Sequence[float] = SUMMARY_QUANTILES) -> Dict[str, Any]:
+        """Count, range and percentiles as plain floats, with the rank error they are within"""
+        estimates = self.quantile(list(quantiles))
+        return {
+            "n": self.n,
+            "min": self.min if self.n else None,
+            "max": self.max if self.n else None,
+            **{f"p{round(q * 100):02d}": float(v) for q, v in zip(quantiles, estimates)},
+            "rank_error": rank_error(self.k),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "n": self.n, "min": self.min, "max": self.max,
+                "levels": [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any], seed: Optional[int] = None) -> "KLLSketch":
+        sketch = cls(state["k"], seed)
+        sketch.n, sketch.min, sketch.max = state["n"], state["min"], state["max"]
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in state["levels"]]
+        return sketch
+
+
+def sketch_seed(*key: Any) -> int:
+    """Stable compaction seed for the sketch identified by key (e.g. shard, stream, column, group).
+
+    Seeding by what a sketch summarizes keeps rebuilt shards and re-run
+    summaries byte-identical, which unseeded compaction offsets do not.
+    """
+    return zlib.crc32("|".join(str(part) for part in key).encode())
+
+
+def merge_all(sketches: Sequence[KLLSketch], k: int = DEFAULT_K, seed: Optional[int] = None) -> KLLSketch:
+    merged = KLLSketch(k, seed)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def group_sketches(values: np.ndarray, groups: Sequence[str], k: int = DEFAULT_K,
+                   seed: Optional[int] = None) -> Dict[str, KLLSketch]:
+    """One sketch per distinct group label of a value column, seeded from seed and the label when given"""
+    groups = np.asarray(groups)
+    return {str(label): KLLSketch(k, None if seed is None else sketch_seed(seed, label)).update(values[groups == label])
+            for label in np.unique(groups)}
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    # 64 shards of skewed, heart-rate-like readings, sketched separately and merged
+    shards = [rng.gamma(9 + i % 5, 7, size=50_000) for i in range(64)]
+    everything = np.concatenate(shards)
+
+    start = time.perf_counter()
+    sketches = [KLLSketch(seed=i).update(shard) for i, shard in enumerate(shards)]
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    merged = merge_all(sketches)
+    merged_s = time.perf_counter() - start
+
+    qs = np.array([0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+    estimates = merged.quantile(qs)
+    exact = np.quantile(everything, qs)
+    true_ranks = np.searchsorted(np.sort(everything), estimates, side="right") / len(everything)
+    print(f"{len(everything):,} values in {len(shards)} shards: sketched in {built:.2f} s, merged in "
+          f"{merged_s * 1000:.1f} ms, {merged.retained:,} values retained ({merged.retained * 8 / 1024:.0f} KB)")
+    for q, estimate, value, true_rank in zip(qs, estimates, exact, true_ranks):
+        print(f"  p{q * 100:>4.1f}: sketch {estimate:7.2f}  exact {value:7.2f}  true rank {true_rank:.4f}")
+    worst = np.abs(true_ranks - qs).max()
+    print(f"Worst rank error {worst:.4f} (bound {rank_error(merged.k):.4f} at 99% confidence)")
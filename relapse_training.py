@@ -0,0 +1,272 @@
+import os
+import time
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from compact_dataset import CompactCohort
+from feature_matrix import FeatureJoiner, FeatureMatrix
+from sharded_dataset import ShardedDataset, ShardWriter
+
+# Inputs to the classifier; sparse streams also get a missing-value indicator
+FEATURES = [
+    "apple_watch.heart_rate_variability",
+    "apple_watch.heart_rate_resting",
+    "apple_watch.sleep_efficiency",
+    "phq5.total_score",
+    "chat.sentiment_score_mean",
+    "mood_diary.craving_intensity",
+]
+MISSING_INDICATORS = ["phq5.total_score", "chat.sentiment_score_mean", "mood_diary.craving_intensity"]
+FEATURE_NAMES = FEATURES + [f"{name}.missing" for name in MISSING_INDICATORS]
+HORIZON_DAYS = 14
+
+
+def relapse_within(relapse: np.ndarray, n_patients: int, n_days: int, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Target for a patient-major grid: any relapse in days (t, t + horizon].
+
+    Returns the labels and a mask of rows whose full horizon lies inside the study
+    (later rows are censored and excluded from training).
+    """
+    grid = relapse.reshape(n_patients, n_days).astype(np.int32)
+    cumulative = np.concatenate([np.zeros((n_patients, 1), np.int32), np.cumsum(grid, axis=1)], axis=1)
+    days = np.arange(n_days)
+    end = np.minimum(days + horizon, n_days - 1)
+    labels = (cumulative[:, end + 1] - cumulative[:, days + 1]) > 0
+    observed = np.broadcast_to(days + horizon < n_days, (n_patients, n_days))
+    return labels.ravel(), observed.ravel()
+
+
+def design_matrix(features: FeatureMatrix) -> np.ndarray:
+    """Classifier inputs (float32, NaN-free) for every row of a feature grid, in FEATURE_NAMES order"""
+    X = features.matrix(FEATURES)
+    missing = np.isnan(features.matrix(MISSING_INDICATORS))
+    return np.column_stack([np.nan_to_num(X, nan=0.0), missing.astype(np.float32)])
+
+
+def chunk_features(cohort: CompactCohort, horizon: int = HORIZON_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """Design matrix and labels for one chunk of complete patient histories"""
+    features = FeatureJoiner.join(cohort)
+    X = design_matrix(features)
+    labels, observed = relapse_within(np.nan_to_num(features.columns["sobriety.relapse_occurred"]) > 0,
+                                      len(features.patient_ids), features.n_days, horizon)
+    return X[observed], labels[observed].astype(np.float32)
+
+
+def _prepare_bucket(args) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Process pool entry point: read one bucket's shards and build its features"""
+    root, bucket, horizon = args
+    start = time.perf_counter()
+    X, y = chunk_features(ShardedDataset(root).bucket_cohort(bucket), horizon)
+    return X, y, time.perf_counter() - start
+
+
+def roc_auc(y: np.ndarray, scores: np.ndarray) -> float:
+    """Area under the ROC curve via the rank-sum statistic"""
+    positives = y > 0
+    n_pos, n_neg = int(positives.sum()), int((~positives).sum())
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+    order = np.argsort(scores, kind="stable")
+    ranks = np.empty(len(scores))
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+class StreamingScaler:
+    """Running mean/variance (Chan et al. parallel update), so chunks never need to be revisited"""
+
+    def __init__(self, n_features: int):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def partial_fit(self, X: np.ndarray):
+        n = len(X)
+        if n == 0:
+            return
+        batch_mean = X.mean(axis=0)
+        delta = batch_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += ((X - batch_mean) ** 2).sum(axis=0) + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        std = np.sqrt(self.m2 / max(self.count - 1, 1))
+        return ((X - self.mean) / np.where(std > 0, std, 1)).astype(np.float32)
+
+
+class MiniBatchLogisticRegression:
+    """L2-regularized logistic regression trained with mini-batch SGD (Adam updates)"""
+
+    def __init__(self, n_features: int, learning_rate: float = 0.01, l2: float = 1e-4,
+                 batch_size: int = 4096, pos_weight: Optional[float] = None, random_seed: int = 42):
+        self.weights = np.zeros(n_features)
+        self.bias = 0.0
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.batch_size = batch_size
+        self.pos_weight = pos_weight  # None = balance classes from the running label counts
+        self.rng = np.random.default_rng(random_seed)
+        self._moments = [np.zeros(n_features + 1), np.zeros(n_features + 1)]
+        self._steps = 0
+        self._seen = np.zeros(2)
+
+    @staticmethod
+    def _sigmoid(z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self._sigmoid(X @ self.weights + self.bias)
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        """One pass of shuffled mini-batches over a chunk"""
+        self._seen += [len(y) - y.sum(), y.sum()]
+        pos_weight = self.pos_weight or self._seen[0] / max(self._seen[1], 1)
+        order = self.rng.permutation(len(y))
+        for start in range(0, len(y), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            Xb, yb = X[rows], y[rows]
+            sample_weight = np.where(yb > 0, pos_weight, 1.0)
+            error = (self.predict_proba(Xb) - yb) * sample_weight / sample_weight.sum()
+            gradient = np.append(Xb.T @ error + self.l2 * self.weights, error.sum())
+            self._adam_step(gradient)
+
+    def _adam_step(self, gradient: np.ndarray, beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8):
+        self._steps += 1
+        m, v = self._moments
+        m[:] = beta1 * m + (1 - beta1) * gradient
+        v[:] = beta2 * v + (1 - beta2) * gradient ** 2
+        step = self.learning_rate * (m / (1 - beta1 ** self._steps)) / (np.sqrt(v / (1 - beta2 ** self._steps)) + eps)
+        self.weights -= step[:-1]
+        self.bias -= step[-1]
+
+    def log_loss(self, X: np.ndarray, y: np.ndarray) -> float:
+        p = np.clip(self.predict_proba(X), 1e-7, 1 - 1e-7)
+        return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+class RelapseTrainer:
+    """Out-of-core training over a sharded cohort, one patient hash bucket per chunk.
+
+    Worker processes read shards and build feature chunks while the main process
+    updates the model; at most `prefetch` chunks are in flight, so memory stays
+    bounded by a few buckets regardless of cohort size.
+    """
+
+    def __init__(self, root: str, horizon: int = HORIZON_DAYS, n_workers: Optional[int] = None,
+                 prefetch: Optional[int] = None, validation_buckets: int = 2, **model_params):
+        self.root = root
+        self.dataset = ShardedDataset(root)
+        self.horizon = horizon
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.prefetch = prefetch or 2 * self.n_workers
+        buckets = self.dataset.buckets()
+        self.validation_buckets = buckets[-validation_buckets:] if validation_buckets else []
+        self.train_buckets = [b for b in buckets if b not in self.validation_buckets]
+        self.scaler = StreamingScaler(len(FEATURE_NAMES))
+        self.model = MiniBatchLogisticRegression(len(FEATURE_NAMES), **model_params)
+        self.stats: Dict[str, Any] = {}
+
+    def _chunks(self, buckets: List[int], executor: Optional[ProcessPoolExecutor]):
+        """Yield prepared chunks in bucket order with a bounded prefetch window"""
+        tasks = [(self.root, bucket, self.horizon) for bucket in buckets]
+        if executor is None:
+            for task in tasks:
+                yield _prepare_bucket(task)
+            return
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(_prepare_bucket, task))
+            if len(pending) >= self.prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def fit(self, epochs: int = 3) -> Dict[str, Any]:
+        rows = prep_seconds = train_seconds = 0
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(max_workers=self.n_workers) if self.n_workers > 1 else None
+        try:
+            for epoch in range(epochs):
+                for X, y, prep_time in self._chunks(self.train_buckets, executor):
+                    tick = time.perf_counter()
+                    if epoch == 0:
+                        self.scaler.partial_fit(X)
+                    self.model.partial_fit(self.scaler.transform(X), y)
+                    train_seconds += time.perf_counter() - tick
+                    prep_seconds += prep_time
+                    rows += len(y)
+            validation = self.evaluate(executor)
+        finally:
+            if executor:
+                executor.shutdown()
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "epochs": epochs,
+            "rows_trained": rows,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": rows / elapsed,
+            "train_rows_per_second": rows / train_seconds if train_seconds else None,
+            "prep_rows_per_second_per_worker": rows / prep_seconds if prep_seconds else None,
+            "n_workers": self.n_workers,
+            **validation,
+        }
+        return self.stats
+
+    def evaluate(self, executor: Optional[ProcessPoolExecutor] = None) -> Dict[str, Any]:
+        """Log loss, AUC and base rate on the held-out buckets"""
+        if not self.validation_buckets:
+            return {}
+        scores, labels, loss, n = [], [], 0.0, 0
+        for X, y, _ in self._chunks(self.validation_buckets, executor):
+            Xs = self.scaler.transform(X)
+            scores.append(self.model.predict_proba(Xs))
+            labels.append(y)
+            loss += self.model.log_loss(Xs, y) * len(y)
+            n += len(y)
+        scores, labels = np.concatenate(scores), np.concatenate(labels)
+        return {"validation_rows": n, "validation_log_loss": loss / n,
+                "validation_auc": roc_auc(labels, scores), "validation_base_rate": float(labels.mean())}
+
+    def coefficients(self) -> Dict[str, float]:
+        """Weights on standardized features"""
+        return dict(zip(FEATURE_NAMES, self.model.weights.tolist()))
+
+
+def build_cohort_shards(root: str, n_patients: int, batch_size: int = 100, n_buckets: int = 16):
+    """Generate a counter-based cohort in batches and write it as shards, holding one batch at a time"""
+    from cohort_generator import CohortGenerator
+
+    generator = CohortGenerator(start_date="2024-01-01", n_days=180)
+    patient_ids = generator.patient_ids(n_patients)
+    writer = ShardWriter(root, generator.start_date.strftime("%Y-%m-%d"), n_buckets=n_buckets)
+    for i in range(0, n_patients, batch_size):
+        writer.add(CompactCohort.from_dataset(generator.generate_cohort(patient_ids=patient_ids[i:i + batch_size]),
+                                              consume=True))
+    return writer.close()
+
+
+if __name__ == "__main__":
+    root = 'data/cohort_sharded'
+    if not os.path.exists(os.path.join(root, "manifest.json")):
+        print("Generating a 1,000 patient cohort...")
+        build_cohort_shards(root, n_patients=1000)
+
+    trainer = RelapseTrainer(root, horizon=HORIZON_DAYS)
+    stats = trainer.fit(epochs=3)
+
+    print("\n" + "="*60)
+    print(f"RELAPSE WITHIN {HORIZON_DAYS} DAYS - MINI-BATCH LOGISTIC REGRESSION")
+    print("="*60)
+    print(f"Rows trained:     {stats['rows_trained']:,} ({stats['epochs']} epochs, {stats['n_workers']} workers)")
+    print(f"Throughput:       {stats['rows_per_second']:,.0f} rows/s end to end")
+    print(f"  model updates:  {stats['train_rows_per_second']:,.0f} rows/s")
+    print(f"  chunk prep:     {stats['prep_rows_per_second_per_worker']:,.0f} rows/s per worker")
+    print(f"Validation:       AUC {stats['validation_auc']:.3f}, log loss {stats['validation_log_loss']:.3f}, "
+          f"base rate {stats['validation_base_rate']:.3f} ({stats['validation_rows']:,} rows)")
+    print("\nStandardized coefficients:")
+    for name, weight in sorted(trainer.coefficients().items(), key=lambda item: -abs(item[1])):
+        print(f"  {name:<45} {weight:+.3f}")
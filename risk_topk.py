@@ -0,0 +1,226 @@
+import heapq
+import numpy as np
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+from sharded_dataset import ShardedDataset
+
+HIGH_RISK = 0.6
+INCREASE_WINDOW = 7
+
+
+class TopK:
+    """The k largest items offered so far, ordered by a tuple key, in O(k) memory.
+
+    A min-heap of size k: its root is the smallest kept key, so a candidate
+    either replaces the root in O(log k) or is rejected in O(1). Equal keys
+    keep the item offered first.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[Tuple[tuple, int, Any]] = []
+        self._offered = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def full(self) -> bool:
+        return len(self._heap) >= self.k
+
+    def floor(self) -> Optional[tuple]:
+        """Smallest key still kept once the heap is full (None before that)"""
+        return self._heap[0][0] if self.full else None
+
+    def offer(self, key: tuple, item: Any) -> bool:
+        entry = (key, -self._offered, item)
+        self._offered += 1
+        if not self.full:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] <= self._heap[0][:2]:
+            return False
+        heapq.heapreplace(self._heap, entry)
+        return True
+
+    def offer_many(self, keys: Sequence[np.ndarray], items: Sequence[np.ndarray]):
+        """Offer a partition's candidates column-wise: keys in priority order, items as parallel columns.
+
+        Only the partition's own top k can enter the heap, so candidates are
+        cut to those with a vectorized pre-filter and sort before any heap work.
+        """
+        if self.k <= 0 or len(keys[0]) == 0:
+            return
+        floor = self.floor()
+        if floor is not None:
+            keep = keys[0] >= floor[0]
+            keys = [key[keep] for key in keys]
+            items = [item[keep] for item in items]
+        order = np.lexsort(tuple(keys[::-1]))[::-1][:self.k]
+        rows = zip(zip(*(key[order].tolist() for key in keys)), zip(*(item[order].tolist() for item in items)))
+        for key, item in rows:
+            self.offer(key, item)
+
+    def items(self) -> List[Tuple[tuple, Any]]:
+        """Kept (key, item) pairs, largest first"""
+        return [(key, item) for key, _, item in sorted(self._heap, reverse=True)]
+
+
+def _group_last(patient: np.ndarray) -> np.ndarray:
+    """Index of each patient's last row in patient-sorted columns"""
+    return np.flatnonzero(np.r_[patient[1:] != patient[:-1], True]) if len(patient) else np.zeros(0, dtype=np.int64)
+
+
+def _best_per_patient(patient: np.ndarray, value: np.ndarray, recency: np.ndarray) -> np.ndarray:
+    """Row index of each patient's largest value (latest on ties)"""
+    order = np.lexsort((recency, value, patient))
+    return order[_group_last(patient[order])]
+
+
+class HighRiskQuery:
+    """Top-K relapse-risk queries over a sharded dataset.
+
+    Shards are read one at a time through the manifest and only the sobriety
+    patient, day and relapse_risk_score columns are decoded. Each criterion
+    keeps a TopK heap, so memory beyond the partition being scanned is O(K),
+    and the zone maps skip shards that cannot beat what the heaps already
+    hold. `counters` records how many shards and rows each query touched.
+    """
+
+    COLUMNS = ["patient", "day", "relapse_risk_score"]
+
+    def __init__(self, dataset: ShardedDataset):
+        self.dataset = dataset
+        self.start = np.datetime64(dataset.start_date, "D")
+        self.counters = {"shards_read": 0, "shards_skipped": 0, "rows_scanned": 0}
+
+    def _read(self, shard: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        columns = self.dataset.read_shard(shard, "sobriety", self.COLUMNS)
+        self.counters["shards_read"] += 1
+        self.counters["rows_scanned"] += len(columns["day"])
+        return columns
+
+    def _row(self, code: int, day: int, **values) -> Dict[str, Any]:
+        return {
+            "patient_id": self.dataset.patient_ids[code],
+            "persona_name": self.dataset.manifest["persona_names"][code],
+            "date": str(self.start + day),
+            **values,
+        }
+
+    def recent(self, k: int = 50, threshold: float = HIGH_RISK) -> List[Dict[str, Any]]:
+        """The k most recent patient-days with risk >= threshold, newest first (riskiest first within a day).
+
+        Same rows as the portal's high-risk list. Shards are visited newest
+        month first; once the heap is full, any shard ending before its oldest
+        kept day, or whose max risk is below the threshold, is never opened.
+        """
+        heap = TopK(k)
+        shards = [s for s in self.dataset.shards if "sobriety" in s["streams"]]
+        shards.sort(key=lambda s: s["streams"]["sobriety"]["day_max"], reverse=True)
+        for shard in shards:
+            entry = shard["streams"]["sobriety"]
+            floor = heap.floor()
+            if entry["stats"]["relapse_risk_score"]["max"] < threshold or (floor and entry["day_max"] < floor[0]):
+                self.counters["shards_skipped"] += 1
+                continue
+            columns = self._read(shard)
+            high = columns["relapse_risk_score"] >= threshold
+            heap.offer_many([columns["day"][high].astype(np.int64), columns["relapse_risk_score"][high]],
+                            [columns["patient"][high]])
+        return [self._row(code, day, relapse_risk_score=risk) for (day, risk), (code,) in heap.items()]
+
+    def patients(self, k: int = 10, threshold: float = HIGH_RISK,
+                 window: int = INCREASE_WINDOW) -> Dict[str, List[Dict[str, Any]]]:
+        """Top k patients by current risk, largest `window`-day risk increase and longest high-risk streak.
+
+        Buckets hold complete patient histories, so each bucket's sobriety
+        shards are read together, reduced to one candidate per patient and
+        criterion with sorts and searches, and then offered to the heaps.
+        """
+        current, increase, streak = TopK(k), TopK(k), TopK(k)
+        for bucket in self.dataset.buckets():
+            parts = [self._read(s) for s in self.dataset.shards
+                     if s["bucket"] == bucket and "sobriety" in s["streams"]]
+            if not parts:
+                continue
+            patient, day, risk = (np.concatenate([p[name] for p in parts]) for name in self.COLUMNS)
+            order = np.lexsort((day, patient))
+            patient, day, risk = patient[order].astype(np.int64), day[order].astype(np.int64), risk[order]
+
+            # Current risk: each patient's latest reading
+            last = _group_last(patient)
+            current.offer_many([risk[last], day[last]], [patient[last], day[last]])
+
+            # Increase over the window: pair every day with the same patient's reading `window` days before
+            keys = patient << 32 | day
+            before = np.searchsorted(keys, keys - window).clip(max=len(keys) - 1)
+            paired = np.flatnonzero(keys[before] == keys - window)
+            delta = risk[paired] - risk[before[paired]]
+            best = _best_per_patient(patient[paired], delta, day[paired])
+            rows = paired[best]
+            increase.offer_many([delta[best], day[rows]], [patient[rows], day[rows], risk[before[rows]], risk[rows]])
+
+            # Longest run of consecutive days at or above the threshold
+            high = np.flatnonzero(risk >= threshold)
+            if len(high):
+                hp, hd = patient[high], day[high]
+                starts = np.flatnonzero(np.r_[True, (hp[1:] != hp[:-1]) | (hd[1:] != hd[:-1] + 1)])
+                ends = np.r_[starts[1:], len(high)] - 1
+                lengths = ends - starts + 1
+                best = _best_per_patient(hp[starts], lengths, hd[ends])
+                streak.offer_many([lengths[best], hd[ends[best]]], [hp[starts[best]], hd[starts[best]], hd[ends[best]]])
+
+        return {
+            "current_risk": [self._row(code, d, relapse_risk_score=value)
+                             for (value, _), (code, d) in current.items()],
+            "risk_increase": [self._row(code, d, increase=value, risk_before=r0, relapse_risk_score=r1)
+                              for (value, _), (code, d, r0, r1) in increase.items()],
+            "high_risk_streak": [{**self._row(code, first, days=length), "end_date": str(self.start + last_day)}
+                                 for (length, _), (code, first, last_day) in streak.items()],
+        }
+
+
+if __name__ == "__main__":
+    import os
+    import time
+    import pandas as pd
+    from relapse_training import build_cohort_shards
+
+    root = 'data/cohort_sharded'
+    if not os.path.exists(os.path.join(root, "manifest.json")):
+        print("Generating a 1,000 patient cohort...")
+        build_cohort_shards(root, n_patients=1000)
+    dataset = ShardedDataset(root)
+    query = HighRiskQuery(dataset)
+
+    start = time.perf_counter()
+    recent = query.recent(k=50)
+    elapsed = time.perf_counter() - start
+    print(f"50 most recent high-risk days: {elapsed * 1000:.1f} ms, {query.counters['shards_read']} shards read, "
+          f"{query.counters['shards_skipped']} skipped, {query.counters['rows_scanned']:,} rows")
+    for row in recent[:5]:
+        print(f"  {row['date']}  {row['persona_name']:<24} {row['relapse_risk_score']:.3f}")
+
+    start = time.perf_counter()
+    top = query.patients(k=10)
+    print(f"Per-patient top 10s in {time.perf_counter() - start:.2f} s")
+    print("  Highest current risk:   " + ", ".join(f"{r['patient_id']} {r['relapse_risk_score']:.2f}"
+                                                     for r in top["current_risk"][:3]))
+    print("  Largest 7-day increase: " + ", ".join(f"{r['patient_id']} +{r['increase']:.2f} ({r['date']})"
+                                                     for r in top["risk_increase"][:3]))
+    print("  Longest high-risk run:  " + ", ".join(f"{r['patient_id']} {r['days']}d to {r['end_date']}"
+                                                     for r in top["high_risk_streak"][:3]))
+
+    # Check against a full sort of the whole stream
+    frame = pd.DataFrame(dataset.read("sobriety", ["relapse_risk_score"])).sort_values(["patient", "day"])
+    high = frame[frame["relapse_risk_score"] >= HIGH_RISK].sort_values(["day", "relapse_risk_score"], ascending=False)
+    assert list(zip(high["day"][:50], high["relapse_risk_score"][:50])) == \
+        [(query.dataset.day_offset(r["date"]), r["relapse_risk_score"]) for r in recent]
+    latest = frame.groupby("patient")["relapse_risk_score"].last().sort_values(ascending=False)
+    assert np.allclose(latest.values[:10], [r["relapse_risk_score"] for r in top["current_risk"]])
+    shifted = frame.assign(day=frame["day"] + INCREASE_WINDOW)
+    paired = frame.merge(shifted, on=["patient", "day"], suffixes=("", "_before"))
+    delta = (paired["relapse_risk_score"] - paired["relapse_risk_score_before"]).groupby(paired["patient"]).max()
+    assert np.allclose(delta.sort_values(ascending=False).values[:10], [r["increase"] for r in top["risk_increase"]])
+    print("Matches a full sort of the sobriety stream")
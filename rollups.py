@@ -0,0 +1,161 @@
+import json
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from compact_dataset import CompactCohort, STREAMS, STREAM_COLUMNS
+
+RESOLUTIONS = ["daily", "weekly", "monthly"]
+
+
+def period_of(days: np.ndarray, resolution: str, start_date: str) -> np.ndarray:
+    """Map study day offsets to period indices: study day, study week, or calendar month since start"""
+    if resolution == "daily":
+        return days.astype(np.int32)
+    if resolution == "weekly":
+        return (days // 7).astype(np.int32)
+    if resolution == "monthly":
+        start = np.datetime64(start_date, "D")
+        months = (start + days.astype(np.int64)).astype("datetime64[M]").astype(np.int64)
+        return (months - start.astype("datetime64[M]").astype(np.int64)).astype(np.int32)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def aggregate(patient: np.ndarray, period: np.ndarray, values: Dict[str, np.ndarray],
+              counts: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Group rows by (patient, period) and sum every value column; counts default to one per row"""
+    keys = patient.astype(np.int64) << 32 | period.astype(np.int64) & 0xFFFFFFFF
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    result = {
+        "patient": (unique_keys >> 32).astype(np.int32),
+        "period": (unique_keys & 0xFFFFFFFF).astype(np.uint32).astype(np.int32),
+        "count": np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64),
+    }
+    for name, column in values.items():
+        result[name] = np.bincount(inverse, weights=column.astype(np.float64), minlength=len(unique_keys))
+    return result
+
+
+class RollupStore:
+    """Daily, weekly and monthly sum/count aggregates per patient and stream.
+
+    Only sums and counts are stored, so rollups built from newly appended days
+    merge exactly into the existing ones; means are derived at read time.
+    """
+
+    def __init__(self, start_date: str, patient_ids: List[str],
+                 tables: Optional[Dict[str, Dict[str, Dict[str, np.ndarray]]]] = None):
+        self.start_date = start_date
+        self.patient_ids = list(patient_ids)
+        self.patient_index = {p: i for i, p in enumerate(self.patient_ids)}
+        self.tables = tables or {resolution: {} for resolution in RESOLUTIONS}
+
+    @staticmethod
+    def _stream_values(cohort: CompactCohort, stream: str) -> Dict[str, np.ndarray]:
+        """Numeric columns worth summing (bitmask columns are not additive)"""
+        columns = cohort.streams[stream]
+        return {f"{name}_sum": columns[name] for name in STREAM_COLUMNS[stream] if name in columns}
+
+    @classmethod
+    def build(cls, cohort: CompactCohort) -> "RollupStore":
+        """Materialize every resolution for every stream of a cohort"""
+        store = cls(cohort.start_date, cohort.patient_ids)
+        store.append(cohort)
+        return store
+
+    def append(self, cohort: CompactCohort):
+        """Fold newly generated or ingested rows into the existing rollups"""
+        if cohort.start_date != self.start_date:
+            raise ValueError("Appended rows must share the rollup start date")
+        # Re-code patients in case the new rows introduce patients we have not seen
+        remap = np.array([self._patient_code(p) for p in cohort.patient_ids], dtype=np.int32)
+
+        for stream in STREAMS:
+            columns = cohort.streams[stream]
+            if len(columns.get("patient", [])) == 0:
+                continue
+            patient = remap[columns["patient"]]
+            values = self._stream_values(cohort, stream)
+            for resolution in RESOLUTIONS:
+                period = period_of(columns["day"], resolution, self.start_date)
+                delta = aggregate(patient, period, values)
+                existing = self.tables[resolution].get(stream)
+                self.tables[resolution][stream] = delta if existing is None else self._merge(existing, delta)
+
+    def _patient_code(self, patient_id: str) -> int:
+        if patient_id not in self.patient_index:
+            self.patient_index[patient_id] = len(self.patient_ids)
+            self.patient_ids.append(patient_id)
+        return self.patient_index[patient_id]
+
+    @staticmethod
+    def _merge(existing: Dict[str, np.ndarray], delta: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Combine two aggregate tables; periods present in both have their sums and counts added"""
+        both = {name: np.concatenate([existing[name], delta[name]]) for name in existing}
+        values = {name: column for name, column in both.items() if name.endswith("_sum")}
+        return aggregate(both["patient"], both["period"], values, counts=both["count"])
+
+    def table(self, resolution: str, stream: str) -> Dict[str, np.ndarray]:
+        """Aggregates for one resolution and stream, with *_mean columns derived from the sums"""
+        raw = self.tables[resolution].get(stream, {})
+        result = dict(raw)
+        for name in list(raw):
+            if name.endswith("_sum"):
+                result[name[:-4] + "_mean"] = raw[name] / np.maximum(raw["count"], 1)
+        return result
+
+    def series(self, resolution: str, stream: str, column: str, patient_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Periods and values of one aggregate column for one patient"""
+        table = self.table(resolution, stream)
+        if not table:
+            return np.array([], dtype=np.int32), np.array([])
+        rows = table["patient"] == self.patient_index[patient_id]
+        return table["period"][rows], table[column][rows]
+
+    def to_dataframe(self, resolution: str, stream: str):
+        """One row per patient and period"""
+        import pandas as pd
+
+        frame = pd.DataFrame(self.table(resolution, stream))
+        if not frame.empty:
+            frame.insert(0, "patient_id", np.asarray(self.patient_ids, dtype=object)[frame["patient"]])
+        return frame
+
+    def save(self, filename: str):
+        """Save all rollup tables to a single .npz file"""
+        arrays = {f"{resolution}/{stream}/{name}": values
+                  for resolution, streams in self.tables.items()
+                  for stream, columns in streams.items()
+                  for name, values in columns.items()}
+        meta = {"start_date": self.start_date, "patient_ids": self.patient_ids}
+        np.savez(filename, __meta__=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+
+    @classmethod
+    def load(cls, filename: str) -> "RollupStore":
+        """Load rollups written by save()"""
+        tables = {resolution: {} for resolution in RESOLUTIONS}
+        with np.load(filename) as archive:
+            meta = json.loads(archive["__meta__"].tobytes().decode())
+            for key in archive.files:
+                if key != "__meta__":
+                    resolution, stream, name = key.split("/", 2)
+                    tables[resolution].setdefault(stream, {})[name] = archive[key]
+        return cls(meta["start_date"], meta["patient_ids"], tables)
+
+
+if __name__ == "__main__":
+    cohort = CompactCohort.load_json('data/realistic_patient_data.json')
+    rollups = RollupStore.build(cohort)
+    rollups.save('data/realistic_patient_rollups.npz')
+
+    print("\n" + "="*70)
+    print("MONTHLY ROLLUPS")
+    print("="*70)
+    keys = ["patient_id", "period"]
+    monthly = rollups.to_dataframe("monthly", "sobriety")[keys + ["relapse_risk_score_mean", "relapse_occurred_sum"]] \
+        .merge(rollups.to_dataframe("monthly", "apple_watch")[keys + ["sleep_duration_hours_mean"]], on=keys, how="left") \
+        .merge(rollups.to_dataframe("monthly", "chat")[keys + ["count"]], on=keys, how="left") \
+        .fillna({"count": 0})
+    print(f"{'Patient':<20} {'Month':<6} {'Mean Risk':<10} {'Relapses':<9} {'Avg Sleep':<10} {'Chats':<6}")
+    for _, row in monthly.iterrows():
+        print(f"{row['patient_id']:<20} {row['period']:<6} {row['relapse_risk_score_mean']:<10.3f} "
+              f"{int(row['relapse_occurred_sum']):<9} {row['sleep_duration_hours_mean']:<10.2f} {int(row['count']):<6}")
@@ -0,0 +1,409 @@
+import json
+import os
+import zlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Callable, Tuple
+
+from compact_dataset import CompactCohort, STREAMS
+from quantile_sketch import KLLSketch, SKETCH_COLUMNS, SUMMARY_QUANTILES, group_sketches, merge_all, sketch_seed
+
+MANIFEST_FILE = "manifest.json"
+SKETCH_FILE = "sketches.json"
+FORMAT_VERSION = 1
+
+
+def patient_bucket(patient_id: str, n_buckets: int) -> int:
+    """Stable hash partition for a patient (same in every process, unlike hash())"""
+    return zlib.crc32(patient_id.encode()) % n_buckets
+
+
+class ShardWriter:
+    """Write a cohort as shards partitioned by patient hash bucket and calendar month, one batch at a time.
+
+    add() splits a batch of patients into its bucket/month shards and writes
+    each piece as a part file, so only that batch is in memory. Patient
+    codes continue across batches. close() then finalizes the shards one
+    at a time: it merges the shard's parts in batch order, writes the
+    stream files, zone maps, overflow terms and sketches, and writes the
+    manifest. Memory stays bounded by one batch or one shard, whichever is
+    larger.
+    """
+
+    def __init__(self, root: str, start_date: str, n_buckets: int = 16,
+                 generation_info: Optional[Dict[str, Any]] = None):
+        self.root = root
+        self.start_date = start_date
+        self.n_buckets = n_buckets
+        self.generation_info = generation_info
+        self.patient_ids: List[str] = []
+        self.persona_names: List[str] = []
+        self.persona_types: List[str] = []
+        # (bucket, month) -> stream -> [(part file, {field: {local row: terms}})]
+        self._parts: Dict[tuple, Dict[str, List[tuple]]] = {}
+        self._batches = 0
+        os.makedirs(root, exist_ok=True)
+
+    def add(self, cohort: CompactCohort):
+        """Append a batch of patients not seen in earlier batches"""
+        if cohort.start_date != self.start_date:
+            raise ValueError(f"batch starts {cohort.start_date}, shards start {self.start_date}")
+        if self.generation_info is None:
+            self.generation_info = cohort.generation_info
+        start = np.datetime64(self.start_date, "D")
+        offset = np.int32(len(self.patient_ids))
+        buckets = np.array([patient_bucket(p, self.n_buckets) for p in cohort.patient_ids], dtype=np.int32)
+
+        for stream in STREAMS:
+            columns = cohort.streams.get(stream) or {}
+            if len(columns.get("patient", [])) == 0:
+                continue
+            row_bucket = buckets[columns["patient"]]
+            row_month = (start + columns["day"].astype(np.int64)).astype("datetime64[M]")
+            keys, inverse = np.unique(np.stack([row_bucket, row_month.astype(np.int64)]), axis=1, return_inverse=True)
+            inverse = inverse.ravel()
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.searchsorted(inverse[order], np.arange(keys.shape[1] + 1))
+            overflow = {k.split(".", 1)[1]: v for k, v in cohort.overflow.items() if k.startswith(f"{stream}.")}
+
+            for i in range(keys.shape[1]):
+                rows = order[bounds[i]:bounds[i + 1]]
+                bucket, month = int(keys[0, i]), str(np.datetime64(int(keys[1, i]), "M"))
+                path = os.path.join(self.root, f"bucket={bucket:03d}/month={month}")
+                os.makedirs(path, exist_ok=True)
+                part = f"{stream}.part{self._batches:05d}.npz"
+                arrays = {name: values[rows] for name, values in columns.items()}
+                arrays["patient"] = arrays["patient"] + offset
+                np.savez(os.path.join(path, part), **arrays)
+                part_overflow = {
+                    field: {local: terms[int(row)] for local, row in enumerate(rows) if int(row) in terms}
+                    for field, terms in overflow.items()
+                }
+                self._parts.setdefault((bucket, month), {}).setdefault(stream, []).append(
+                    (part, {field: terms for field, terms in part_overflow.items() if terms}))
+
+        self.patient_ids.extend(cohort.patient_ids)
+        self.persona_names.extend(cohort.persona_names)
+        self.persona_types.extend(cohort.persona_types)
+        self._batches += 1
+
+    def _finish_stream(self, shard: Dict[str, Any], stream: str,
+                       parts: List[tuple]) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """Merge a shard's parts of one stream into its final file; returns its manifest entry and columns"""
+        start = np.datetime64(self.start_date, "D")
+        directory = os.path.join(self.root, shard["path"])
+        loaded, overflow, row_offset = [], {}, 0
+        for part, part_overflow in parts:
+            with np.load(os.path.join(directory, part)) as archive:
+                loaded.append({name: archive[name] for name in archive.files})
+            for field, terms in part_overflow.items():
+                overflow.setdefault(field, {}).update({str(row_offset + local): t for local, t in terms.items()})
+            row_offset += len(loaded[-1]["day"])
+        columns = {name: np.concatenate([p[name] for p in loaded]) for name in loaded[0]}
+        np.savez(os.path.join(directory, f"{stream}.npz"), **columns)
+        for part, _ in parts:
+            os.remove(os.path.join(directory, part))
+
+        days = columns["day"]
+        entry = {
+            "file": f"{stream}.npz",
+            "rows": int(len(days)),
+            "day_min": int(days.min()),
+            "day_max": int(days.max()),
+            "date_min": str(start + int(days.min())),
+            "date_max": str(start + int(days.max())),
+        }
+        # Zone maps let readers skip shards whose value ranges cannot match a predicate
+        entry["stats"] = {}
+        for name, values in columns.items():
+            if name in ("patient", "day"):
+                continue
+            if values.dtype == np.uint64:
+                entry["stats"][name] = {"mask_union": int(np.bitwise_or.reduce(values))}
+            else:
+                entry["stats"][name] = {"min": values.min().item(), "max": values.max().item()}
+        if overflow:
+            entry["overflow"] = overflow
+        return entry, columns
+
+    def close(self) -> Dict[str, Any]:
+        """Finalize every shard and write the manifest"""
+        persona_types = np.array(self.persona_types)
+        shards = []
+        for (bucket, month), streams in sorted(self._parts.items()):
+            shard = {"bucket": bucket, "month": month, "path": f"bucket={bucket:03d}/month={month}",
+                     "patients": set(), "streams": {}}
+            sketches = {}
+            for stream in STREAMS:
+                if stream not in streams:
+                    continue
+                shard["streams"][stream], columns = self._finish_stream(shard, stream, streams[stream])
+                shard["patients"].update(np.unique(columns["patient"]).tolist())
+                # Quantile sketches per persona type, merged by readers instead of sorting raw rows
+                if stream in SKETCH_COLUMNS:
+                    types = persona_types[columns["patient"]]
+                    grouped = {name: group_sketches(columns[name], types, seed=sketch_seed(bucket, month, stream, name))
+                               for name in SKETCH_COLUMNS[stream]}
+                    sketches[stream] = {
+                        name: {t: sketch.to_dict() for t, sketch in by_type.items()} for name, by_type in grouped.items()
+                    }
+            if sketches:
+                with open(os.path.join(self.root, shard["path"], SKETCH_FILE), 'w') as f:
+                    json.dump(sketches, f)
+                shard["sketches"] = SKETCH_FILE
+            shards.append({**shard, "patients": sorted(shard["patients"])})
+        self._parts = {}
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "start_date": self.start_date,
+            "n_buckets": self.n_buckets,
+            "patient_ids": self.patient_ids,
+            "persona_names": self.persona_names,
+            "persona_types": self.persona_types,
+            "generation_info": self.generation_info or {},
+            "shards": shards,
+        }
+        with open(os.path.join(self.root, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def write_sharded(cohort: CompactCohort, root: str, n_buckets: int = 16) -> Dict[str, Any]:
+    """Write an in-memory cohort as shards partitioned by patient hash bucket and calendar month"""
+    writer = ShardWriter(root, cohort.start_date, n_buckets, cohort.generation_info)
+    writer.add(cohort)
+    return writer.close()
+
+
+class ShardedDataset:
+    """Reader for a sharded dataset that only opens the shards a query needs"""
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, MANIFEST_FILE), 'r') as f:
+            self.manifest = json.load(f)
+        self.start_date = self.manifest["start_date"]
+        self.patient_ids = self.manifest["patient_ids"]
+        self.patient_index = {p: i for i, p in enumerate(self.patient_ids)}
+        self.shards = self.manifest["shards"]
+
+    def day_offset(self, date: str) -> int:
+        """Convert a YYYY-MM-DD date to a study day offset"""
+        return int((np.datetime64(date, "D") - np.datetime64(self.start_date, "D")).astype(np.int64))
+
+    def select_shards(self, stream: str, patients: Optional[List[str]] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Shards holding rows of a stream that may match the patient and date filters"""
+        buckets = codes = None
+        if patients is not None:
+            codes = {self.patient_index[p] for p in patients if p in self.patient_index}
+            buckets = {patient_bucket(p, self.manifest["n_buckets"]) for p in patients}
+        day_lo = self.day_offset(start_date) if start_date else None
+        day_hi = self.day_offset(end_date) if end_date else None
+
+        selected = []
+        for shard in self.shards:
+            entry = shard["streams"].get(stream)
+            if entry is None:
+                continue
+            if buckets is not None and (shard["bucket"] not in buckets or not codes.intersection(shard["patients"])):
+                continue
+            if day_lo is not None and entry["day_max"] < day_lo:
+                continue
+            if day_hi is not None and entry["day_min"] > day_hi:
+                continue
+            selected.append(shard)
+        return selected
+
+    def read_shard(self, shard: Dict[str, Any], stream: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Load one shard's columns for a stream (npz members are decoded only when accessed)"""
+        path = os.path.join(self.root, shard["path"], shard["streams"][stream]["file"])
+        with np.load(path) as archive:
+            names = archive.files if columns is None else columns
+            return {name: archive[name] for name in names}
+
+    @staticmethod
+    def shard_overflow(shard: Dict[str, Any], stream: str,
+                       mask: Optional[np.ndarray] = None) -> Dict[str, Dict[int, List[str]]]:
+        """A shard's out-of-vocabulary terms per field, keyed by row within the (masked) shard"""
+        overflow = shard["streams"][stream].get("overflow", {})
+        position = None if mask is None else np.cumsum(mask) - 1
+        return {field: {int(local) if mask is None else int(position[int(local)]): list(t)
+                        for local, t in terms.items() if mask is None or mask[int(local)]}
+                for field, terms in overflow.items()}
+
+    def _read_parts(self, stream: str, columns: Optional[List[str]] = None, patients: Optional[List[str]] = None,
+                    start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[tuple]:
+        """(columns, overflow) of every selected shard, filtered to the patients and dates"""
+        needed = None if columns is None else list(dict.fromkeys(["patient", "day"] + columns))
+        parts = []
+        for shard in self.select_shards(stream, patients, start_date, end_date):
+            part = self.read_shard(shard, stream, needed)
+            mask = np.ones(len(part["day"]), dtype=bool)
+            if patients is not None:
+                mask &= np.isin(part["patient"], [self.patient_index[p] for p in patients if p in self.patient_index])
+            if start_date:
+                mask &= part["day"] >= self.day_offset(start_date)
+            if end_date:
+                mask &= part["day"] <= self.day_offset(end_date)
+            if mask.all():
+                parts.append((part, self.shard_overflow(shard, stream)))
+            else:
+                parts.append(({name: values[mask] for name, values in part.items()},
+                              self.shard_overflow(shard, stream, mask)))
+        return parts
+
+    def read(self, stream: str, columns: Optional[List[str]] = None, patients: Optional[List[str]] = None,
+             start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Read a stream's rows for the given patients and inclusive date range"""
+        parts = self._read_parts(stream, columns, patients, start_date, end_date)
+        if not parts:
+            return {}
+        return {name: np.concatenate([p[name] for p, _ in parts]) for name in parts[0][0]}
+
+    @staticmethod
+    def _assemble(stream: str, parts: List[tuple], remap: Optional[np.ndarray] = None):
+        """Concatenate shard parts into patient-major, chronological columns and overflow rows.
+
+        Overflow rows are offset by each part's position in the concatenation
+        and then moved with the sort, keyed "stream.field" as CompactCohort
+        expects.
+        """
+        if not parts:
+            return {}, {}
+        columns = {name: np.concatenate([p[name] for p, _ in parts]) for name in parts[0][0]}
+        if remap is not None:
+            columns["patient"] = remap[columns["patient"]]
+        # Restore the generator's patient-major, chronological ordering
+        order = np.lexsort((columns["day"], columns["patient"]))
+        columns = {name: values[order] for name, values in columns.items()}
+        new_row = np.empty(len(order), dtype=np.int64)
+        new_row[order] = np.arange(len(order))
+        overflow, offset = {}, 0
+        for part, part_overflow in parts:
+            for field, terms in part_overflow.items():
+                overflow.setdefault(f"{stream}.{field}", {}).update(
+                    {int(new_row[offset + row]): t for row, t in terms.items()})
+            offset += len(part["day"])
+        return columns, overflow
+
+    def to_cohort(self, patients: Optional[List[str]] = None, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None) -> CompactCohort:
+        """Assemble a CompactCohort from the shards matching the filters"""
+        streams, overflow = {}, {}
+        for stream in STREAMS:
+            streams[stream], stream_overflow = self._assemble(
+                stream, self._read_parts(stream, patients=patients, start_date=start_date, end_date=end_date))
+            overflow.update(stream_overflow)
+        return CompactCohort(self.start_date, self.patient_ids, self.manifest["persona_names"],
+                             self.manifest["persona_types"], streams, overflow,
+                             generation_info=self.manifest["generation_info"])
+
+    def shard_sketches(self, shard: Dict[str, Any], stream: str, column: str) -> Dict[str, KLLSketch]:
+        """A shard's sketches of one column per persona type (built from the rows for older datasets)"""
+        seed = sketch_seed(shard["bucket"], shard["month"], stream, column)
+        if "sketches" in shard:
+            with open(os.path.join(self.root, shard["path"], shard["sketches"]), 'r') as f:
+                states = json.load(f).get(stream, {}).get(column)
+            if states is not None:
+                return {t: KLLSketch.from_dict(state, sketch_seed(seed, t)) for t, state in states.items()}
+        columns = self.read_shard(shard, stream, ["patient", column])
+        types = np.array(self.manifest["persona_types"])[columns["patient"]]
+        return group_sketches(columns[column], types, seed=seed)
+
+    def percentiles(self, stream: str, column: str, by: Optional[str] = "persona_type",
+                    quantiles=SUMMARY_QUANTILES, start_date: Optional[str] = None,
+                    end_date: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Approximate percentiles of a column per persona type, per month, or overall (by=None).
+
+        Merges the per-shard sketches of the selected months, so the cost
+        depends on the number of shards rather than rows. Estimates are
+        within the reported rank_error of the exact percentiles. Date
+        filters select whole months.
+        """
+        if by not in ("persona_type", "month", None):
+            raise ValueError(f"by must be 'persona_type', 'month' or None, not {by!r}")
+        groups: Dict[str, List[KLLSketch]] = {}
+        for shard in self.select_shards(stream, start_date=start_date, end_date=end_date):
+            for persona_type, sketch in self.shard_sketches(shard, stream, column).items():
+                label = {"persona_type": persona_type, "month": shard["month"]}.get(by, "all")
+                groups.setdefault(label, []).append(sketch)
+        return {label: merge_all(parts, seed=sketch_seed(stream, column, label)).summary(quantiles)
+                for label, parts in sorted(groups.items())}
+
+    def buckets(self) -> List[int]:
+        return sorted({shard["bucket"] for shard in self.shards})
+
+    def bucket_cohort(self, bucket: int) -> CompactCohort:
+        """One hash bucket as a CompactCohort: complete histories of its patients, re-coded 0..n-1"""
+        shards = [shard for shard in self.shards if shard["bucket"] == bucket]
+        codes = sorted(set().union(*(shard["patients"] for shard in shards)))
+        remap = np.full(len(self.patient_ids), -1, dtype=np.int32)
+        remap[codes] = np.arange(len(codes), dtype=np.int32)
+        streams, overflow = {}, {}
+        for stream in STREAMS:
+            parts = [(self.read_shard(shard, stream), self.shard_overflow(shard, stream))
+                     for shard in shards if stream in shard["streams"]]
+            streams[stream], stream_overflow = self._assemble(stream, parts, remap)
+            overflow.update(stream_overflow)
+        return CompactCohort(self.start_date, [self.patient_ids[c] for c in codes],
+                             [self.manifest["persona_names"][c] for c in codes],
+                             [self.manifest["persona_types"][c] for c in codes], streams, overflow,
+                             generation_info=self.manifest["generation_info"])
+
+    def partition_shards(self, n_workers: int) -> List[List[Dict[str, Any]]]:
+        """Split shards into disjoint, roughly row-balanced groups, one per worker"""
+        groups = [[] for _ in range(n_workers)]
+        loads = [0] * n_workers
+        by_size = sorted(self.shards, key=lambda s: -sum(e["rows"] for e in s["streams"].values()))
+        for shard in by_size:
+            target = loads.index(min(loads))
+            groups[target].append(shard)
+            loads[target] += sum(e["rows"] for e in shard["streams"].values())
+        return groups
+
+    def scan_parallel(self, fn: Callable[[Dict[str, np.ndarray]], Any], stream: str,
+                      columns: Optional[List[str]] = None, n_workers: Optional[int] = None) -> List[Any]:
+        """Apply a picklable function to every shard of a stream across a process pool"""
+        shards = [s for s in self.shards if stream in s["streams"]]
+        tasks = [(self.root, shard, stream, columns, fn) for shard in shards]
+        with ProcessPoolExecutor(max_workers=n_workers or os.cpu_count() or 1) as executor:
+            return list(executor.map(_scan_shard, tasks))
+
+
+def _scan_shard(args) -> Any:
+    """Process pool entry point - each worker opens its own shard files"""
+    root, shard, stream, columns, fn = args
+    path = os.path.join(root, shard["path"], shard["streams"][stream]["file"])
+    with np.load(path) as archive:
+        names = archive.files if columns is None else columns
+        return fn({name: archive[name] for name in names})
+
+
+def _count_high_risk(columns: Dict[str, np.ndarray]) -> int:
+    """Example shard scan used by the __main__ demo"""
+    return int((columns["relapse_risk_score"] > 0.6).sum())
+
+
+if __name__ == "__main__":
+    cohort = CompactCohort.load_json('data/realistic_patient_data.json')
+    manifest = write_sharded(cohort, 'data/sharded', n_buckets=4)
+    total_rows = sum(e["rows"] for s in manifest["shards"] for e in s["streams"].values())
+    print(f"Wrote {len(manifest['shards'])} shards ({total_rows:,} rows) to data/sharded")
+
+    dataset = ShardedDataset('data/sharded')
+    shards = dataset.select_shards("sobriety", patients=["sarah_chen"], start_date="2024-02-01", end_date="2024-02-29")
+    print(f"Sarah Chen, February: {len(shards)} of {len(dataset.shards)} shards needed")
+    february = dataset.read("sobriety", ["relapse_risk_score"], patients=["sarah_chen"],
+                            start_date="2024-02-01", end_date="2024-02-29")
+    print(f"  {len(february['day'])} days, mean risk {february['relapse_risk_score'].mean():.3f}")
+
+    high_risk = dataset.scan_parallel(_count_high_risk, "sobriety", ["relapse_risk_score"])
+    print(f"High-risk days across all shards (parallel scan): {sum(high_risk)}")
+
+    resting_hr = dataset.percentiles("apple_watch", "heart_rate_resting")
+    print(f"Resting HR percentiles from merged shard sketches (rank error "
+          f"{next(iter(resting_hr.values()))['rank_error']:.1%}):")
+    for persona_type, stats in resting_hr.items():
+        print(f"  {persona_type:<26} p05 {stats['p05']:5.1f}  p50 {stats['p50']:5.1f}  p95 {stats['p95']:5.1f}")
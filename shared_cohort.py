@@ -0,0 +1,188 @@
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Optional, Callable, Tuple
+
+from compact_dataset import CompactCohort, STREAMS
+from feature_matrix import FeatureMatrix
+
+ALIGNMENT = 64  # Every array starts on a cache line
+
+# Attached blocks per worker process: block name -> (SharedMemory, cohort, features)
+_ATTACHED: Dict[str, Tuple[shared_memory.SharedMemory, CompactCohort, Optional[FeatureMatrix]]] = {}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class SharedCohort:
+    """A CompactCohort (and optionally its FeatureMatrix) published in one shared memory block.
+
+    Every column (stream columns, encoded categorical masks, feature and risk
+    grids) is copied once into the block, followed by a JSON header with
+    the patient tables. `descriptor` is a small picklable dict (block name
+    and array layout) that workers pass to `attach` to get a CompactCohort
+    and FeatureMatrix whose arrays are read-only views of the block. Nothing
+    is pickled or re-loaded per worker, so resident memory stays at one
+    copy however many workers attach.
+
+    The publishing process owns the block: use it as a context manager or
+    call `close()` to unlink it once the workers are done.
+    """
+
+    def __init__(self, cohort: CompactCohort, features: Optional[FeatureMatrix] = None):
+        arrays = {f"{stream}/{name}": values
+                  for stream, columns in cohort.streams.items() for name, values in columns.items()}
+        if features is not None:
+            arrays.update({f"features/{name}": values for name, values in features.columns.items()})
+        header = json.dumps({
+            "start_date": cohort.start_date,
+            "patient_ids": cohort.patient_ids,
+            "persona_names": cohort.persona_names,
+            "persona_types": cohort.persona_types,
+            "overflow": {k: {str(r): t for r, t in v.items()} for k, v in cohort.overflow.items()},
+            "generation_info": cohort.generation_info,
+            "n_days": features.n_days if features is not None else None,
+        }).encode()
+
+        layout, offset = [], 0
+        for key, values in arrays.items():
+            offset = _aligned(offset)
+            layout.append((key, values.dtype.str, values.shape, offset))
+            offset += values.nbytes
+        header_offset = _aligned(offset)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(header_offset + len(header), 1))
+        for key, dtype, shape, start in layout:
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)
+            view[...] = arrays[key]
+            del view
+        self.shm.buf[header_offset:header_offset + len(header)] = header
+        self.descriptor = {
+            "name": self.shm.name,
+            "arrays": layout,
+            "header": (header_offset, len(header)),
+            "has_features": features is not None,
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self.shm.size
+
+    def map(self, fn: Callable, tasks: List[tuple], n_workers: Optional[int] = None) -> List[Any]:
+        """Run fn(cohort, features, *task) for every task on a process pool attached to this block.
+
+        fn must be a module-level function so it can be sent to the workers;
+        only the descriptor and the task arguments are pickled.
+        """
+        calls = [(self.descriptor, fn, task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=n_workers or os.cpu_count() or 1) as executor:
+            return list(executor.map(_run_attached, calls))
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedCohort":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(descriptor: Dict[str, Any]) -> Tuple[CompactCohort, Optional[FeatureMatrix]]:
+    """Zero-copy, read-only CompactCohort and FeatureMatrix over a published block.
+
+    Attachments are cached per process, so a worker that runs many tasks
+    maps the block and parses its header once.
+    """
+    name = descriptor["name"]
+    if name not in _ATTACHED:
+        shm = shared_memory.SharedMemory(name=name)
+        start, length = descriptor["header"]
+        meta = json.loads(bytes(shm.buf[start:start + length]).decode())
+
+        streams = {stream: {} for stream in STREAMS}
+        feature_columns = {}
+        for key, dtype, shape, offset in descriptor["arrays"]:
+            view = np.ndarray(tuple(shape), dtype=dtype, buffer=shm.buf, offset=offset)
+            view.flags.writeable = False
+            group, column = key.split("/", 1)
+            (feature_columns if group == "features" else streams[group])[column] = view
+
+        overflow = {k: {int(r): t for r, t in v.items()} for k, v in meta["overflow"].items()}
+        cohort = CompactCohort(meta["start_date"], meta["patient_ids"], meta["persona_names"], meta["persona_types"],
+                               streams, overflow, generation_info=meta["generation_info"])
+        features = None
+        if descriptor["has_features"]:
+            features = FeatureMatrix(meta["start_date"], meta["patient_ids"], meta["n_days"], feature_columns)
+        _ATTACHED[name] = (shm, cohort, features)
+    _, cohort, features = _ATTACHED[name]
+    return cohort, features
+
+
+def _run_attached(args) -> Any:
+    """Process pool entry point - attach (once per worker) and run one task"""
+    descriptor, fn, task = args
+    cohort, features = attach(descriptor)
+    return fn(cohort, features, *task)
+
+
+def private_memory_bytes() -> int:
+    """Private (unshared) resident memory of this process, from /proc on Linux (0 elsewhere)"""
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            return sum(int(line.split()[1]) * 1024 for line in f if line.startswith(("Private_Clean", "Private_Dirty")))
+    except OSError:
+        return 0
+
+
+def _patient_risk(cohort: CompactCohort, features: Optional[FeatureMatrix], first: int, last: int) -> Dict[str, Any]:
+    """Example task for the __main__ demo: risk summary for patients first..last-1"""
+    risk = features.columns["sobriety.relapse_risk_score"].reshape(-1, features.n_days)[first:last]
+    patient = cohort.streams["apple_watch"]["patient"]
+    rows = slice(*np.searchsorted(patient, [first, last]))
+    resting_hr = np.bincount(patient[rows] - first, cohort.streams["apple_watch"]["heart_rate_resting"][rows],
+                             minlength=last - first)
+    return {
+        "mean_risk": np.nanmean(risk, axis=1),
+        "high_risk_days": (risk >= 0.6).sum(axis=1),
+        "resting_hr_sum": resting_hr,
+        "private_bytes": private_memory_bytes(),
+    }
+
+
+if __name__ == "__main__":
+    import pickle
+    import time
+    from feature_matrix import FeatureJoiner
+    from relapse_training import build_cohort_shards
+    from sharded_dataset import ShardedDataset
+
+    root = 'data/cohort_sharded'
+    if not os.path.exists(os.path.join(root, "manifest.json")):
+        print("Generating a 1,000 patient cohort...")
+        build_cohort_shards(root, n_patients=1000)
+    cohort = ShardedDataset(root).to_cohort()
+    features = FeatureJoiner(cache_dir=None).build(cohort)
+    pickled = len(pickle.dumps((cohort, features), protocol=pickle.HIGHEST_PROTOCOL))
+
+    with SharedCohort(cohort, features) as shared:
+        print(f"Published {cohort.n_patients:,} patients in {shared.nbytes / 1e6:.1f} MB of shared memory; "
+              f"descriptor {len(pickle.dumps(shared.descriptor)):,} bytes vs {pickled / 1e6:.1f} MB pickled")
+        bounds = np.linspace(0, cohort.n_patients, 33).astype(int)
+        tasks = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        for n_workers in (1, 2, 4, 8):
+            start = time.perf_counter()
+            results = shared.map(_patient_risk, tasks, n_workers=n_workers)
+            elapsed = time.perf_counter() - start
+            private = max(r["private_bytes"] for r in results)
+            print(f"  {n_workers} workers: {elapsed:.2f} s, max private memory per worker {private / 1e6:.1f} MB")
+
+    mean_risk = np.concatenate([r["mean_risk"] for r in results])
+    expected = np.nanmean(features.columns["sobriety.relapse_risk_score"].reshape(-1, features.n_days), axis=1)
+    assert np.allclose(mean_risk, expected, equal_nan=True)
+    print(f"Per-patient results match the in-process arrays (cohort mean risk {np.nanmean(mean_risk):.3f})")
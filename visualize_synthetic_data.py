@@ -1,9 +1,13 @@
 import json
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import seaborn as sns
+from compact_dataset import CompactCohort
+from engagement import EngagementAnalytics
+from rollups import RollupStore
 
 # Set style for better plots
 plt.style.use('seaborn')
@@ -14,6 +18,16 @@ def load_data():
     with open('data/synthetic_patient_data.json', 'r') as f:
         return json.load(f)
 
+def load_rollups(data):
+    """Load the rollups materialized by the generator, building them if missing"""
+    if os.path.exists('data/synthetic_patient_rollups.npz'):
+        return RollupStore.load('data/synthetic_patient_rollups.npz')
+    return RollupStore.build(CompactCohort.from_dataset(data))
+
+def load_engagement(data, rollups=None):
+    """Engagement metrics for every persona; daily chat aggregates come from the rollups"""
+    return EngagementAnalytics(CompactCohort.from_dataset(data), rollups=rollups or load_rollups(data))
+
 def plot_relapse_risk_curves(data):
     """Plot relapse risk curves for all personas showing decay over time"""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
@@ -107,22 +121,17 @@ def plot_biomarker_trends(data):
     plt.savefig('data/biomarker_trends.png', dpi=300, bbox_inches='tight')
     plt.show()
 
-def plot_engagement_patterns(data):
+def plot_engagement_patterns(data, engagement=None):
     """Plot engagement patterns across different data types"""
     fig, axes = plt.subplots(2, 2, figsize=(16, 10))
     
     personas = list(data['personas'].items())
     persona_names = [p[1]['persona'] for p in personas]
+    if engagement is None:
+        engagement = load_engagement(data)
     
     # Chat interactions per day
-    chat_frequencies = []
-    for persona_id, persona_data in personas:
-        chat_data = persona_data['chat']
-        daily_chats = {}
-        for chat in chat_data:
-            date = chat['date']
-            daily_chats[date] = daily_chats.get(date, 0) + 1
-        chat_frequencies.append(list(daily_chats.values()))
+    chat_frequencies = [engagement.chats_per_day(persona_id)[1] for persona_id, _ in personas]
     
     axes[0,0].boxplot(chat_frequencies, labels=[name.split()[0] for name in persona_names])
     axes[0,0].set_title('Daily Chat Interactions Distribution')
@@ -130,10 +139,7 @@ def plot_engagement_patterns(data):
     axes[0,0].grid(True, alpha=0.3)
     
     # Mood diary entry lengths
-    diary_lengths = []
-    for persona_id, persona_data in personas:
-        lengths = [entry['word_count'] for entry in persona_data['mood_diary']]
-        diary_lengths.append(lengths)
+    diary_lengths = [engagement.values('mood_diary', 'word_count', persona_id) for persona_id, _ in personas]
     
     axes[0,1].boxplot(diary_lengths, labels=[name.split()[0] for name in persona_names])
     axes[0,1].set_title('Mood Diary Entry Lengths')
@@ -170,7 +176,7 @@ def plot_engagement_patterns(data):
     plt.savefig('data/engagement_patterns.png', dpi=300, bbox_inches='tight')
     plt.show()
 
-def plot_persona_comparison(data):
+def plot_persona_comparison(data, engagement=None):
     """Create a comprehensive comparison of personas"""
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     
@@ -246,29 +252,17 @@ def plot_persona_comparison(data):
     
     # 6. Chat Sentiment Over Time
     ax = axes[1,2]
+    if engagement is None:
+        engagement = load_engagement(data)
+    trends = engagement.sentiment_trend()
     for i, (persona_id, persona_data) in enumerate(personas):
-        chat_data = persona_data['chat']
-        if chat_data:
-            # Group by date and average sentiment
-            daily_sentiment = {}
-            for chat in chat_data:
-                date = chat['date']
-                sentiment = chat['sentiment_score']
-                if date in daily_sentiment:
-                    daily_sentiment[date].append(sentiment)
-                else:
-                    daily_sentiment[date] = [sentiment]
-            
-            dates = sorted(daily_sentiment.keys())
-            avg_sentiments = [np.mean(daily_sentiment[date]) for date in dates]
-            
-            # Convert dates to days from start
-            start_date = datetime.strptime(dates[0], '%Y-%m-%d')
-            days = [(datetime.strptime(date, '%Y-%m-%d') - start_date).days for date in dates]
-            
+        # Daily mean sentiment straight from the materialized rollups
+        days, avg_sentiments = engagement.daily_sentiment(persona_id)
+        if len(days):
             # Smooth with rolling average
             sentiment_smooth = pd.Series(avg_sentiments).rolling(7, center=True).mean()
-            ax.plot(days, sentiment_smooth, label=persona_data['persona'].split()[0],
+            trend = trends[engagement.cohort.patient_index[persona_id]]
+            ax.plot(days, sentiment_smooth, label=f"{persona_data['persona'].split()[0]} ({trend:+.3f}/wk)",
                    color=colors[i], linewidth=2, alpha=0.8)
     
     ax.set_title('Chat Sentiment Trends (7-day avg)')
@@ -326,14 +320,15 @@ def main():
     """Main function to run all visualizations"""
     print("Loading synthetic patient data...")
     data = load_data()
+    engagement = load_engagement(data, load_rollups(data))
     
     print("Generating visualizations...")
     
     # Create all plots
     plot_relapse_risk_curves(data)
     plot_biomarker_trends(data)
-    plot_engagement_patterns(data)
-    plot_persona_comparison(data)
+    plot_engagement_patterns(data, engagement)
+    plot_persona_comparison(data, engagement)
     
     # Generate sample records
     print("Generating sample records...")